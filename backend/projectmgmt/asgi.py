@@ -3,6 +3,11 @@ ASGI config for projectmgmt project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with e.g. ``GRAPHQL_ASYNC=true uvicorn projectmgmt.asgi:application``
+so /graphql/ is served by AsyncGraphQLView and resolvers do not hold a
+worker while they wait on the database. WebSocket connections to /graphql/
+carry GraphQL subscriptions (see projects/websockets.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -13,4 +18,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projectmgmt.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from projects.websockets import GraphQLWebSocketApp  # noqa: E402
+
+websocket_application = GraphQLWebSocketApp()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'].rstrip('/') == '/graphql':
+            await websocket_application(scope, receive, send)
+        else:
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await django_application(scope, receive, send)
@@ -52,6 +52,98 @@ INSTALLED_APPS = [
 
 GRAPHENE = {
     "SCHEMA": "projects.schema.schema",  
+    "MIDDLEWARE": ["projects.metrics.ResolverTimingMiddleware"],
+}
+
+# Resolve GraphQL on the async ORM; enable when serving projectmgmt.asgi
+GRAPHQL_ASYNC = os.environ.get('GRAPHQL_ASYNC', 'False').lower() == 'true'
+
+# Automatic persisted queries (APQ) for /graphql/. With ALLOW_LIST_ONLY only
+# the documents in MANIFEST ({sha256: query} or an Apollo manifest) may run.
+GRAPHQL_PERSISTED_QUERIES = {
+    'ALLOW_LIST_ONLY': os.environ.get('GRAPHQL_ALLOW_LIST_ONLY', 'False').lower() == 'true',
+    'MANIFEST': os.environ.get('GRAPHQL_PERSISTED_QUERY_MANIFEST'),
+    'CACHE_ALIAS': 'default',
+    'DOCUMENT_CACHE_SIZE': 256,
+}
+
+# Static limits checked before a GraphQL operation executes (see
+# projects/schemas/cost.py). FIELD_WEIGHTS maps 'Type.field' to a weight.
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': int(os.environ.get('GRAPHQL_MAX_QUERY_COST', 5000)),
+    'MAX_DEPTH': int(os.environ.get('GRAPHQL_MAX_QUERY_DEPTH', 8)),
+    'MAX_BREADTH': int(os.environ.get('GRAPHQL_MAX_QUERY_BREADTH', 50)),
+    'DEFAULT_LIST_SIZE': 50,
+    'FIELD_WEIGHTS': {},
+}
+
+# Cache of read-only GraphQL responses keyed by per-organization data
+# versions (see projects/response_cache.py). Versions must be seen by every
+# worker process, so the cache is on by default only with the shared
+# file-based backend (CACHE_DIR); enabling it on a process-local cache fails
+# the system checks (projects/checks.py).
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get(
+        'GRAPHQL_RESPONSE_CACHE', 'True' if os.environ.get('CACHE_DIR') else 'False'
+    ).lower() == 'true',
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('GRAPHQL_RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+# Prometheus metrics of GraphQL operations and resolvers served at /metrics
+# (see projects/metrics.py). Scrapers must send METRICS_TOKEN as a bearer
+# token; without one the endpoint is a 404 and metrics are off by default.
+GRAPHQL_METRICS = {
+    'ENABLED': os.environ.get(
+        'GRAPHQL_METRICS', 'True' if os.environ.get('METRICS_TOKEN') else 'False'
+    ).lower() == 'true',
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'MAX_OPERATIONS': int(os.environ.get('GRAPHQL_METRICS_MAX_OPERATIONS', 100)),
+}
+
+# Broker carrying subscription events (see projects/events.py). The default
+# only reaches subscribers in the same process; with several workers use
+# 'projects.events.PostgresBroker'. MAX_QUEUE is how many events a slow
+# subscriber may fall behind before it is disconnected.
+GRAPHQL_SUBSCRIPTIONS = {
+    'BROKER': os.environ.get('GRAPHQL_SUBSCRIPTION_BROKER', 'projects.events.InProcessBroker'),
+    'MAX_QUEUE': 100,
+}
+
+# Bulk imports of tasks and comments (see projects/imports.py): rows per
+# committed batch, and how many row errors are kept on each ImportJob.
+BULK_IMPORT = {
+    'BATCH_SIZE': int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000)),
+    'MAX_REPORTED_ERRORS': 1000,
+}
+
+# Archival of finished tasks (see projects/archive.py): done tasks not
+# updated for AFTER_DAYS move to the archive tables, BATCH_SIZE per
+# transaction, when the archive_tasks command runs.
+TASK_ARCHIVAL = {
+    'AFTER_DAYS': int(os.environ.get('TASK_ARCHIVAL_AFTER_DAYS', 365)),
+    'BATCH_SIZE': int(os.environ.get('TASK_ARCHIVAL_BATCH_SIZE', 1000)),
+}
+
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# In-process cache of X-Organization lookups (seconds / entries)
+ORGANIZATION_CACHE = {
+    'MAX_SIZE': int(os.environ.get('ORGANIZATION_CACHE_MAX_SIZE', 1024)),
+    'TTL': int(os.environ.get('ORGANIZATION_CACHE_TTL', 300)),
+    'NOT_FOUND_TTL': int(os.environ.get('ORGANIZATION_CACHE_NOT_FOUND_TTL', 5)),
 }
 
 MIDDLEWARE = [
@@ -95,7 +187,9 @@ if frontend_url:
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "x-organization",  # your custom header
+    "if-none-match",
 ]
+CORS_EXPOSE_HEADERS = ["etag"]
 
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
@@ -155,6 +249,27 @@ else:
         }
     }
 
+# Read replicas for GraphQL queries (see projects/routers.py), given as a
+# comma-separated DATABASE_REPLICA_URLS. A tenant's queries read from the
+# primary for STICKY_SECONDS after each of its writes, covering replica lag.
+# The sticky flags need a cache shared by all workers (set CACHE_DIR).
+replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+for number, url in enumerate(replica_urls, 1):
+    DATABASES[f'replica{number}'] = dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    DATABASES[f'replica{number}']['TEST'] = {'MIRROR': 'default'}
+
+READ_REPLICAS = {
+    'ALIASES': [f'replica{number}' for number in range(1, len(replica_urls) + 1)],
+    'STICKY_SECONDS': int(os.environ.get('READ_REPLICA_STICKY_SECONDS', 5)),
+    'CACHE_ALIAS': 'default',
+}
+
+DATABASE_ROUTERS = ['projects.routers.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -15,10 +15,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # Add this to your main urls.py (projectmgmt/urls.py)
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from projects.export import export_view
+from projects.metrics import metrics_view
+from projects.views import AsyncGraphQLView, PersistedQueryGraphQLView
 from django.http import JsonResponse
 from datetime import datetime
 
@@ -30,9 +33,14 @@ def health_check(request):
         "service": "mini-pm-system"
     })
 
+# Serve GraphQL from the async view when running under ASGI (uvicorn)
+graphql_view = AsyncGraphQLView if settings.GRAPHQL_ASYNC else PersistedQueryGraphQLView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(graphql_view.as_view(graphiql=True))),
     path('health/', health_check, name='health_check'),  # Add this line
     path('ping/', health_check, name='ping'),  # Alternative endpoint name
+    path('metrics', metrics_view, name='metrics'),  # Prometheus scrape target
+    path('export/', export_view, name='export'),  # Streaming NDJSON/CSV of the X-Organization tenant
 ]
@@ -1,6 +1,59 @@
 # admin.py
+from collections import defaultdict
+
 from django.contrib import admin
-from .models import Organization, Project, Task, TaskComment
+from django.db import transaction
+from .changes import COMMENT, PROJECT, TASK, project_tombstones, record_changes, task_tombstones
+from .counters import adjust_counters
+from .models import ArchivedTask, ImportJob, Organization, Project, Task, TaskComment
+from .response_cache import bump_organization_version
+
+
+class OrganizationVersionMixin:
+    """
+    Bump the organization version for edits made in the admin so that cached
+    GraphQL responses are not served after them, and log the edits to the
+    change feed.
+    """
+    organization_field = 'organization'
+    change_kind = PROJECT
+    
+    def bump_versions(self, queryset):
+        for organization_id in set(queryset.values_list(self.organization_field, flat=True)):
+            bump_organization_version(organization_id)
+    
+    def tombstones(self, pks):
+        return project_tombstones(pks)
+    
+    def record_deletions(self, queryset):
+        by_organization = defaultdict(list)
+        for pk, organization_id in queryset.values_list('pk', self.organization_field):
+            by_organization[organization_id].append(pk)
+        for organization_id, pks in by_organization.items():
+            record_changes(organization_id, deleted=self.tombstones(pks))
+    
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                self.bump_versions(type(obj).objects.filter(pk=obj.pk))
+            super().save_model(request, obj, form, change)
+            queryset = type(obj).objects.filter(pk=obj.pk)
+            self.bump_versions(queryset)
+            for organization_id in queryset.values_list(self.organization_field, flat=True):
+                record_changes(organization_id, saved=[(self.change_kind, obj.pk)])
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            queryset = type(obj).objects.filter(pk=obj.pk)
+            self.bump_versions(queryset)
+            self.record_deletions(queryset)
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            self.bump_versions(queryset)
+            self.record_deletions(queryset)
+            super().delete_queryset(request, queryset)
 
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
@@ -10,26 +63,91 @@ class OrganizationAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(OrganizationVersionMixin, admin.ModelAdmin):
     list_display = ['name', 'organization', 'status', 'due_date', 'created_at']
     list_filter = ['status', 'organization', 'created_at']
     search_fields = ['name', 'description']
     list_select_related = ['organization']
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(OrganizationVersionMixin, admin.ModelAdmin):
+    change_kind = TASK
     list_display = ['title', 'project', 'status', 'priority', 'assignee', 'due_date', 'created_at']
-    list_filter = ['status', 'priority', 'project__organization', 'created_at']
+    list_filter = ['status', 'priority', 'organization', 'created_at']
     search_fields = ['title', 'description', 'assignee']
     list_select_related = ['project', 'project__organization']
+    
+    def tombstones(self, pks):
+        return task_tombstones(pks)
+    
+    # Keep ProjectTaskCounters in step with edits made here
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if change:
+                initial = form.initial
+                adjust_counters(
+                    initial['project'], removed=[(initial['status'], initial['priority'])]
+                )
+            adjust_counters(obj.project_id, added=[(obj.status, obj.priority)])
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            adjust_counters(obj.project_id, removed=[(obj.status, obj.priority)])
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            removed = defaultdict(list)
+            for project_id, status, priority in queryset.values_list('project_id', 'status', 'priority'):
+                removed[project_id].append((status, priority))
+            super().delete_queryset(request, queryset)
+            for project_id, tasks in removed.items():
+                adjust_counters(project_id, removed=tasks)
 
 @admin.register(TaskComment)
-class TaskCommentAdmin(admin.ModelAdmin):
+class TaskCommentAdmin(OrganizationVersionMixin, admin.ModelAdmin):
+    change_kind = COMMENT
     list_display = ['task', 'author', 'content_preview', 'created_at']
-    list_filter = ['created_at', 'task__project__organization']
+    list_filter = ['created_at', 'organization']
     search_fields = ['content', 'author']
     list_select_related = ['task', 'task__project']
     
+    def tombstones(self, pks):
+        return [(COMMENT, pk) for pk in pks]
+    
     def content_preview(self, obj):
         return obj.content[:50] + "..." if len(obj.content) > 50 else obj.content
-    content_preview.short_description = 'Content'
\ No newline at end of file
+    content_preview.short_description = 'Content'
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'source', 'organization', 'status', 'checkpoint', 'imported_tasks',
+        'imported_comments', 'failed_rows', 'created_at',
+    ]
+    list_filter = ['status', 'organization', 'created_at']
+    search_fields = ['source']
+    list_select_related = ['organization']
+    # Written by imports.py; resume a failed job with import_tasks --resume
+    readonly_fields = [
+        'organization', 'source', 'format', 'status', 'checkpoint', 'imported_tasks',
+        'imported_comments', 'failed_rows', 'errors', 'created_at', 'updated_at',
+    ]
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    list_display = ['title', 'project', 'status', 'priority', 'assignee', 'updated_at', 'archived_at']
+    list_filter = ['priority', 'organization', 'archived_at']
+    search_fields = ['title', 'description', 'assignee']
+    list_select_related = ['project', 'project__organization']
+    
+    # Written by archive.py only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
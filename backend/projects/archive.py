@@ -0,0 +1,112 @@
+"""
+Archival of finished tasks out of the hot Task and TaskComment tables.
+
+Done tasks not updated for ``TASK_ARCHIVAL['AFTER_DAYS']`` move, with their
+comments, to ArchivedTask and ArchivedTaskComment under the same ids. Each
+batch of BATCH_SIZE tasks is one transaction: the tasks are locked, copied
+with INSERT ... SELECT and deleted (their comments and import references
+with them). Locks are held for one batch at a time, and a stopped run
+resumes with the tasks it had not reached.
+
+The project task counters keep counting archived tasks (see counters.py),
+so archival changes neither projectStats nor organizationStats.
+
+Archived rows are read-only. They stay reachable through the
+``includeArchived`` arguments of the task queries and search (migration
+0009 indexes the archive tables) and through exports. Archival is not a
+change for the ``changes`` feed: the tasks still exist, and clients that
+hold them need not drop them. The feed reads logged changes of archived
+objects from the archive tables (see changes.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import COMMENT_COLUMNS, TASK_COLUMNS
+from .models import ArchivedTask, ArchivedTaskComment, Task, TaskComment
+from .response_cache import bump_organization_version
+
+TASK_ARCHIVAL = getattr(settings, 'TASK_ARCHIVAL', {})
+
+AFTER_DAYS = TASK_ARCHIVAL.get('AFTER_DAYS', 365)
+BATCH_SIZE = TASK_ARCHIVAL.get('BATCH_SIZE', 1000)
+
+
+def archive_cutoff(after_days=AFTER_DAYS, now=None):
+    """Tasks last updated before this time are old enough to archive."""
+    return (now or timezone.now()) - timedelta(days=after_days)
+
+
+def archivable_tasks(before, organization=None):
+    """The done tasks last updated before ``before``, oldest first."""
+    tasks = Task.objects.filter(status='done', updated_at__lt=before)
+    if organization is not None:
+        tasks = tasks.filter(organization=organization)
+    return tasks.order_by('updated_at', 'id')
+
+
+def _copy(source, target, key, ids, columns, extra=None):
+    """
+    INSERT ... SELECT the ``columns`` of the ``source`` rows whose ``key``
+    is in ``ids`` into ``target``, with ``extra`` column values added.
+    Returns the number of rows copied.
+    """
+    extra = extra or {}
+    names = ', '.join(['id', *columns, *extra])
+    selected = ', '.join(['id', *columns, *(['%s'] * len(extra))])
+    placeholders = ', '.join(['%s'] * len(ids))
+    sql = (
+        f'INSERT INTO {target._meta.db_table} ({names}) '
+        f'SELECT {selected} FROM {source._meta.db_table} WHERE {key} IN ({placeholders})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*extra.values(), *ids])
+        return cursor.rowcount
+
+
+def archive_batch(tasks, batch_size=BATCH_SIZE, archived_at=None):
+    """
+    Move the first ``batch_size`` of ``tasks`` and their comments to the
+    archive in one transaction. Returns ``(tasks, comments)`` moved.
+    """
+    archived_at = connection.ops.adapt_datetimefield_value(archived_at or timezone.now())
+    with transaction.atomic():
+        # Locked before anything is copied: comment writers lock the task
+        # too (AddComment, imports), so none can land between the copy and
+        # the delete; they wait, then find the task gone
+        rows = list(
+            tasks.select_for_update(of=('self',)).values_list('id', 'organization_id')[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        ids = [row[0] for row in rows]
+        moved = _copy(Task, ArchivedTask, 'id', ids, TASK_COLUMNS, {'archived_at': archived_at})
+        comments = _copy(TaskComment, ArchivedTaskComment, 'task_id', ids, COMMENT_COLUMNS)
+        # Only the ids are needed to cascade to comments and import references
+        Task.objects.filter(id__in=ids).only('id').delete()
+
+        for organization_id in {row[1] for row in rows}:
+            bump_organization_version(organization_id)
+    return moved, comments
+
+
+def archive_tasks(before, organization=None, batch_size=BATCH_SIZE, max_batches=None):
+    """
+    Archive the done tasks last updated before ``before`` (of
+    ``organization`` only, if given) in batches, until none are left or
+    ``max_batches`` have run. Returns ``(tasks, comments)`` moved.
+    """
+    archived_at = timezone.now()
+    tasks = comments = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved, moved_comments = archive_batch(
+            archivable_tasks(before, organization), batch_size, archived_at
+        )
+        tasks += moved
+        comments += moved_comments
+        batches += 1
+        if moved < batch_size:
+            break
+    return tasks, comments
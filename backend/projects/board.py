@@ -0,0 +1,55 @@
+"""
+Query behind the taskBoard resolver.
+
+Each task is numbered within its status column by ``ROW_NUMBER() OVER
+(PARTITION BY status ORDER BY created_at, id)`` and its column is counted by
+``COUNT(*) OVER (PARTITION BY status)``. Filtering on the row number (Django
+wraps the windowed query in a subquery) returns the first ``per_column``
+tasks of every column together with the column totals, in one statement
+over the project's rows of the (project, status) index.
+
+The windowed query reads every task of the project, so ``tasks`` must not
+carry per-row subquery annotations: they would run for all of those rows
+rather than the few returned. The resolvers leave the comment summary to
+CommentSummaryLoader, which batches it by the ids of the returned rows.
+"""
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Task
+
+STATUSES = [status for status, _ in Task.STATUS_CHOICES]
+
+
+def board_queryset(tasks, per_column, descending=True):
+    """
+    Narrow ``tasks`` (one project's) to the first ``per_column`` of each
+    status, newest first when ``descending``, annotated with
+    ``column_total``.
+    """
+    if descending:
+        ordering = [F('created_at').desc(), F('id').desc()]
+    else:
+        ordering = [F('created_at').asc(), F('id').asc()]
+    return (
+        tasks.annotate(
+            column_position=Window(RowNumber(), partition_by=[F('status')], order_by=ordering),
+            column_total=Window(Count('id'), partition_by=[F('status')]),
+        )
+        .filter(column_position__lte=per_column)
+        .order_by('status', 'column_position')
+    )
+
+
+def board_columns(rows):
+    """
+    Group rows of ``board_queryset`` into ``[(status, total, tasks)]`` for
+    every status, empty ones included.
+    """
+    tasks = {status: [] for status in STATUSES}
+    totals = dict.fromkeys(STATUSES, 0)
+    for task in rows:
+        if task.status in tasks:
+            tasks[task.status].append(task)
+            totals[task.status] = task.column_total
+    return [(status, totals[status], tasks[status]) for status in STATUSES]
@@ -0,0 +1,144 @@
+"""
+Raw inserts for bulk writers (seed_load and imports.py), skipping the
+ORM's per-object and per-value work that dominates bulk_create for large
+batches.
+"""
+import csv
+import io
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import connection, models
+
+from .models import Task, TaskComment
+
+PROJECT_COLUMNS = ['organization_id', 'name', 'description', 'status', 'due_date', 'created_at']
+TASK_COLUMNS = [
+    'organization_id', 'project_id', 'title', 'description', 'status', 'priority', 'assignee', 'due_date',
+    'created_at', 'updated_at',
+]
+COMMENT_COLUMNS = ['organization_id', 'task_id', 'author', 'content', 'created_at']
+
+# SQLite full-text tables (migration 0005) and the triggers indexing new rows
+SQLITE_SEARCH_INDEXES = {
+    Task: ('projects_task_fts', ['title', 'description'], 'projects_task_fts_insert'),
+    TaskComment: ('projects_taskcomment_fts', ['content'], 'projects_taskcomment_fts_insert'),
+}
+
+
+class RowWriter:
+    """
+    Inserts rows (tuples of column values) and returns their ids. Ids are
+    reserved up front so children can reference the rows without reading
+    them back; rows go in with COPY on PostgreSQL and with a plain
+    executemany elsewhere, bypassing the ORM's per-value work.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+        self.written = 0
+        self.id_ranges = defaultdict(list)
+
+    def reserve_ids(self, table, count):
+        with connection.cursor() as cursor:
+            if self.use_copy:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                    [table, count],
+                )
+                return [pk for pk, in cursor.fetchall()]
+            # SQLite has one writer at a time: safe once the transaction has
+            # written (holds the write lock), or while nothing else writes.
+            # The tables are AUTOINCREMENT, so ids of deleted and archived
+            # rows above MAX(id) stay used; sqlite_sequence holds the highest
+            # id ever inserted (explicit ones included).
+            cursor.execute(
+                f'SELECT MAX(COALESCE((SELECT MAX(id) FROM {table}), 0), '
+                f'COALESCE((SELECT seq FROM sqlite_sequence WHERE name = %s), 0))',
+                [table],
+            )
+            start = cursor.fetchone()[0] + 1
+        return list(range(start, start + count))
+
+    def insert(self, model, columns, rows):
+        if not rows:
+            return []
+        table = model._meta.db_table
+        ids = self.reserve_ids(table, len(rows))
+        self.written += len(rows)
+        self.id_ranges[model].append((ids[0], ids[-1]))
+        if self.use_copy:
+            self.copy(model, columns, ids, rows)
+            return ids
+
+        adapters = [self.adapter(model._meta.get_field(column)) for column in columns]
+        values = [
+            (pk, *(adapt(value) if adapt else value for adapt, value in zip(adapters, row)))
+            for pk, row in zip(ids, rows)
+        ]
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        sql = f"INSERT INTO {table} (id, {', '.join(columns)}) VALUES ({placeholders})"
+        with connection.cursor() as cursor:
+            for start in range(0, len(values), self.batch_size):
+                cursor.executemany(sql, values[start:start + self.batch_size])
+        return ids
+
+    @staticmethod
+    def adapter(field):
+        if isinstance(field, models.DateTimeField):
+            return connection.ops.adapt_datetimefield_value
+        if isinstance(field, models.DateField):
+            return connection.ops.adapt_datefield_value
+        return None
+
+    @contextmanager
+    def deferred_search_index(self):
+        """
+        On SQLite, index the rows inserted in the block in one statement per
+        table at the end instead of one trigger run per row, which is
+        several times faster. Must run inside a transaction.
+        """
+        if connection.vendor != 'sqlite':
+            yield
+            return
+        names = [trigger for _, _, trigger in SQLITE_SEARCH_INDEXES.values()]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s)",
+                names,
+            )
+            triggers = cursor.fetchall()
+            for name, _ in triggers:
+                cursor.execute(f'DROP TRIGGER {name}')
+        self.id_ranges.clear()
+        yield
+        with connection.cursor() as cursor:
+            for _, sql in triggers:
+                cursor.execute(sql)
+            for model, (fts_table, columns, _) in SQLITE_SEARCH_INDEXES.items():
+                for first, last in self.id_ranges[model]:
+                    cursor.execute(
+                        f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) "
+                        f"SELECT id, {', '.join(columns)} FROM {model._meta.db_table} "
+                        f"WHERE id BETWEEN %s AND %s",
+                        [first, last],
+                    )
+
+    def copy(self, model, columns, ids, rows):
+        nullable = [column for column in columns if model._meta.get_field(column).null]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for pk, row in zip(ids, rows):
+            writer.writerow([pk, *('' if value is None else value for value in row)])
+        buffer.seek(0)
+
+        options = 'FORMAT csv'
+        if nullable:
+            # Empty quoted values of nullable columns are NULLs
+            options += f", FORCE_NULL ({', '.join(nullable)})"
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {model._meta.db_table} (id, {', '.join(columns)}) FROM STDIN WITH ({options})",
+                buffer,
+            )
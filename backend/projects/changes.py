@@ -0,0 +1,160 @@
+"""
+Change log behind the ``changes(since)`` query, which lets clients sync in
+O(changes) rather than refetching every row.
+
+Writes call ``record_changes`` inside their transaction with the objects
+they saved and deleted. It appends ChangeLogEntry rows whose ids are the
+feed's cursors, after taking a row lock on the organization that is held
+until commit: entries of one organization therefore become visible in id
+order, and a client that has read up to an id never misses a lower one
+committed later. The lock is FOR NO KEY UPDATE, so it does not block
+inserts referencing the organization, only other change log writers.
+
+Deleting a project or task deletes its tasks and comments too;
+``project_tombstones`` and ``task_tombstones`` list all of them, archived
+ones included, and must be called before the delete.
+
+Archival moves tasks and comments under the same ids without logging a
+change (see archive.py), so saved entries whose object has left the live
+table are read from ARCHIVE_MODELS instead.
+"""
+from django.db import transaction
+
+from .models import (
+    ArchivedTask, ArchivedTaskComment, ChangeLogEntry, Organization, Project, Task, TaskComment,
+)
+
+PROJECT = 'project'
+TASK = 'task'
+COMMENT = 'comment'
+
+MODELS = {PROJECT: Project, TASK: Task, COMMENT: TaskComment}
+
+# Where objects of a kind go when archived
+ARCHIVE_MODELS = {TASK: ArchivedTask, COMMENT: ArchivedTaskComment}
+
+# How each kind is scoped to an organization
+ORGANIZATION_FIELDS = {
+    PROJECT: 'organization',
+    TASK: 'organization',
+    COMMENT: 'organization',
+}
+
+
+def record_changes(organization_id, saved=(), deleted=()):
+    """
+    Log ``(kind, object_id)`` pairs as saved or deleted. Must run in the
+    same transaction as the writes.
+    """
+    entries = [
+        ChangeLogEntry(organization_id=organization_id, kind=kind, object_id=object_id)
+        for kind, object_id in saved
+    ]
+    entries += [
+        ChangeLogEntry(organization_id=organization_id, kind=kind, object_id=object_id, deleted=True)
+        for kind, object_id in deleted
+    ]
+    if not entries:
+        return
+    lock_change_log(organization_id)
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def lock_change_log(organization_id):
+    """
+    Serialize change log writers of an organization until commit. Bulk
+    writers that insert ChangeLogEntry rows themselves call this first.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            'Change log entries must be written in the transaction of the writes they log'
+        )
+    list(
+        Organization.objects.select_for_update(no_key=True)
+        .filter(pk=organization_id).order_by().values_list('pk', flat=True)
+    )
+
+
+def task_tombstones(task_ids):
+    """The tasks ``task_ids`` and their comments, as deleted pairs."""
+    task_ids = list(task_ids)
+    comment_ids = TaskComment.objects.filter(task_id__in=task_ids).values_list('id', flat=True)
+    return [(TASK, pk) for pk in task_ids] + [(COMMENT, pk) for pk in comment_ids]
+
+
+def project_tombstones(project_ids):
+    """
+    The projects ``project_ids`` with their tasks and comments, live and
+    archived, as deleted pairs.
+    """
+    project_ids = list(project_ids)
+    pairs = [(PROJECT, pk) for pk in project_ids]
+    for task_model, comment_model in ((Task, TaskComment), (ArchivedTask, ArchivedTaskComment)):
+        task_ids = task_model.objects.filter(project_id__in=project_ids).values_list('id', flat=True)
+        comment_ids = comment_model.objects.filter(
+            task__project_id__in=project_ids
+        ).values_list('id', flat=True)
+        pairs += [(TASK, pk) for pk in task_ids] + [(COMMENT, pk) for pk in comment_ids]
+    return pairs
+
+
+def latest_entry_id(organization):
+    """The cursor a client should keep before fetching everything afresh."""
+    entry = (
+        ChangeLogEntry.objects.filter(organization=organization)
+        .order_by('-id').values_list('id', flat=True).first()
+    )
+    return entry or 0
+
+
+class ChangeSet:
+    """
+    One page of the feed: the current state of every object saved since the
+    cursor, by kind, and the ``(kind, id)`` pairs of those deleted.
+    """
+
+    def __init__(self, cursor, has_more, saved, deleted):
+        self.cursor = cursor
+        self.has_more = has_more
+        self.saved = saved
+        self.deleted = deleted
+
+    @property
+    def instances(self):
+        return [instance for instances in self.saved.values() for instance in instances]
+
+
+def read_changes(organization, since, limit):
+    """
+    Return the ChangeSet for at most ``limit`` log entries after entry id
+    ``since``. Objects changed several times appear once; objects saved
+    and deleted later on are left to the page holding their tombstone.
+    """
+    entries = list(
+        ChangeLogEntry.objects.filter(organization=organization, id__gt=since)
+        .order_by('id').values_list('id', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for entry_id, kind, object_id, deleted in entries:
+        latest[kind, object_id] = deleted
+
+    saved = {}
+    for kind, model in MODELS.items():
+        ids = [pk for (k, pk), deleted in latest.items() if k == kind and not deleted]
+        found = model.objects.filter(**{ORGANIZATION_FIELDS[kind]: organization}).in_bulk(ids)
+        missing = [pk for pk in ids if pk not in found]
+        if missing and kind in ARCHIVE_MODELS:
+            found.update(
+                ARCHIVE_MODELS[kind].objects.filter(organization=organization).in_bulk(missing)
+            )
+        saved[kind] = [found[pk] for pk in ids if pk in found]
+
+    return ChangeSet(
+        cursor=entries[-1][0] if entries else since,
+        has_more=has_more,
+        saved=saved,
+        deleted=[pair for pair, deleted in latest.items() if deleted],
+    )
@@ -0,0 +1,46 @@
+"""
+System checks for features that only work when every worker process sees
+the same cache: a version bump or sticky-primary flag written by one worker
+must reach the others.
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose entries only the writing process can read
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def is_shared_cache(alias):
+    """Whether the cache ``alias`` is one all worker processes share."""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is not None and backend not in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    response_cache = getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {})
+    alias = response_cache.get('CACHE_ALIAS', 'default')
+    if response_cache.get('ENABLED', False) and not is_shared_cache(alias):
+        return [Error(
+            f'The GraphQL response cache needs a shared cache, and {alias!r} is process-local.',
+            hint='Set CACHE_DIR, point CACHE_ALIAS at a shared backend, or disable GRAPHQL_RESPONSE_CACHE.',
+            id='projects.E001',
+        )]
+    return []
+
+
+@register()
+def check_read_replicas(app_configs, **kwargs):
+    read_replicas = getattr(settings, 'READ_REPLICAS', {})
+    alias = read_replicas.get('CACHE_ALIAS', 'default')
+    if read_replicas.get('ALIASES') and not is_shared_cache(alias):
+        return [Error(
+            f'Read replicas need a shared cache for the sticky-primary flags, and {alias!r} is process-local.',
+            hint='Set CACHE_DIR or point READ_REPLICAS CACHE_ALIAS at a shared backend '
+                 '(file, Redis or database), or unset DATABASE_REPLICA_URLS.',
+            id='projects.E002',
+        )]
+    return []
@@ -0,0 +1,145 @@
+"""
+Maintenance of the materialized ProjectTaskCounters rows.
+
+Task writes call ``adjust_counters`` inside their transaction, which turns
+the tasks entering and leaving a project into F-expression increments on
+its counters row. ``rebuild_counters`` and ``find_drift`` recompute the same
+numbers from the task tables for backfills and consistency checks.
+
+Archived tasks stay counted: archival moves rows to cheaper storage but does
+not change what statistics report, so the counts cover the Task and
+ArchivedTask tables together.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, Q
+
+from .models import Project, ProjectTaskCounters, Task
+
+STATUS_FIELDS = [status for status, _ in Task.STATUS_CHOICES]
+PRIORITY_FIELDS = [priority for priority, _ in Task.PRIORITY_CHOICES]
+COUNTER_FIELDS = ['total'] + STATUS_FIELDS + PRIORITY_FIELDS
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def counted_fields(status, priority):
+    """
+    Return the counter columns a task with ``status``/``priority`` adds to.
+    """
+    fields = ['total']
+    if status in STATUS_FIELDS:
+        fields.append(status)
+    if priority in PRIORITY_FIELDS:
+        fields.append(priority)
+    return fields
+
+
+def adjust_counters(project_id, added=(), removed=()):
+    """
+    Apply the counter deltas for tasks added to and removed from a project.
+
+    ``added`` and ``removed`` are iterables of ``(status, priority)`` pairs;
+    an update is a removal of the old pair plus an addition of the new one.
+    Must run in the same transaction as the task writes.
+    """
+    deltas = Counter()
+    for status, priority in added:
+        deltas.update(counted_fields(status, priority))
+    for status, priority in removed:
+        deltas.subtract(counted_fields(status, priority))
+
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+
+    counters = ProjectTaskCounters.objects.filter(project_id=project_id)
+    if not counters.update(**changes):
+        # No counters row yet (e.g. project created outside the API). It is
+        # created empty and the delta applied like any other, so concurrent
+        # writers never race a recount; counts from before the row existed
+        # are for rebuild_counters to fill in.
+        ProjectTaskCounters.objects.get_or_create(project_id=project_id)
+        counters.update(**changes)
+
+
+def _count(projects, relation):
+    aggregates = {'total': Count(relation)}
+    aggregates.update({
+        status: Count(relation, filter=Q(**{f'{relation}__status': status}))
+        for status in STATUS_FIELDS
+    })
+    aggregates.update({
+        priority: Count(relation, filter=Q(**{f'{relation}__priority': priority}))
+        for priority in PRIORITY_FIELDS
+    })
+    rows = projects.order_by().annotate(**aggregates).values('id', *COUNTER_FIELDS)
+    return {row.pop('id'): row for row in rows}
+
+
+def compute_counters(projects):
+    """
+    Count the tasks of ``projects``, live and archived, keyed by project id.
+    The two tables are counted separately, as joining both would multiply
+    their rows.
+    """
+    counts = _count(projects, 'tasks')
+    for project_id, archived in _count(projects, 'archived_tasks').items():
+        for field, value in archived.items():
+            counts[project_id][field] += value
+    return counts
+
+
+def _project_id_batches(project_ids=None):
+    if project_ids is None:
+        project_ids = Project.objects.order_by('id').values_list('id', flat=True).iterator()
+    batch = []
+    for project_id in project_ids:
+        batch.append(project_id)
+        if len(batch) == REBUILD_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_counters(project_ids=None):
+    """
+    Recompute and upsert the counters of ``project_ids`` (all projects by
+    default). Returns the number of rows written.
+    """
+    written = 0
+    for batch in _project_id_batches(project_ids):
+        counts = compute_counters(Project.objects.filter(id__in=batch))
+        ProjectTaskCounters.objects.bulk_create(
+            [
+                ProjectTaskCounters(project_id=project_id, **values)
+                for project_id, values in counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['project'],
+            update_fields=COUNTER_FIELDS,
+        )
+        written += len(counts)
+    return written
+
+
+def find_drift(project_ids=None):
+    """
+    Return ``(project_id, field, stored, actual)`` for every counter that
+    disagrees with the task tables. Missing rows are compared as zeros.
+    """
+    drift = []
+    for batch in _project_id_batches(project_ids):
+        actual = compute_counters(Project.objects.filter(id__in=batch))
+        stored = {
+            row.pop('project_id'): row
+            for row in ProjectTaskCounters.objects.filter(project_id__in=batch)
+            .values('project_id', *COUNTER_FIELDS)
+        }
+        for project_id, values in actual.items():
+            current = stored.get(project_id, dict.fromkeys(COUNTER_FIELDS, 0))
+            for field in COUNTER_FIELDS:
+                if current[field] != values[field]:
+                    drift.append((project_id, field, current[field], values[field]))
+    return drift
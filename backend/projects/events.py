@@ -0,0 +1,215 @@
+"""
+Change events behind the GraphQL subscriptions.
+
+Mutations publish small messages (the changed row, serialized) on channels
+such as ``tasks.project.<id>`` once their transaction commits. The broker
+fans them out to subscribers, which are async iterators consumed by the
+WebSocket endpoint (see websockets.py).
+
+InProcessBroker only reaches subscribers of the same process. With several
+worker processes set ``GRAPHQL_SUBSCRIPTIONS['BROKER']`` to a broker that
+crosses processes, such as PostgresBroker, or to any class implementing
+``publish`` and ``subscribe``.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS = getattr(settings, 'GRAPHQL_SUBSCRIPTIONS', {})
+
+
+def task_channel(project_id):
+    return f'tasks.project.{project_id}'
+
+
+def comment_channel(task_id):
+    return f'comments.task.{task_id}'
+
+
+class SubscriberOverflow(Exception):
+    """A subscriber fell more than its queue size behind and was dropped."""
+
+
+class Subscriber:
+    def __init__(self, loop, max_queue):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        if self.overflowed:
+            raise SubscriberOverflow
+        message = await self.queue.get()
+        if self.overflowed:
+            raise SubscriberOverflow
+        return message
+
+
+class InProcessBroker:
+    """
+    Fans messages out to the subscribers of this process. ``publish`` may be
+    called from any thread; each subscriber gets the message on its own
+    event loop.
+    """
+
+    def __init__(self, max_queue=SUBSCRIPTIONS.get('MAX_QUEUE', 100)):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                pass
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    async def subscribe(self, channel):
+        """
+        Yield the messages published on ``channel`` from now on. Raises
+        SubscriberOverflow if the consumer cannot keep up.
+        """
+        subscriber = Subscriber(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        self.on_subscribe(channel)
+        try:
+            while True:
+                yield await subscriber.get()
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel)
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def on_subscribe(self, channel):
+        pass
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Relays messages through PostgreSQL LISTEN/NOTIFY so every process sees
+    the events of every other. A daemon thread per process holds one
+    listening connection and fans notifications out locally.
+    """
+    notify_channel = 'projects_events'
+    # NOTIFY payloads are limited to 8000 bytes
+    max_payload = 7900
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._listener = None
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message}, cls=DjangoJSONEncoder)
+        if len(payload.encode('utf-8')) > self.max_payload:
+            # Subscribers reload rows that do not fit
+            message = dict(message, object=None)
+            payload = json.dumps({'channel': channel, 'message': message}, cls=DjangoJSONEncoder)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+
+    def on_subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self.listen, name='projects-events', daemon=True
+                )
+                self._listener.start()
+
+    def listen(self):
+        import psycopg2
+
+        while True:
+            try:
+                conn = psycopg2.connect(**connection.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.notify_channel}')
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        event = json.loads(conn.notifies.pop(0).payload)
+                        self.deliver(event['channel'], event['message'])
+            except Exception:
+                logger.exception('Event listener lost its connection; reconnecting')
+                threading.Event().wait(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = import_string(
+                SUBSCRIPTIONS.get('BROKER', 'projects.events.InProcessBroker')
+            )
+            _broker = broker_class()
+        return _broker
+
+
+def serialize(instance):
+    return serializers.serialize('json', [instance])
+
+
+def deserialize(data):
+    return next(serializers.deserialize('json', data)).object
+
+
+def publish_on_commit(channel, message):
+    transaction.on_commit(lambda: get_broker().publish(channel, message))
+
+
+def task_changed(action, project_id, task_id, task=None):
+    """
+    Announce that a task was created, updated or deleted; ``task`` is the
+    saved instance unless it was deleted.
+    """
+    publish_on_commit(task_channel(project_id), {
+        'action': action,
+        'task_id': task_id,
+        'object': serialize(task) if task is not None else None,
+    })
+
+
+def comment_added(comment):
+    publish_on_commit(comment_channel(comment.task_id), {
+        'action': 'created',
+        'comment_id': comment.pk,
+        'object': serialize(comment),
+    })
@@ -0,0 +1,305 @@
+"""
+Bulk import of tasks and comments from NDJSON or CSV, behind the
+``import_tasks`` command and the ``importTasks`` mutation.
+
+The file is read as a stream and handled in batches of ``BATCH_SIZE`` rows.
+Each batch is validated row by row and then written in one transaction:
+its tasks, comments and change log entries go in through RowWriter (COPY
+on PostgreSQL), followed by the counter deltas and the job's checkpoint and
+error report. A batch commits
+entirely or not at all, so a job resumed after a failure skips exactly the
+rows already committed.
+
+Task rows name their project by id or by name, resolved through one map of
+the organization's projects loaded up front, and may carry a ``ref``, the
+task's identifier in the source system. Comment rows point at their task
+with ``task_ref`` (a task imported earlier by the same job, kept in
+ImportRef so that resumed jobs still find it) or with ``task_id``. Invalid
+rows are skipped and reported with their row number: the line number for
+NDJSON, the record number for CSV.
+
+Imports do not publish a subscription event per row. Clients learn about
+the new rows from the change feed and the organization version bump.
+"""
+import csv
+import itertools
+import json
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .bulk import COMMENT_COLUMNS, TASK_COLUMNS, RowWriter
+from .changes import COMMENT, TASK, lock_change_log
+from .counters import adjust_counters
+from .models import ChangeLogEntry, ImportJob, ImportRef, Project, Task, TaskComment
+from .response_cache import bump_organization_version
+
+BULK_IMPORT = getattr(settings, 'BULK_IMPORT', {})
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+BATCH_SIZE = BULK_IMPORT.get('BATCH_SIZE', 1000)
+# Errors beyond this many are counted but not stored on the job
+MAX_REPORTED_ERRORS = BULK_IMPORT.get('MAX_REPORTED_ERRORS', 1000)
+
+CHANGE_COLUMNS = ['organization_id', 'kind', 'object_id', 'deleted', 'changed_at']
+
+# Two projects share this name; the row must use the id
+AMBIGUOUS = object()
+
+
+class ImportFailed(Exception):
+    pass
+
+
+class RowError(Exception):
+    pass
+
+
+def guess_format(filename):
+    return CSV if filename.lower().endswith('.csv') else NDJSON
+
+
+def read_rows(stream, format):
+    """
+    Yield ``(row number, values)`` for every record of a text stream, where
+    values is a dict, or an error message for an NDJSON line that is not a
+    JSON object.
+    """
+    if format == CSV:
+        for number, values in enumerate(csv.DictReader(stream), 1):
+            yield number, values
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            values = json.loads(line)
+        except ValueError:
+            yield number, 'Invalid JSON'
+            continue
+        yield number, values if isinstance(values, dict) else 'Expected a JSON object'
+
+
+def _text(values, field, max_length=None, required=False):
+    value = values.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def _choice(values, field, choices, default):
+    """Accept a choice by value or by label, in any case."""
+    value = _text(values, field).lower()
+    if not value:
+        return default
+    for choice, label in choices:
+        if value in (choice, label.lower()):
+            return choice
+    raise RowError(f'Invalid {field} {value!r}')
+
+
+def _datetime(values, field):
+    value = _text(values, field)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = day and datetime.combine(day, time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RowError(f'Invalid {field} {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Importer:
+    """
+    Runs the rows of one ImportJob. ``on_batch(job, errors)`` is called
+    after each batch commits with that batch's row errors.
+    """
+
+    def __init__(self, job, batch_size=None, on_batch=None):
+        self.job = job
+        self.organization = job.organization
+        self.batch_size = batch_size or BATCH_SIZE
+        self.on_batch = on_batch
+        self.writer = RowWriter(self.batch_size)
+        self.projects = self.project_map()
+
+    def project_map(self):
+        """``{id or name: project id}`` for every project of the organization."""
+        by_id = {}
+        by_name = {}
+        for pk, name in Project.objects.filter(organization=self.organization).values_list('id', 'name'):
+            by_id[str(pk)] = pk
+            by_name[name] = AMBIGUOUS if name in by_name else pk
+        # Ids win over names that look like ids
+        return {**by_name, **by_id}
+
+    def run(self, rows):
+        """Import ``rows`` from read_rows, skipping those committed before."""
+        rows = itertools.islice(rows, self.job.checkpoint, None)
+        try:
+            while True:
+                batch = list(itertools.islice(rows, self.batch_size))
+                if not batch:
+                    break
+                errors = self.import_batch(batch)
+                if self.on_batch:
+                    self.on_batch(self.job, errors)
+        except Exception:
+            self.job.status = 'failed'
+            ImportJob.objects.filter(pk=self.job.pk).update(status='failed', updated_at=timezone.now())
+            raise
+        self.job.status = 'completed'
+        self.job.save(update_fields=['status', 'updated_at'])
+        return self.job
+
+    def build_task(self, values, now):
+        """A TASK_COLUMNS row and the task's ref."""
+        project = self.projects.get(_text(values, 'project'))
+        if project is None:
+            raise RowError('Project not found')
+        if project is AMBIGUOUS:
+            raise RowError('Several projects have this name; use the project id')
+        row = (
+            self.organization.id,
+            project,
+            _text(values, 'title', max_length=200, required=True),
+            _text(values, 'description'),
+            _choice(values, 'status', Task.STATUS_CHOICES, 'todo'),
+            _choice(values, 'priority', Task.PRIORITY_CHOICES, 'medium'),
+            _text(values, 'assignee', max_length=100),
+            _datetime(values, 'due_date'),
+            _datetime(values, 'created_at') or now,
+            now,
+        )
+        return row, _text(values, 'ref', max_length=255)
+
+    def build_comment(self, values, now):
+        """A COMMENT_COLUMNS row, with a task id of None when given by ref, and the ref."""
+        task_ref = _text(values, 'task_ref', max_length=255)
+        task_id = _text(values, 'task_id')
+        if not task_ref and not task_id:
+            raise RowError('task_ref or task_id is required')
+        if task_id and not task_id.isdigit():
+            raise RowError(f'Invalid task_id {task_id!r}')
+        row = [
+            self.organization.id,
+            int(task_id) if task_id and not task_ref else None,
+            _text(values, 'author', max_length=100, required=True),
+            _text(values, 'content', required=True),
+            _datetime(values, 'created_at') or now,
+        ]
+        return row, task_ref
+
+    def import_batch(self, batch):
+        """Validate and write one batch; returns its row errors."""
+        now = timezone.now()
+        tasks = []
+        comments = []
+        errors = []
+        refs = set()
+        for number, values in batch:
+            try:
+                if isinstance(values, str):
+                    raise RowError(values)
+                kind = _text(values, 'type').lower() or TASK
+                if kind == TASK:
+                    row, ref = self.build_task(values, now)
+                    if ref and ref in refs:
+                        raise RowError(f'Duplicate ref {ref!r}')
+                    if ref:
+                        refs.add(ref)
+                    tasks.append((number, row, ref))
+                elif kind == COMMENT:
+                    comments.append((number, *self.build_comment(values, now)))
+                else:
+                    raise RowError(f'Unknown type {kind!r}')
+            except RowError as e:
+                errors.append({'row': number, 'message': str(e)})
+
+        organization = self.organization
+        writer = self.writer
+        with transaction.atomic():
+            # Locks the job against a concurrent run; on SQLite the write
+            # also takes the database write lock RowWriter relies on
+            ImportJob.objects.filter(pk=self.job.pk).update(updated_at=now)
+            job = ImportJob.objects.get(pk=self.job.pk)
+            if job.checkpoint != self.job.checkpoint:
+                raise ImportFailed(f'Import {job.pk} was advanced by another run')
+
+            # Refs imported by earlier batches cannot be reused
+            taken = set(
+                ImportRef.objects.filter(job=job, ref__in=refs).values_list('ref', flat=True)
+            )
+            new_tasks = []
+            for number, row, ref in tasks:
+                if ref in taken:
+                    errors.append({'row': number, 'message': f'Duplicate ref {ref!r}'})
+                else:
+                    new_tasks.append((row, ref))
+            task_ids = writer.insert(Task, TASK_COLUMNS, [row for row, _ in new_tasks])
+            ref_ids = {ref: pk for (_, ref), pk in zip(new_tasks, task_ids) if ref}
+            writer.insert(
+                ImportRef, ['job_id', 'ref', 'task_id'],
+                [(job.pk, ref, pk) for ref, pk in ref_ids.items()],
+            )
+
+            # One query each for the refs of earlier batches and the task ids
+            missing_refs = {ref for _, _, ref in comments if ref and ref not in ref_ids}
+            ref_ids.update(
+                ImportRef.objects.filter(job=job, ref__in=missing_refs).values_list('ref', 'task_id')
+            )
+            # Locked so that archival cannot move the tasks before commit
+            owned = set(
+                Task.objects.select_for_update(no_key=True).filter(
+                    id__in={row[1] for _, row, ref in comments if not ref},
+                    organization=organization,
+                ).values_list('id', flat=True)
+            )
+            new_comments = []
+            for number, row, ref in comments:
+                if ref:
+                    row[1] = ref_ids.get(ref)
+                if row[1] is None or (not ref and row[1] not in owned):
+                    errors.append({'row': number, 'message': 'Task not found'})
+                else:
+                    new_comments.append(tuple(row))
+            comment_ids = writer.insert(TaskComment, COMMENT_COLUMNS, new_comments)
+
+            added = {}
+            for row, _ in new_tasks:
+                added.setdefault(row[1], []).append((row[4], row[5]))
+            for project_id, pairs in added.items():
+                adjust_counters(project_id, added=pairs)
+            lock_change_log(organization.id)
+            writer.insert(
+                ChangeLogEntry, CHANGE_COLUMNS,
+                [(organization.id, TASK, pk, False, now) for pk in task_ids]
+                + [(organization.id, COMMENT, pk, False, now) for pk in comment_ids],
+            )
+
+            errors.sort(key=lambda error: error['row'])
+            job.checkpoint += len(batch)
+            job.imported_tasks += len(task_ids)
+            job.imported_comments += len(comment_ids)
+            job.failed_rows += len(errors)
+            job.errors += errors[:max(0, MAX_REPORTED_ERRORS - len(job.errors))]
+            job.save()
+            bump_organization_version(organization.id)
+        self.job = job
+        return errors
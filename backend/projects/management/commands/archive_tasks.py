@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.archive import AFTER_DAYS, BATCH_SIZE, archivable_tasks, archive_cutoff, archive_tasks
+from projects.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Move old done tasks and their comments to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=AFTER_DAYS,
+            help=f'Archive done tasks not updated for this many days (default {AFTER_DAYS})',
+        )
+        parser.add_argument(
+            '--organization',
+            help='Limit to tasks of the organization with this slug',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Tasks moved per transaction')
+        parser.add_argument('--max-batches', type=int,
+                            help='Stop after this many batches; run again to continue')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many tasks would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        organization = None
+        if options['organization']:
+            try:
+                organization = Organization.objects.get(slug=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"No organization {options['organization']!r}")
+
+        before = archive_cutoff(options['older_than_days'])
+        if options['dry_run']:
+            count = archivable_tasks(before, organization).count()
+            self.stdout.write(f'{count} tasks last updated before {before:%Y-%m-%d} would be archived')
+            return
+
+        tasks, comments = archive_tasks(
+            before, organization, options['batch_size'], options['max_batches']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {tasks} tasks and {comments} comments'))
@@ -0,0 +1,347 @@
+import json
+import math
+import re
+import statistics
+import subprocess
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from graphql import OperationType, get_operation_ast, parse
+
+from projects.models import Organization, Project, Task, TaskComment
+from projects.views import PersistedQueryGraphQLView
+
+FRONTEND_COMPONENTS = Path(settings.BASE_DIR).parent / 'frontend' / 'src' / 'components'
+
+GQL_DOCUMENT = re.compile(r'\bgql`(.*?)`', re.S)
+
+# Operations the frontend does not send yet but dashboards will
+EXTRA_DOCUMENTS = [
+    '''
+    query OrganizationStats {
+      organizationStats {
+        totalProjects activeProjects completedProjects totalTasks completedTasks
+        overallCompletionRate
+      }
+    }
+    ''',
+    '''
+    query ProjectStats($projectId: ID!) {
+      projectStats(projectId: $projectId) {
+        projectName totalTasks completedTasks inProgressTasks todoTasks completionRate
+      }
+    }
+    ''',
+]
+
+# Values for the variables of the replayed operations, by variable name;
+# ``project`` and ``task`` are filled in from the dataset
+VARIABLES = {
+    'projectId': 'project',
+    'id': 'project',
+    'taskId': 'task',
+    'name': 'Benchmark project',
+    'title': 'Benchmark task',
+    'author': 'benchmark',
+    'content': 'Benchmark comment',
+}
+OPERATION_VARIABLES = {
+    'UpdateTask': {'status': 'in_progress'},
+}
+
+
+def load_documents(directory=FRONTEND_COMPONENTS):
+    """
+    Return ``{operation name: document text}`` for every gql document in the
+    frontend components, plus EXTRA_DOCUMENTS.
+    """
+    sources = [
+        match.group(1)
+        for path in sorted(Path(directory).glob('*.tsx'))
+        for match in GQL_DOCUMENT.finditer(path.read_text(encoding='utf-8'))
+    ]
+    documents = {}
+    for source in sources + EXTRA_DOCUMENTS:
+        if '${' in source:
+            raise CommandError(f'Interpolated gql documents are not supported: {source[:60]}...')
+        operation = get_operation_ast(parse(source))
+        if operation is None or operation.name is None:
+            raise CommandError(f'Expected one named operation in: {source[:60]}...')
+        documents[operation.name.value] = source
+    return documents
+
+
+def operation_type(document):
+    return get_operation_ast(parse(document)).operation
+
+
+def build_variables(name, document, dataset):
+    variables = {}
+    for definition in get_operation_ast(parse(document)).variable_definitions:
+        variable = definition.variable.name.value
+        value = VARIABLES.get(variable)
+        if value in dataset:
+            value = dataset[value]
+        if value is not None:
+            variables[variable] = value
+        elif definition.type.kind == 'non_null_type':
+            raise CommandError(f'No benchmark value for ${variable} of {name}')
+    variables.update(OPERATION_VARIABLES.get(name, {}))
+    return variables
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(timings, queries, peak_memory, errors, elapsed):
+    ordered = sorted(timings)
+    return {
+        'iterations': len(timings),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        'queries': queries,
+        'peak_memory_kb': peak_memory,
+        'errors': errors,
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compare two result files: any operation whose p95 grew by more than
+    ``tolerance`` (a fraction), or that runs more SQL queries, regressed.
+    """
+    regressions = []
+    for name, current in results['operations'].items():
+        previous = baseline['operations'].get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']} ms, was {previous['p95_ms']} ms"
+            )
+        if None not in (current['queries'], previous['queries']) and current['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {current['queries']} queries, was {previous['queries']}"
+            )
+        if current['errors'] and not previous['errors']:
+            regressions.append(f"{name}: {current['errors']} errors")
+    return regressions
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Replay the GraphQL operations of the frontend against seeded data and '
+            'report latency, throughput, query counts and memory per operation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', default='load-0',
+                            help='Slug of the seeded organization to query (see seed_load)')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--operations', nargs='*',
+                            help='Only run these operations, by name')
+        parser.add_argument('--include-mutations', action='store_true',
+                            help='Replay mutations too; with the test client each one is '
+                                 'rolled back, against --url they are not')
+        parser.add_argument('--response-cache', action='store_true',
+                            help='Keep the GraphQL response cache on; by default every '
+                                 'iteration executes')
+        parser.add_argument('--url',
+                            help='GraphQL endpoint of a running server instead of the '
+                                 'in-process test client')
+        parser.add_argument('--frontend', default=str(FRONTEND_COMPONENTS),
+                            help='Directory of the frontend components holding the gql documents')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Fail on regressions against this results file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 growth over the baseline (default 0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(
+                f"No organization {options['organization']!r}; generate data with seed_load first"
+            )
+        dataset = self.pick_dataset(organization)
+
+        documents = load_documents(options['frontend'])
+        if options['operations']:
+            unknown = set(options['operations']) - set(documents)
+            if unknown:
+                raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+            documents = {name: documents[name] for name in options['operations']}
+        elif not options['include_mutations']:
+            documents = {
+                name: document for name, document in documents.items()
+                if operation_type(document) == OperationType.QUERY
+            }
+
+        self.options = options
+        self.organization = organization
+        cache_responses = PersistedQueryGraphQLView.cache_responses
+        PersistedQueryGraphQLView.cache_responses = options['response_cache']
+        try:
+            operations = {}
+            for name, document in documents.items():
+                variables = build_variables(name, document, dataset)
+                operations[name] = self.benchmark(name, document, variables)
+                result = operations[name]
+                self.stdout.write(
+                    f"{name:<20} p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  "
+                    f"p99 {result['p99_ms']:>8.2f} ms  {result['throughput_rps'] or 0:>8.1f} req/s  "
+                    f"{result['queries'] if result['queries'] is not None else '-':>4} queries  "
+                    f"{result['peak_memory_kb'] if result['peak_memory_kb'] is not None else '-':>6} KiB"
+                    + (f"  {result['errors']} errors" if result['errors'] else '')
+                )
+        finally:
+            PersistedQueryGraphQLView.cache_responses = cache_responses
+
+        results = {
+            'meta': {
+                'revision': self.revision(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'target': options['url'] or 'test-client',
+                'organization': organization.slug,
+                'dataset': dataset['counts'],
+                'iterations': options['iterations'],
+            },
+            'operations': operations,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            regressions = find_regressions(results, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def pick_dataset(self, organization):
+        """The organization's largest project and that project's most discussed task."""
+        project = (
+            Project.objects.filter(organization=organization)
+            .annotate(task_count=Count('tasks')).order_by('-task_count', 'id').first()
+        )
+        if project is None:
+            raise CommandError(f'{organization.slug} has no projects')
+        task = (
+            Task.objects.filter(project=project)
+            .annotate(comment_count=Count('comments')).order_by('-comment_count', 'id').first()
+        )
+        return {
+            'project': str(project.id),
+            'task': str(task.id) if task else None,
+            'counts': {
+                'projects': Project.objects.filter(organization=organization).count(),
+                'tasks': Task.objects.filter(organization=organization).count(),
+                'comments': TaskComment.objects.filter(organization=organization).count(),
+                'project_tasks': project.task_count,
+                'task_comments': task.comment_count if task else 0,
+            },
+        }
+
+    def benchmark(self, name, document, variables):
+        body = {'query': document, 'operationName': name, 'variables': variables}
+        run = self.post_url if self.options['url'] else self.post_client
+        for _ in range(self.options['warmup']):
+            run(body)
+
+        timings = []
+        query_counts = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(self.options['iterations']):
+            start = time.perf_counter()
+            ok, queries = run(body)
+            timings.append(time.perf_counter() - start)
+            errors += not ok
+            query_counts.append(queries)
+        elapsed = time.perf_counter() - started
+
+        queries = None if None in query_counts else statistics.median_low(query_counts)
+        return summarize(timings, queries, self.peak_memory(run, body), errors, elapsed)
+
+    def peak_memory(self, run, body):
+        """Peak Python allocations of one extra, untimed run (test client only)."""
+        if self.options['url']:
+            return None
+        tracemalloc.start()
+        try:
+            run(body)
+            return round(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+    def post_client(self, body):
+        client = Client(SERVER_NAME='localhost', HTTP_X_ORGANIZATION=self.organization.slug)
+        counter = QueryCounter()
+        # Each run starts from the same data; mutations are undone
+        with transaction.atomic(), connection.execute_wrapper(counter):
+            response = client.post('/graphql/', body, content_type='application/json')
+            transaction.set_rollback(True)
+        return self.succeeded(response.status_code, response.content), counter.count
+
+    def post_url(self, body):
+        request = urllib.request.Request(
+            self.options['url'],
+            data=json.dumps(body).encode(),
+            headers={'Content-Type': 'application/json', 'X-Organization': self.organization.slug},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return self.succeeded(response.status, response.read()), None
+        except OSError:
+            return False, None
+
+    @staticmethod
+    def succeeded(status, content):
+        """A 200 without errors, and no mutation payload reporting failure."""
+        if status != 200:
+            return False
+        try:
+            body = json.loads(content)
+        except ValueError:
+            return False
+        if 'errors' in body:
+            return False
+        return not any(
+            isinstance(payload, dict) and payload.get('success') is False
+            for payload in (body.get('data') or {}).values()
+        )
+
+    @staticmethod
+    def revision():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
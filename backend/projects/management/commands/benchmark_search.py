@@ -0,0 +1,86 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects.counters import rebuild_counters
+from projects.management.vocabulary import vocabulary
+from projects.models import Organization, Project, Task
+from projects.search import search
+
+
+class Command(BaseCommand):
+    help = 'Time full-text search on a generated dataset of tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1_000_000,
+                            help='Size of the dataset to search (default 1,000,000)')
+        parser.add_argument('--organization', default='search-benchmark',
+                            help='Slug of the organization holding the dataset')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Searches per query')
+        parser.add_argument('--budget-ms', type=float, default=50.0,
+                            help='Fail if any query has a p95 above this')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        organization, _ = Organization.objects.get_or_create(
+            slug=options['organization'],
+            defaults={'name': 'Search benchmark', 'contact_email': 'bench@example.com'},
+        )
+        existing = Task.objects.filter(organization=organization).count()
+        if existing < options['tasks']:
+            self.generate(organization, options['tasks'] - existing, options['seed'])
+
+        words = vocabulary(options['seed'])
+        # A frequent word, a rare word and a two-word query
+        queries = (words[100], words[1000], f'{words[50]} {words[500]}')
+
+        failures = []
+        for query in queries:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                search(organization, query, limit=51)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p50 = statistics.median(timings)
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(f'{query!r}: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms')
+            if p95 > options['budget_ms']:
+                failures.append(query)
+
+        if failures:
+            raise CommandError(
+                f"p95 above {options['budget_ms']} ms for: {', '.join(failures)}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"All queries within {options['budget_ms']} ms over {options['tasks']} tasks"
+        ))
+
+    def generate(self, organization, count, seed, batch_size=10_000):
+        rng = random.Random(seed)
+        words = vocabulary(seed)
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        projects = list(Project.objects.filter(organization=organization))
+        while len(projects) < 100:
+            projects.append(
+                Project.objects.create(organization=organization, name=f'Project {len(projects)}')
+            )
+
+        self.stdout.write(f'Generating {count} tasks...')
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                Task.objects.bulk_create(
+                    Task(
+                        organization=organization,
+                        project=rng.choice(projects),
+                        title=' '.join(rng.choices(words, cum_weights=weights, k=4)).capitalize(),
+                        description=' '.join(rng.choices(words, cum_weights=weights, k=20)),
+                    )
+                    for _ in range(min(batch_size, count - start))
+                )
+        rebuild_counters([project.id for project in projects])
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_sequence
+
+from projects.export import CHUNK_SIZE, FORMATS, KINDS, NDJSON, export_chunks
+from projects.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Stream an organization's projects, tasks and comments as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', help='Slug of the organization to export')
+        parser.add_argument('--format', choices=sorted(FORMATS), default=NDJSON)
+        parser.add_argument(
+            '--kind',
+            choices=KINDS,
+            help='Only export this kind of object; required for CSV',
+        )
+        parser.add_argument('--output', help='File to write; standard output by default')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output file')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows fetched from the database cursor at a time')
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization {options['organization']!r}")
+        if options['gzip'] and not options['output']:
+            raise CommandError('--gzip needs --output')
+
+        try:
+            chunks = export_chunks(
+                organization, options['format'], options['kind'], options['chunk_size']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+
+        if options['gzip']:
+            chunks = compress_sequence(chunks)
+        size = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {size} bytes to {options['output']}"))
@@ -0,0 +1,79 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.imports import FORMATS, ImportFailed, Importer, guess_format, read_rows
+from projects.models import ImportJob, Organization
+
+
+class Command(BaseCommand):
+    help = 'Import tasks and comments for an organization from an NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', help='Slug of the organization to import into')
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the file; guessed from its extension by default')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows validated and committed together')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID',
+                            help='Continue a failed import of the same file after its checkpoint')
+        parser.add_argument('--error-report',
+                            help='Write every rejected row to this CSV file (appended to on resume)')
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(slug=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization {options['organization']!r}")
+        source = os.path.basename(options['path'])
+        format = options['format'] or guess_format(source)
+
+        if options['resume']:
+            try:
+                job = ImportJob.objects.get(pk=options['resume'], organization=organization)
+            except ImportJob.DoesNotExist:
+                raise CommandError(f"No import {options['resume']} for {organization.slug}")
+            if job.status == 'completed':
+                raise CommandError(f'Import {job.pk} already completed')
+            if (job.source, job.format) != (source[:255], format):
+                raise CommandError(f'Import {job.pk} was of {job.source} ({job.format})')
+            self.stdout.write(f'Resuming import {job.pk} after row {job.checkpoint}')
+        else:
+            job = ImportJob.objects.create(organization=organization, source=source[:255], format=format)
+
+        report = None
+        if options['error_report']:
+            report = open(options['error_report'], 'a' if options['resume'] else 'w', newline='')
+            writer = csv.writer(report)
+            if not options['resume']:
+                writer.writerow(['row', 'message'])
+
+        def on_batch(job, errors):
+            if report:
+                writer.writerows([error['row'], error['message']] for error in errors)
+                report.flush()
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{job.checkpoint} rows: {job.imported_tasks} tasks, '
+                    f'{job.imported_comments} comments, {job.failed_rows} rejected'
+                )
+
+        importer = Importer(job, options['batch_size'], on_batch)
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                job = importer.run(read_rows(stream, format))
+        except (ImportFailed, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(
+                f'Import {job.pk} stopped after {importer.job.checkpoint} rows: {e}. '
+                f'Rerun with --resume {job.pk} to continue'
+            )
+        finally:
+            if report:
+                report.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Import {job.pk}: {job.imported_tasks} tasks and {job.imported_comments} comments '
+            f'imported, {job.failed_rows} rows rejected'
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects.counters import find_drift, rebuild_counters
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the materialized per-project task counters'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report counters that disagree with the task tables',
+        )
+        parser.add_argument(
+            '--organization',
+            help='Limit to projects of the organization with this slug',
+        )
+    
+    def handle(self, *args, **options):
+        project_ids = None
+        if options['organization']:
+            project_ids = list(
+                Project.objects.filter(organization__slug=options['organization'])
+                .values_list('id', flat=True)
+            )
+        
+        if options['verify']:
+            drift = find_drift(project_ids)
+            for project_id, field, stored, actual in drift:
+                self.stdout.write(
+                    f'project {project_id}: {field} is {stored}, expected {actual}'
+                )
+            if drift:
+                raise CommandError(f'{len(drift)} counters have drifted')
+            self.stdout.write(self.style.SUCCESS('Task counters are consistent'))
+            return
+        
+        with transaction.atomic():
+            written = rebuild_counters(project_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt task counters for {written} projects')
+        )
@@ -0,0 +1,207 @@
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects.bulk import COMMENT_COLUMNS, PROJECT_COLUMNS, TASK_COLUMNS, RowWriter
+from projects.counters import rebuild_counters
+from projects.management.vocabulary import vocabulary
+from projects.models import Organization, Project, Task, TaskComment
+
+# Fixed so that generated timestamps do not depend on when the command runs
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SPAN_DAYS = 365
+
+# Texts are drawn from pools generated once per run; building every text
+# word by word would dominate the run time
+TEXT_POOL_SIZE = 20_000
+
+
+def parse_weights(spec, choices):
+    """
+    Parse ``'todo=3,done=5'`` into ``{'todo': 3.0, 'done': 5.0}``, checking
+    every key against ``choices``.
+    """
+    weights = {}
+    for part in spec.split(','):
+        key, sep, value = part.partition('=')
+        key = key.strip()
+        if key not in choices or not sep:
+            raise CommandError(f'Expected {"/".join(choices)}=<weight> pairs, got {part!r}')
+        try:
+            weights[key] = float(value)
+        except ValueError:
+            raise CommandError(f'Invalid weight in {part!r}')
+    if not weights or sum(weights.values()) <= 0:
+        raise CommandError(f'No positive weights in {spec!r}')
+    return weights
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic multi-tenant dataset for load tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=10,
+                            help='Number of organizations to generate')
+        parser.add_argument('--projects', type=int, default=20,
+                            help='Mean number of projects per organization')
+        parser.add_argument('--tasks', type=int, default=200,
+                            help='Mean number of tasks per project')
+        parser.add_argument('--comments', type=float, default=3.0,
+                            help='Mean number of comments per task')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent of organization sizes; 0 makes every organization '
+                                 'the same size')
+        parser.add_argument('--statuses', default='todo=3,in_progress=2,done=5',
+                            help='Relative weights of task statuses')
+        parser.add_argument('--priorities', default='low=3,medium=4,high=2,urgent=1',
+                            help='Relative weights of task priorities')
+        parser.add_argument('--assignees', type=int, default=25,
+                            help='Number of distinct assignees per organization')
+        parser.add_argument('--unassigned', type=float, default=0.2,
+                            help='Share of tasks without an assignee')
+        parser.add_argument('--due-dates', type=float, default=0.6,
+                            help='Share of tasks with a due date')
+        parser.add_argument('--prefix', default='load',
+                            help='Slug prefix of the generated organizations')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        self.statuses = parse_weights(options['statuses'], [s for s, _ in Task.STATUS_CHOICES])
+        self.priorities = parse_weights(options['priorities'], [p for p, _ in Task.PRIORITY_CHOICES])
+        if options['assignees'] < 1:
+            raise CommandError('--assignees must be at least 1')
+        self.options = options
+        self.status_choices = list(self.statuses)
+        self.status_weights = list(itertools.accumulate(self.statuses.values()))
+        self.priority_choices = list(self.priorities)
+        self.priority_weights = list(itertools.accumulate(self.priorities.values()))
+
+        self.words = vocabulary(options['seed'])
+        self.word_weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(self.words) + 1))
+        )
+        rng = random.Random(options['seed'])
+        self.titles = self.pool(rng, 3, 6)
+        self.descriptions = self.pool(rng, 0, 30)
+        self.comments = self.pool(rng, 5, 25)
+        writer = RowWriter(options['batch_size'])
+
+        count = options['organizations']
+        sizes = [1 / (index + 1) ** options['skew'] for index in range(count)]
+        scale = count / sum(sizes) if sizes else 0
+
+        start = time.perf_counter()
+        for index in range(count):
+            slug = f"{options['prefix']}-{index}"
+            if Organization.objects.filter(slug=slug).exists():
+                self.stdout.write(f'{slug} already exists, skipping')
+                continue
+            projects = max(1, round(options['projects'] * sizes[index] * scale))
+            with transaction.atomic(), writer.deferred_search_index():
+                self.generate_organization(writer, index, slug, projects)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{slug}: {projects} projects, {writer.written} rows so far '
+                f'({writer.written / elapsed:,.0f} rows/s)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {writer.written} rows in {time.perf_counter() - start:.1f} s'
+        ))
+
+    def pool(self, rng, low, high):
+        """Texts of ``low`` to ``high`` words, drawn with Zipf frequencies."""
+        return [
+            ' '.join(rng.choices(self.words, cum_weights=self.word_weights, k=rng.randint(low, high)))
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+
+    def timestamp(self, rng, after=EPOCH):
+        remaining = (EPOCH + timedelta(days=SPAN_DAYS) - after).total_seconds()
+        return after + timedelta(seconds=rng.random() * max(remaining, 0))
+
+    def generate_organization(self, writer, index, slug, project_count):
+        options = self.options
+        # Each organization has its own stream, so it does not change when
+        # --organizations does
+        rng = random.Random(f"{options['seed']}:{index}")
+        organization = Organization.objects.create(
+            name=f'Load {index}', slug=slug, contact_email=f'ops@{slug}.test', created_at=EPOCH,
+        )
+        assignees = [
+            f'{first.capitalize()} {last.capitalize()}'
+            for first, last in zip(
+                rng.sample(self.words, options['assignees']),
+                rng.sample(self.words, options['assignees']),
+            )
+        ]
+        project_statuses = [status for status, _ in Project.STATUS_CHOICES]
+
+        projects = []
+        for number in range(project_count):
+            created_at = self.timestamp(rng)
+            due_date = None
+            if rng.random() < 0.5:
+                due_date = (created_at + timedelta(days=rng.randint(30, 365))).date()
+            projects.append((
+                organization.id,
+                f'{rng.choice(self.titles).title()} {number}',
+                rng.choice(self.descriptions),
+                rng.choice(project_statuses),
+                due_date,
+                created_at,
+            ))
+        project_ids = writer.insert(Project, PROJECT_COLUMNS, projects)
+
+        tasks = []
+        for project_id, project in zip(project_ids, projects):
+            for _ in range(rng.randint(0, 2 * options['tasks'])):
+                tasks.append(self.task_row(rng, organization, project_id, project[-1], assignees))
+                if len(tasks) >= options['batch_size']:
+                    self.insert_tasks(writer, rng, tasks, assignees)
+                    tasks = []
+        self.insert_tasks(writer, rng, tasks, assignees)
+        rebuild_counters(project_ids)
+
+    def task_row(self, rng, organization, project_id, project_created_at, assignees):
+        options = self.options
+        created_at = self.timestamp(rng, after=project_created_at)
+        due_date = None
+        if rng.random() < options['due_dates']:
+            due_date = created_at + timedelta(days=rng.randint(1, 60))
+        return (
+            organization.id,
+            project_id,
+            rng.choice(self.titles).capitalize(),
+            rng.choice(self.descriptions),
+            rng.choices(self.status_choices, cum_weights=self.status_weights)[0],
+            rng.choices(self.priority_choices, cum_weights=self.priority_weights)[0],
+            '' if rng.random() < options['unassigned'] else rng.choice(assignees),
+            due_date,
+            created_at,
+            created_at,
+        )
+
+    def insert_tasks(self, writer, rng, tasks, assignees):
+        task_ids = writer.insert(Task, TASK_COLUMNS, tasks)
+        mean = self.options['comments']
+        comments = []
+        for task_id, task in zip(task_ids, tasks):
+            count = int(rng.expovariate(1 / mean)) if mean > 0 else 0
+            for _ in range(count):
+                comments.append((
+                    task[0],
+                    task_id,
+                    rng.choice(assignees),
+                    rng.choice(self.comments),
+                    self.timestamp(rng, after=task[-1]),
+                ))
+                if len(comments) >= self.options['batch_size']:
+                    writer.insert(TaskComment, COMMENT_COLUMNS, comments)
+                    comments = []
+        writer.insert(TaskComment, COMMENT_COLUMNS, comments)
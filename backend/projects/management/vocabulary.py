@@ -0,0 +1,22 @@
+"""
+Pseudo-words for the text of generated data, shared by the seed_load and
+benchmark_search commands so that both produce searchable text the same way.
+"""
+import random
+
+SYLLABLES = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+
+
+def vocabulary(seed, size=5000):
+    """
+    Deterministic pseudo-words, most frequent first. Word frequencies follow
+    Zipf's law as in natural text, so query terms can be picked by how
+    selective they are.
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
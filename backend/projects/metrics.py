@@ -0,0 +1,297 @@
+"""
+Prometheus metrics for the GraphQL endpoint, served at /metrics.
+
+``record_operation`` wraps one HTTP GraphQL operation and observes its wall
+time, the number and total duration of its SQL statements (counted with
+``connection.execute_wrapper``) and the size of its response body, labeled
+by operation name and organization id. ResolverTimingMiddleware, installed
+through ``GRAPHENE['MIDDLEWARE']``, adds up resolver wall time per field
+path during the operation; the totals are observed once per path when the
+operation ends, so a list of a thousand tasks costs a dict update per
+resolver rather than a histogram observation. Leaf fields below the root
+are not timed, as they read columns of rows already loaded. Resolver
+timings are labeled by operation and path only, as adding the organization
+would multiply the number of series by the number of tenants.
+
+Operation names come from clients, so they only become labels once the view
+has validated the document (``name_operation``): with a persisted-query
+manifest, only the names of its operations; without one, the first
+MAX_OPERATIONS names seen by the process. Everything else, including
+requests that fail before validation, is reported as ``other``.
+
+Operation durations also carry an ``outcome``: ``ok``, ``error`` when the
+response holds GraphQL errors, or ``exception`` when the view raised, so
+failing requests are timed along with the rest.
+
+The endpoint exposes every tenant's traffic, so it is served only with a
+TOKEN, which scrapers send as a bearer token; without one it is a 404.
+
+Under several worker processes set PROMETHEUS_MULTIPROC_DIR so every
+worker writes to a shared directory and /metrics aggregates them (see the
+prometheus_client documentation on multiprocess mode).
+"""
+import hmac
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from graphql import get_named_type, is_leaf_type
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+METRICS = getattr(settings, 'GRAPHQL_METRICS', {})
+
+# Longer names of validated operations are reported as OTHER
+OPERATION_NAME = re.compile(r'^[_A-Za-z][_0-9A-Za-z]{0,63}$')
+ANONYMOUS = 'anonymous'
+OTHER = 'other'
+MAX_OPERATIONS = METRICS.get('MAX_OPERATIONS', 100)
+
+# Names of validated operations labeled so far, when there is no manifest
+_operation_names = set()
+_operation_names_lock = threading.Lock()
+
+DURATION_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+RESOLVER_DURATION = Histogram(
+    'graphql_resolver_duration_seconds',
+    'Total wall time spent in the resolvers of a field path during one operation',
+    ['operation', 'path'],
+    buckets=DURATION_BUCKETS,
+)
+OK = 'ok'
+ERROR = 'error'
+EXCEPTION = 'exception'
+
+OPERATION_DURATION = Histogram(
+    'graphql_operation_duration_seconds',
+    'Wall time of GraphQL operations',
+    ['operation', 'organization', 'outcome'],
+    buckets=DURATION_BUCKETS,
+)
+OPERATION_DB_QUERIES = Histogram(
+    'graphql_operation_db_queries',
+    'SQL statements executed by GraphQL operations',
+    ['operation', 'organization'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233),
+)
+OPERATION_DB_DURATION = Histogram(
+    'graphql_operation_db_duration_seconds',
+    'Time spent executing SQL by GraphQL operations',
+    ['operation', 'organization'],
+    buckets=DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'graphql_response_size_bytes',
+    'Size of GraphQL response bodies',
+    ['operation', 'organization'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+
+
+def operation_label(operation_ast, allowed=None):
+    """
+    The label of ``operation_ast``, the operation a validated document
+    runs. ``allowed`` holds the operation names of the persisted-query
+    manifest, if there is one.
+    """
+    if operation_ast is None:
+        return OTHER
+    if operation_ast.name is None:
+        return ANONYMOUS
+    name = operation_ast.name.value
+    if not OPERATION_NAME.match(name):
+        return OTHER
+    if allowed is not None:
+        return name if name in allowed else OTHER
+    with _operation_names_lock:
+        if name not in _operation_names:
+            if len(_operation_names) >= MAX_OPERATIONS:
+                return OTHER
+            _operation_names.add(name)
+    return name
+
+
+def name_operation(request, operation_ast, allowed=None):
+    """Label the operation measured for ``request`` once its document is validated."""
+    recorder = getattr(request, '_metrics', None)
+    if recorder is not None:
+        recorder.operation = operation_label(operation_ast, allowed)
+
+
+def record_errors(request, execution_result):
+    """Mark the operation measured for ``request`` as failed if its result has errors."""
+    recorder = getattr(request, '_metrics', None)
+    if recorder is not None and execution_result is not None and execution_result.errors:
+        recorder.outcome = ERROR
+
+
+def organization_label(request):
+    # Not the slug: it is all X-Organization needs to read a tenant's data
+    organization = getattr(request, 'organization', None)
+    return str(organization.pk) if organization is not None else 'none'
+
+
+class OperationRecorder:
+    """
+    Counts the SQL statements run while installed as an execute wrapper, and
+    collects the resolver timings of ResolverTimingMiddleware.
+    """
+
+    def __init__(self):
+        self.operation = OTHER
+        self.outcome = OK
+        self.queries = 0
+        self.db_duration = 0.0
+        self.resolver_durations = {}
+        self.response_size = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_duration += time.perf_counter() - start
+
+    def add_resolver_time(self, path, duration):
+        self.resolver_durations[path] = self.resolver_durations.get(path, 0.0) + duration
+
+    def observe(self, organization, duration):
+        operation = self.operation
+        labels = (operation, organization)
+        OPERATION_DURATION.labels(*labels, self.outcome).observe(duration)
+        OPERATION_DB_QUERIES.labels(*labels).observe(self.queries)
+        OPERATION_DB_DURATION.labels(*labels).observe(self.db_duration)
+        if self.response_size is not None:
+            RESPONSE_SIZE.labels(*labels).observe(self.response_size)
+        for path, total in self.resolver_durations.items():
+            RESOLVER_DURATION.labels(operation, path).observe(total)
+
+
+def start_operation(request):
+    """
+    Attach an OperationRecorder to ``request`` and return it, or None when
+    metrics are disabled.
+    """
+    if not METRICS.get('ENABLED', False):
+        return None
+    recorder = OperationRecorder()
+    request._metrics = recorder
+    return recorder
+
+
+def install(recorder):
+    """
+    Count the queries of the current thread's connection into ``recorder``;
+    returns the entered wrapper, to be exited on the same thread.
+    """
+    wrapper = connection.execute_wrapper(recorder)
+    wrapper.__enter__()
+    return wrapper
+
+
+@contextmanager
+def record_operation(request):
+    """
+    Measure the operation run inside the block. The caller sets
+    ``response_size`` on the yielded recorder, if any, once the body is
+    encoded.
+    """
+    recorder = start_operation(request)
+    if recorder is None:
+        yield None
+        return
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(recorder):
+            yield recorder
+    except BaseException:
+        recorder.outcome = EXCEPTION
+        raise
+    finally:
+        recorder.observe(organization_label(request), time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def arecord_operation(request):
+    """
+    record_operation for async views, whose queries run on the request's
+    sync thread rather than the event loop's.
+    """
+    recorder = start_operation(request)
+    if recorder is None:
+        yield None
+        return
+    start = time.perf_counter()
+    wrapper = await sync_to_async(install)(recorder)
+    try:
+        yield recorder
+    except BaseException:
+        recorder.outcome = EXCEPTION
+        raise
+    finally:
+        await sync_to_async(wrapper.__exit__)(None, None, None)
+        recorder.observe(organization_label(request), time.perf_counter() - start)
+
+
+def field_path(info):
+    return '.'.join(key for key in info.path.as_list() if isinstance(key, str))
+
+
+class ResolverTimingMiddleware:
+    """
+    Graphene middleware adding the wall time of each root field and each
+    field returning an object or list to the operation's recorder.
+    """
+
+    def resolve(self, next, root, info, **args):
+        recorder = getattr(info.context, '_metrics', None)
+        if recorder is None or (
+            root is not None and is_leaf_type(get_named_type(info.return_type))
+        ):
+            return next(root, info, **args)
+
+        start = time.perf_counter()
+        result = next(root, info, **args)
+        if isawaitable(result):
+            return self.await_result(result, recorder, info, start)
+        recorder.add_resolver_time(field_path(info), time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    async def await_result(result, recorder, info, start):
+        try:
+            return await result
+        finally:
+            recorder.add_resolver_time(field_path(info), time.perf_counter() - start)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process, or of every worker."""
+    token = METRICS.get('TOKEN')
+    if not METRICS.get('ENABLED', False) or not token:
+        return HttpResponse('Not found', status=404, content_type='text/plain')
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
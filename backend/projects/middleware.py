@@ -1,15 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from .models import Organization
 
 
+class OrganizationCache:
+    """
+    Bounded, thread-safe LRU cache of X-Organization header values.
+    
+    Hits are kept for ``ttl`` seconds and misses (None) for ``not_found_ttl``
+    seconds, so unknown headers cannot hammer the database. The cache is
+    cleared whenever an Organization is saved or deleted in this process
+    (see signals.py); the TTL bounds staleness across worker processes.
+    """
+    
+    def __init__(self, max_size=1024, ttl=300, not_found_ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """
+        Return ``(hit, organization)``; organization is None for a cached miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, organization = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, organization
+    
+    def set(self, key, organization):
+        ttl = self.ttl if organization is not None else self.not_found_ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, organization)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache_settings = getattr(settings, 'ORGANIZATION_CACHE', {})
+organization_cache = OrganizationCache(
+    max_size=_cache_settings.get('MAX_SIZE', 1024),
+    ttl=_cache_settings.get('TTL', 300),
+    not_found_ttl=_cache_settings.get('NOT_FOUND_TTL', 5),
+)
+
+
+def lookup_organization(org_identifier):
+    """
+    Find an organization by slug first, then by name; None if neither matches.
+    """
+    try:
+        return Organization.objects.get(slug=org_identifier)
+    except Organization.DoesNotExist:
+        pass
+    
+    # If not found by slug, try by name
+    try:
+        return Organization.objects.get(name=org_identifier)
+    except Organization.DoesNotExist:
+        return None
+
+
+def get_organization(org_identifier):
+    """
+    Resolve an X-Organization value through ``organization_cache``.
+    """
+    hit, organization = organization_cache.get(org_identifier)
+    if not hit:
+        organization = lookup_organization(org_identifier)
+        organization_cache.set(org_identifier, organization)
+    return organization
+
+
 class OrganizationMiddleware(MiddlewareMixin):
     """
     Middleware to handle organization-based tenant isolation.
     
     This middleware reads the X-Organization header from incoming requests,
     looks up the corresponding Organization in the database, and sets
-    request.organization for use throughout the request cycle.
+    request.organization for use throughout the request cycle. Lookups
+    are memoized in ``organization_cache``.
     """
     
     def process_request(self, request):
@@ -24,12 +110,9 @@ class OrganizationMiddleware(MiddlewareMixin):
         
         if org_identifier:
             try:
-                # Try to find organization by slug first, then by name
-                try:
-                    organization = Organization.objects.get(slug=org_identifier)
-                except Organization.DoesNotExist:
-                    # If not found by slug, try by name
-                    organization = Organization.objects.get(name=org_identifier)
+                organization = get_organization(org_identifier)
+                if organization is None:
+                    raise Organization.DoesNotExist
                 
                 # Set the organization on the request
                 request.organization = organization
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-17 05:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+STATUSES = ['todo', 'in_progress', 'done']
+PRIORITIES = ['low', 'medium', 'high', 'urgent']
+
+
+def backfill_counters(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectTaskCounters = apps.get_model('projects', 'ProjectTaskCounters')
+
+    aggregates = {'total': Count('tasks')}
+    aggregates.update({s: Count('tasks', filter=Q(tasks__status=s)) for s in STATUSES})
+    aggregates.update({p: Count('tasks', filter=Q(tasks__priority=p)) for p in PRIORITIES})
+
+    rows = Project.objects.order_by().annotate(**aggregates).values('id', *aggregates)
+    ProjectTaskCounters.objects.bulk_create(
+        (ProjectTaskCounters(project_id=row.pop('id'), **row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_resolver_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTaskCounters',
+            fields=[
+                ('project', models.OneToOneField(help_text='The project these counters describe', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_counters', serialize=False, to='projects.project')),
+                ('total', models.IntegerField(default=0, help_text='Number of tasks')),
+                ('todo', models.IntegerField(default=0, help_text='Tasks with status To Do')),
+                ('in_progress', models.IntegerField(default=0, help_text='Tasks with status In Progress')),
+                ('done', models.IntegerField(default=0, help_text='Tasks with status Done')),
+                ('low', models.IntegerField(default=0, help_text='Tasks with Low priority')),
+                ('medium', models.IntegerField(default=0, help_text='Tasks with Medium priority')),
+                ('high', models.IntegerField(default=0, help_text='Tasks with High priority')),
+                ('urgent', models.IntegerField(default=0, help_text='Tasks with Urgent priority')),
+            ],
+            options={
+                'verbose_name': 'Project Task Counters',
+                'verbose_name_plural': 'Project Task Counters',
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,201 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, transaction
+from django.db.models.expressions import RawSQL
+
+# Rows updated per transaction by the backfill, which runs outside a
+# migration-wide transaction so that no lock is held for the whole table
+BATCH_SIZE = 10_000
+
+# Titles rank above descriptions. ``{row}`` is ``NEW.`` in the triggers.
+TASK_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B')
+"""
+COMMENT_VECTOR = "to_tsvector('english', coalesce({row}content, ''))"
+
+# PostgreSQL keeps the vectors in plain columns filled in by triggers, so
+# every write path (ORM, COPY, raw SQL) maintains them. A generated column
+# would be simpler but adding one rewrites the table under an ACCESS
+# EXCLUSIVE lock; a nullable column without a default is only a catalog
+# change. Existing rows are backfilled in batches and the GIN indexes built
+# concurrently afterwards.
+POSTGRESQL_FORWARD = [
+    'ALTER TABLE projects_task ADD COLUMN search_vector tsvector',
+    f"""
+    CREATE FUNCTION projects_task_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {TASK_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_task_search_vector
+    BEFORE INSERT OR UPDATE OF title, description ON projects_task
+    FOR EACH ROW EXECUTE FUNCTION projects_task_search_vector()
+    """,
+    'ALTER TABLE projects_taskcomment ADD COLUMN search_vector tsvector',
+    f"""
+    CREATE FUNCTION projects_taskcomment_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {COMMENT_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_search_vector
+    BEFORE INSERT OR UPDATE OF content ON projects_taskcomment
+    FOR EACH ROW EXECUTE FUNCTION projects_taskcomment_search_vector()
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    'DROP TRIGGER projects_taskcomment_search_vector ON projects_taskcomment',
+    'DROP FUNCTION projects_taskcomment_search_vector()',
+    'ALTER TABLE projects_taskcomment DROP COLUMN search_vector',
+    'DROP TRIGGER projects_task_search_vector ON projects_task',
+    'DROP FUNCTION projects_task_search_vector()',
+    'ALTER TABLE projects_task DROP COLUMN search_vector',
+]
+
+# SQLite (local development and tests) uses external-content FTS5 tables
+# kept in step by triggers.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE projects_task_fts USING fts5(
+        title, description,
+        content='projects_task', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER projects_task_fts_insert AFTER INSERT ON projects_task BEGIN
+        INSERT INTO projects_task_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_task_fts_delete AFTER DELETE ON projects_task BEGIN
+        INSERT INTO projects_task_fts (projects_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_task_fts_update AFTER UPDATE OF title, description ON projects_task BEGIN
+        INSERT INTO projects_task_fts (projects_task_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO projects_task_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO projects_task_fts (projects_task_fts) VALUES ('rebuild')",
+    """
+    CREATE VIRTUAL TABLE projects_taskcomment_fts USING fts5(
+        content,
+        content='projects_taskcomment', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_fts_insert AFTER INSERT ON projects_taskcomment BEGIN
+        INSERT INTO projects_taskcomment_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_fts_delete AFTER DELETE ON projects_taskcomment BEGIN
+        INSERT INTO projects_taskcomment_fts (projects_taskcomment_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_fts_update AFTER UPDATE OF content ON projects_taskcomment BEGIN
+        INSERT INTO projects_taskcomment_fts (projects_taskcomment_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO projects_taskcomment_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO projects_taskcomment_fts (projects_taskcomment_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER projects_taskcomment_fts_update',
+    'DROP TRIGGER projects_taskcomment_fts_delete',
+    'DROP TRIGGER projects_taskcomment_fts_insert',
+    'DROP TABLE projects_taskcomment_fts',
+    'DROP TRIGGER projects_task_fts_update',
+    'DROP TRIGGER projects_task_fts_delete',
+    'DROP TRIGGER projects_task_fts_insert',
+    'DROP TABLE projects_task_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+def backfill(table, vector, connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT max(id) FROM {table}')
+        last = cursor.fetchone()[0] or 0
+    for start in range(0, last, BATCH_SIZE):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET search_vector = {vector.format(row="")} '
+                'WHERE id > %s AND id <= %s AND search_vector IS NULL',
+                [start, start + BATCH_SIZE],
+            )
+
+
+def backfill_search_vectors(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    backfill('projects_task', TASK_VECTOR, connection)
+    backfill('projects_taskcomment', COMMENT_VECTOR, connection)
+
+
+class AddSearchIndexConcurrently(AddIndexConcurrently):
+    """
+    AddIndexConcurrently for the search_vector columns, which the models do
+    not declare: the index exists on PostgreSQL only and never in the
+    migration state.
+    """
+
+    def __init__(self, model_name, name):
+        super().__init__(model_name, GinIndex(RawSQL('search_vector', ()), name=name))
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on search_vector of model {self.model_name}'
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('projects', '0004_projecttaskcounters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+            atomic=True,
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        AddSearchIndexConcurrently('task', 'task_search_idx'),
+        AddSearchIndexConcurrently('taskcomment', 'comment_search_idx'),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17 06:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project'), ('task', 'Task'), ('comment', 'Task Comment')], help_text='Type of the changed object', max_length=10)),
+                ('object_id', models.BigIntegerField(help_text='Primary key of the changed object')),
+                ('deleted', models.BooleanField(default=False, help_text='Whether the object was deleted')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the change was made')),
+                ('organization', models.ForeignKey(help_text='The organization the changed object belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='projects.organization')),
+            ],
+            options={
+                'verbose_name': 'Change Log Entry',
+                'verbose_name_plural': 'Change Log Entries',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['organization', 'id'], name='changelog_org_id_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-17 06:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_changelogentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Name of the imported file', max_length=255)),
+                ('format', models.CharField(choices=[('ndjson', 'NDJSON'), ('csv', 'CSV')], help_text='Format of the imported file', max_length=10)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', help_text='Current import status', max_length=10)),
+                ('checkpoint', models.BigIntegerField(default=0, help_text='Rows of the file read and committed')),
+                ('imported_tasks', models.IntegerField(default=0, help_text='Tasks created')),
+                ('imported_comments', models.IntegerField(default=0, help_text='Comments created')),
+                ('failed_rows', models.IntegerField(default=0, help_text='Rows skipped as invalid')),
+                ('errors', models.JSONField(blank=True, default=list, help_text='The first row errors, as {row, message}')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the import started')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='When the last batch was committed')),
+                ('organization', models.ForeignKey(help_text='The organization the rows are imported into', on_delete=django.db.models.deletion.CASCADE, related_name='imports', to='projects.organization')),
+            ],
+            options={
+                'verbose_name': 'Import Job',
+                'verbose_name_plural': 'Import Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRef',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.CharField(help_text='Identifier of the task in the imported file', max_length=255)),
+                ('job', models.ForeignKey(help_text='The import that created the task', on_delete=django.db.models.deletion.CASCADE, related_name='refs', to='projects.importjob')),
+                ('task', models.ForeignKey(help_text='The created task', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.task')),
+            ],
+            options={
+                'verbose_name': 'Import Reference',
+                'verbose_name_plural': 'Import References',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importref',
+            constraint=models.UniqueConstraint(fields=('job', 'ref'), name='importref_job_ref_uniq'),
+        ),
+    ]
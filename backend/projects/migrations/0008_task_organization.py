@@ -0,0 +1,230 @@
+import importlib
+
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+import django.db.models.deletion
+
+# Rows updated per transaction by the backfill, which runs outside a
+# migration-wide transaction so that no lock is held for the whole table
+BATCH_SIZE = 10_000
+
+# Task.organization must be its project's and TaskComment.organization its
+# task's. Inserts and updates that disagree are rejected, and moving a
+# project to another organization carries its tasks and comments along.
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION projects_task_organization_check() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.organization_id IS DISTINCT FROM (
+            SELECT organization_id FROM projects_project WHERE id = NEW.project_id
+        ) THEN
+            RAISE EXCEPTION 'Task organization must match its project'
+                USING ERRCODE = 'integrity_constraint_violation';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_task_organization_check
+    BEFORE INSERT OR UPDATE OF project_id, organization_id ON projects_task
+    FOR EACH ROW EXECUTE FUNCTION projects_task_organization_check()
+    """,
+    """
+    CREATE FUNCTION projects_taskcomment_organization_check() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.organization_id IS DISTINCT FROM (
+            SELECT organization_id FROM projects_task WHERE id = NEW.task_id
+        ) THEN
+            RAISE EXCEPTION 'Comment organization must match its task'
+                USING ERRCODE = 'integrity_constraint_violation';
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_organization_check
+    BEFORE INSERT OR UPDATE OF task_id, organization_id ON projects_taskcomment
+    FOR EACH ROW EXECUTE FUNCTION projects_taskcomment_organization_check()
+    """,
+    """
+    CREATE FUNCTION projects_project_organization_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE projects_task SET organization_id = NEW.organization_id WHERE project_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_project_organization_update
+    AFTER UPDATE OF organization_id ON projects_project
+    FOR EACH ROW WHEN (OLD.organization_id IS DISTINCT FROM NEW.organization_id)
+    EXECUTE FUNCTION projects_project_organization_update()
+    """,
+    """
+    CREATE FUNCTION projects_task_organization_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE projects_taskcomment SET organization_id = NEW.organization_id WHERE task_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_task_organization_update
+    AFTER UPDATE OF organization_id ON projects_task
+    FOR EACH ROW WHEN (OLD.organization_id IS DISTINCT FROM NEW.organization_id)
+    EXECUTE FUNCTION projects_task_organization_update()
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    'DROP TRIGGER projects_task_organization_update ON projects_task',
+    'DROP FUNCTION projects_task_organization_update()',
+    'DROP TRIGGER projects_project_organization_update ON projects_project',
+    'DROP FUNCTION projects_project_organization_update()',
+    'DROP TRIGGER projects_taskcomment_organization_check ON projects_taskcomment',
+    'DROP FUNCTION projects_taskcomment_organization_check()',
+    'DROP TRIGGER projects_task_organization_check ON projects_task',
+    'DROP FUNCTION projects_task_organization_check()',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE TRIGGER projects_task_organization_insert BEFORE INSERT ON projects_task
+    WHEN new.organization_id IS NOT (
+        SELECT organization_id FROM projects_project WHERE id = new.project_id
+    ) BEGIN
+        SELECT RAISE(ABORT, 'Task organization must match its project');
+    END
+    """,
+    """
+    CREATE TRIGGER projects_task_organization_check
+    BEFORE UPDATE OF project_id, organization_id ON projects_task
+    WHEN new.organization_id IS NOT (
+        SELECT organization_id FROM projects_project WHERE id = new.project_id
+    ) BEGIN
+        SELECT RAISE(ABORT, 'Task organization must match its project');
+    END
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_organization_insert BEFORE INSERT ON projects_taskcomment
+    WHEN new.organization_id IS NOT (
+        SELECT organization_id FROM projects_task WHERE id = new.task_id
+    ) BEGIN
+        SELECT RAISE(ABORT, 'Comment organization must match its task');
+    END
+    """,
+    """
+    CREATE TRIGGER projects_taskcomment_organization_check
+    BEFORE UPDATE OF task_id, organization_id ON projects_taskcomment
+    WHEN new.organization_id IS NOT (
+        SELECT organization_id FROM projects_task WHERE id = new.task_id
+    ) BEGIN
+        SELECT RAISE(ABORT, 'Comment organization must match its task');
+    END
+    """,
+    """
+    CREATE TRIGGER projects_project_organization_update
+    AFTER UPDATE OF organization_id ON projects_project
+    WHEN old.organization_id IS NOT new.organization_id BEGIN
+        UPDATE projects_task SET organization_id = new.organization_id WHERE project_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER projects_task_organization_update
+    AFTER UPDATE OF organization_id ON projects_task
+    WHEN old.organization_id IS NOT new.organization_id BEGIN
+        UPDATE projects_taskcomment SET organization_id = new.organization_id WHERE task_id = new.id;
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER projects_task_organization_update',
+    'DROP TRIGGER projects_project_organization_update',
+    'DROP TRIGGER projects_taskcomment_organization_check',
+    'DROP TRIGGER projects_taskcomment_organization_insert',
+    'DROP TRIGGER projects_task_organization_check',
+    'DROP TRIGGER projects_task_organization_insert',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    SQLite rebuilds a table to change a column, dropping its triggers; put
+    back the full-text index triggers of migration 0005.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    search_index = importlib.import_module('projects.migrations.0005_search_index')
+    for sql in search_index.SQLITE_FORWARD:
+        if 'CREATE TRIGGER' in sql:
+            schema_editor.execute(sql)
+
+
+def backfill(model, parent, parent_field, using):
+    organization = Subquery(
+        parent.objects.using(using).filter(pk=OuterRef(parent_field)).values('organization_id')[:1]
+    )
+    last = model.objects.using(using).aggregate(last=Max('id'))['last'] or 0
+    for start in range(0, last, BATCH_SIZE):
+        with transaction.atomic(using=using):
+            model.objects.using(using).filter(
+                id__gt=start, id__lte=start + BATCH_SIZE, organization__isnull=True
+            ).update(organization=organization)
+
+
+def backfill_organizations(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Task = apps.get_model('projects', 'Task')
+    TaskComment = apps.get_model('projects', 'TaskComment')
+    using = schema_editor.connection.alias
+    backfill(Task, Project, 'project_id', using)
+    backfill(TaskComment, Task, 'task_id', using)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('projects', '0007_importjob'),
+    ]
+
+    operations = [
+        # Reversing the column changes below rebuilds the tables on SQLite
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='task',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the task's project", null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the comment's task", null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.RunPython(backfill_organizations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='task',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the task's project", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.AlterField(
+            model_name='taskcomment',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the comment's task", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,192 @@
+# Generated by Django 4.2 on 2026-10-17 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Archived rows stay searchable: the archive tables get the same full-text
+# indexes as the live ones (migration 0005), and follow their project to
+# another organization like the live ones (migration 0008). Archived rows
+# are never updated otherwise.
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE projects_archivedtask ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX archivedtask_search_idx ON projects_archivedtask USING gin (search_vector)',
+    """
+    ALTER TABLE projects_archivedtaskcomment ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    """,
+    'CREATE INDEX archivedcomment_search_idx ON projects_archivedtaskcomment USING gin (search_vector)',
+    """
+    CREATE FUNCTION projects_project_archive_organization_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE projects_archivedtask SET organization_id = NEW.organization_id WHERE project_id = NEW.id;
+        UPDATE projects_archivedtaskcomment SET organization_id = NEW.organization_id
+        WHERE task_id IN (SELECT id FROM projects_archivedtask WHERE project_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER projects_project_archive_organization_update
+    AFTER UPDATE OF organization_id ON projects_project
+    FOR EACH ROW WHEN (OLD.organization_id IS DISTINCT FROM NEW.organization_id)
+    EXECUTE FUNCTION projects_project_archive_organization_update()
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    'DROP TRIGGER projects_project_archive_organization_update ON projects_project',
+    'DROP FUNCTION projects_project_archive_organization_update()',
+    'ALTER TABLE projects_archivedtaskcomment DROP COLUMN search_vector',
+    'ALTER TABLE projects_archivedtask DROP COLUMN search_vector',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE projects_archivedtask_fts USING fts5(
+        title, description,
+        content='projects_archivedtask', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER projects_archivedtask_fts_insert AFTER INSERT ON projects_archivedtask BEGIN
+        INSERT INTO projects_archivedtask_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_archivedtask_fts_delete AFTER DELETE ON projects_archivedtask BEGIN
+        INSERT INTO projects_archivedtask_fts (projects_archivedtask_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE VIRTUAL TABLE projects_archivedtaskcomment_fts USING fts5(
+        content,
+        content='projects_archivedtaskcomment', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER projects_archivedtaskcomment_fts_insert AFTER INSERT ON projects_archivedtaskcomment BEGIN
+        INSERT INTO projects_archivedtaskcomment_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_archivedtaskcomment_fts_delete AFTER DELETE ON projects_archivedtaskcomment BEGIN
+        INSERT INTO projects_archivedtaskcomment_fts (projects_archivedtaskcomment_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER projects_project_archive_organization_update
+    AFTER UPDATE OF organization_id ON projects_project
+    WHEN old.organization_id IS NOT new.organization_id BEGIN
+        UPDATE projects_archivedtask SET organization_id = new.organization_id WHERE project_id = new.id;
+        UPDATE projects_archivedtaskcomment SET organization_id = new.organization_id
+        WHERE task_id IN (SELECT id FROM projects_archivedtask WHERE project_id = new.id);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER projects_project_archive_organization_update',
+    'DROP TRIGGER projects_archivedtaskcomment_fts_delete',
+    'DROP TRIGGER projects_archivedtaskcomment_fts_insert',
+    'DROP TABLE projects_archivedtaskcomment_fts',
+    'DROP TRIGGER projects_archivedtask_fts_delete',
+    'DROP TRIGGER projects_archivedtask_fts_insert',
+    'DROP TABLE projects_archivedtask_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_task_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(help_text='The id the task had', primary_key=True, serialize=False)),
+                ('title', models.CharField(help_text='Task title', max_length=200)),
+                ('description', models.TextField(blank=True, help_text='Task description')),
+                ('status', models.CharField(choices=[('todo', 'To Do'), ('in_progress', 'In Progress'), ('done', 'Done')], help_text='Task status when archived', max_length=20)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], help_text='Task priority', max_length=10)),
+                ('assignee', models.CharField(blank=True, help_text='Person assigned to this task', max_length=100)),
+                ('due_date', models.DateTimeField(blank=True, help_text='Task due date', null=True)),
+                ('created_at', models.DateTimeField(help_text='When the task was created')),
+                ('updated_at', models.DateTimeField(help_text='When the task was last updated')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, help_text='When the task was archived')),
+            ],
+            options={
+                'verbose_name': 'Archived Task',
+                'verbose_name_plural': 'Archived Tasks',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTaskComment',
+            fields=[
+                ('id', models.BigIntegerField(help_text='The id the comment had', primary_key=True, serialize=False)),
+                ('author', models.CharField(help_text='Comment author', max_length=100)),
+                ('content', models.TextField(help_text='Comment content')),
+                ('created_at', models.DateTimeField(help_text='When the comment was created')),
+            ],
+            options={
+                'verbose_name': 'Archived Task Comment',
+                'verbose_name_plural': 'Archived Task Comments',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'done')), fields=['updated_at', 'id'], name='task_done_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtaskcomment',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the comment's task", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.AddField(
+            model_name='archivedtaskcomment',
+            name='task',
+            field=models.ForeignKey(help_text='The archived task this comment belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='projects.archivedtask'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='organization',
+            field=models.ForeignKey(editable=False, help_text="The organization of the task's project", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.organization'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='project',
+            field=models.ForeignKey(help_text='The project this task belonged to', on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to='projects.project'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtaskcomment',
+            index=models.Index(fields=['task', 'created_at', 'id'], name='archivedcomment_task_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='archivedtask_project_idx'),
+        ),
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 07:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_task_archive'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_project_open_idx',
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 
@@ -15,6 +16,10 @@ class Organization(models.Model):
         ordering = ['name']
         verbose_name = "Organization"
         verbose_name_plural = "Organizations"
+        indexes = [
+            # OrganizationMiddleware falls back to a lookup by name
+            models.Index(fields=['name'], name='org_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -53,6 +58,12 @@ class Project(models.Model):
         ordering = ['-created_at']
         verbose_name = "Project"
         verbose_name_plural = "Projects"
+        indexes = [
+            # Project lists and keyset pages, newest first
+            models.Index(fields=['organization', '-created_at', '-id'], name='project_org_created_idx'),
+            # Organization stats count projects by status from the index alone
+            models.Index(fields=['organization', 'status'], name='project_org_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.organization.name})"
@@ -81,6 +92,15 @@ class Task(models.Model):
         related_name='tasks',
         help_text="The project this task belongs to"
     )
+    # Copied from the project so tenant filters need no join; database
+    # triggers (migration 0008) keep it equal to the project's
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        help_text="The organization of the task's project"
+    )
     title = models.CharField(max_length=200, help_text="Task title")
     description = models.TextField(blank=True, help_text="Task description")
     status = models.CharField(
@@ -104,9 +124,23 @@ class Task(models.Model):
         ordering = ['-created_at']
         verbose_name = "Task"
         verbose_name_plural = "Tasks"
+        indexes = [
+            # Task lists and keyset pages, newest first
+            models.Index(fields=['project', '-created_at', '-id'], name='task_project_created_idx'),
+            # Per-project status counts can be answered from the index alone
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            # Archival picks the done tasks updated longest ago
+            models.Index(fields=['updated_at', 'id'], condition=Q(status='done'), name='task_done_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.project.name})"
+    
+    def save(self, *args, **kwargs):
+        # Follow the project, as the database insists
+        if self.organization_id is None or Task.project.is_cached(self):
+            self.organization_id = self.project.organization_id
+        super().save(*args, **kwargs)
 
 
 class TaskComment(models.Model):
@@ -119,6 +153,14 @@ class TaskComment(models.Model):
         related_name='comments',
         help_text="The task this comment belongs to"
     )
+    # Copied from the task, like Task.organization
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        help_text="The organization of the comment's task"
+    )
     author = models.CharField(max_length=100, help_text="Comment author")
     content = models.TextField(help_text="Comment content")
     created_at = models.DateTimeField(default=timezone.now, help_text="When the comment was created")
@@ -127,6 +169,233 @@ class TaskComment(models.Model):
         ordering = ['created_at']
         verbose_name = "Task Comment"
         verbose_name_plural = "Task Comments"
+        indexes = [
+            # Comment threads and keyset pages, oldest first
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Comment by {self.author} on {self.task.title}"
+    
+    def save(self, *args, **kwargs):
+        if self.organization_id is None or TaskComment.task.is_cached(self):
+            self.organization_id = self.task.organization_id
+        super().save(*args, **kwargs)
+
+
+class ArchivedTask(models.Model):
+    """
+    A done task moved out of the Task table by archival (see archive.py),
+    under the id it had there. Archived tasks are read-only.
+    """
+    id = models.BigIntegerField(primary_key=True, help_text="The id the task had")
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='archived_tasks',
+        help_text="The project this task belonged to"
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        help_text="The organization of the task's project"
+    )
+    title = models.CharField(max_length=200, help_text="Task title")
+    description = models.TextField(blank=True, help_text="Task description")
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, help_text="Task status when archived")
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, help_text="Task priority")
+    assignee = models.CharField(max_length=100, blank=True, help_text="Person assigned to this task")
+    due_date = models.DateTimeField(null=True, blank=True, help_text="Task due date")
+    created_at = models.DateTimeField(help_text="When the task was created")
+    updated_at = models.DateTimeField(help_text="When the task was last updated")
+    archived_at = models.DateTimeField(default=timezone.now, help_text="When the task was archived")
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Archived Task"
+        verbose_name_plural = "Archived Tasks"
+        indexes = [
+            # includeArchived task lists, newest first
+            models.Index(fields=['project', '-created_at', '-id'], name='archivedtask_project_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedTaskComment(models.Model):
+    """
+    A comment archived along with its task, under the id it had.
+    """
+    id = models.BigIntegerField(primary_key=True, help_text="The id the comment had")
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        help_text="The archived task this comment belongs to"
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        help_text="The organization of the comment's task"
+    )
+    author = models.CharField(max_length=100, help_text="Comment author")
+    content = models.TextField(help_text="Comment content")
+    created_at = models.DateTimeField(help_text="When the comment was created")
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Archived Task Comment"
+        verbose_name_plural = "Archived Task Comments"
+        indexes = [
+            models.Index(fields=['task', 'created_at', 'id'], name='archivedcomment_task_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Comment by {self.author} on {self.task.title}"
+
+class ProjectTaskCounters(models.Model):
+    """
+    Materialized task counts for a project, archived tasks included, kept in
+    step with the task tables by the task mutations (see counters.py).
+    """
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='task_counters',
+        help_text="The project these counters describe"
+    )
+    total = models.IntegerField(default=0, help_text="Number of tasks")
+    todo = models.IntegerField(default=0, help_text="Tasks with status To Do")
+    in_progress = models.IntegerField(default=0, help_text="Tasks with status In Progress")
+    done = models.IntegerField(default=0, help_text="Tasks with status Done")
+    low = models.IntegerField(default=0, help_text="Tasks with Low priority")
+    medium = models.IntegerField(default=0, help_text="Tasks with Medium priority")
+    high = models.IntegerField(default=0, help_text="Tasks with High priority")
+    urgent = models.IntegerField(default=0, help_text="Tasks with Urgent priority")
+    
+    class Meta:
+        verbose_name = "Project Task Counters"
+        verbose_name_plural = "Project Task Counters"
+    
+    def __str__(self):
+        return f"Task counters for {self.project.name}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    One created, updated or deleted object, in commit order per organization
+    (see changes.py). The entry id is the cursor of the ``changes`` feed.
+    """
+    KIND_CHOICES = [
+        ('project', 'Project'),
+        ('task', 'Task'),
+        ('comment', 'Task Comment'),
+    ]
+    
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='changes',
+        help_text="The organization the changed object belongs to"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, help_text="Type of the changed object")
+    object_id = models.BigIntegerField(help_text="Primary key of the changed object")
+    deleted = models.BooleanField(default=False, help_text="Whether the object was deleted")
+    changed_at = models.DateTimeField(default=timezone.now, help_text="When the change was made")
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Change Log Entry"
+        verbose_name_plural = "Change Log Entries"
+        indexes = [
+            # The feed reads an organization's entries after a cursor
+            models.Index(fields=['organization', 'id'], name='changelog_org_id_idx'),
+        ]
+    
+    def __str__(self):
+        action = 'deleted' if self.deleted else 'saved'
+        return f"{self.kind} {self.object_id} {action}"
+
+
+class ImportJob(models.Model):
+    """
+    A bulk import of tasks and comments from one file (see imports.py). The
+    checkpoint counts the rows already committed, so an interrupted import
+    resumes after them.
+    """
+    FORMAT_CHOICES = [
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='imports',
+        help_text="The organization the rows are imported into"
+    )
+    source = models.CharField(max_length=255, help_text="Name of the imported file")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, help_text="Format of the imported file")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='running',
+        help_text="Current import status"
+    )
+    checkpoint = models.BigIntegerField(default=0, help_text="Rows of the file read and committed")
+    imported_tasks = models.IntegerField(default=0, help_text="Tasks created")
+    imported_comments = models.IntegerField(default=0, help_text="Comments created")
+    failed_rows = models.IntegerField(default=0, help_text="Rows skipped as invalid")
+    errors = models.JSONField(default=list, blank=True, help_text="The first row errors, as {row, message}")
+    created_at = models.DateTimeField(default=timezone.now, help_text="When the import started")
+    updated_at = models.DateTimeField(auto_now=True, help_text="When the last batch was committed")
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+    
+    def __str__(self):
+        return f"Import of {self.source} ({self.status})"
+
+
+class ImportRef(models.Model):
+    """
+    The source system's identifier of a task created by an import, so that
+    comments later in the file (or in a resumed run) can point at it.
+    """
+    job = models.ForeignKey(
+        ImportJob,
+        on_delete=models.CASCADE,
+        related_name='refs',
+        help_text="The import that created the task"
+    )
+    ref = models.CharField(max_length=255, help_text="Identifier of the task in the imported file")
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name='+',
+        help_text="The created task"
+    )
+    
+    class Meta:
+        verbose_name = "Import Reference"
+        verbose_name_plural = "Import References"
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'ref'], name='importref_job_ref_uniq'),
+        ]
     
     def __str__(self):
-        return f"Comment by {self.author} on {self.task.title}"
\ No newline at end of file
+        return f"{self.ref} -> task {self.task_id}"
@@ -0,0 +1,89 @@
+"""
+Per-organization data versions and the GraphQL response cache built on them.
+
+Every write to an organization's data bumps its version (see mutations.py,
+admin.py and signals.py). Read-only responses are cached under a key derived
+from ``(organization, version, document hash, operation name, variables)``,
+and the same key is sent as the ETag, so a client holding the current ETag
+gets a 304 without the query running. A bump makes every older key
+unreachable; nothing has to be deleted.
+
+Versions live in the ``GRAPHQL_RESPONSE_CACHE['CACHE_ALIAS']`` cache, which
+must be shared by all workers (e.g. the file-based backend); the system
+checks refuse a process-local one (see checks.py). A version is a random
+token rather than a counter: incr is a read then a write on several
+backends, so two concurrent bumps could both store N+1, while each bump
+setting a fresh token always leaves a version no response was cached under.
+"""
+import hashlib
+import json
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .routers import stick_to_primary
+
+RESPONSE_CACHE = getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {})
+
+VERSION_PREFIX = 'org-version:'
+RESPONSE_PREFIX = 'gql-response:'
+
+
+def get_cache():
+    return caches[RESPONSE_CACHE.get('CACHE_ALIAS', 'default')]
+
+
+def organization_version(organization_id):
+    """
+    Return the current data version of an organization. A version lost to
+    cache eviction is replaced by a new token, never an earlier one.
+    """
+    cache = get_cache()
+    key = f'{VERSION_PREFIX}{organization_id}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(organization_id):
+    get_cache().set(f'{VERSION_PREFIX}{organization_id}', uuid4().hex, None)
+
+
+def bump_organization_version(organization_id):
+    """
+    Invalidate the cached responses of an organization once the current
+    transaction commits (immediately outside a transaction). Its queries
+    also stop reading from replicas for a while (see routers.py).
+    """
+    def committed():
+        _bump(organization_id)
+        stick_to_primary(organization_id)
+
+    transaction.on_commit(committed)
+
+
+def response_key(organization_id, document_hash, operation_name, variables):
+    payload = json.dumps(
+        [
+            organization_id,
+            organization_version(organization_id),
+            document_hash,
+            operation_name,
+            variables or {},
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_response(key):
+    return get_cache().get(RESPONSE_PREFIX + key)
+
+
+def set_response(key, body):
+    get_cache().set(RESPONSE_PREFIX + key, body, RESPONSE_CACHE.get('TIMEOUT', 300))
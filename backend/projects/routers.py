@@ -0,0 +1,111 @@
+"""
+Read replica routing for GraphQL queries.
+
+``READ_REPLICAS['ALIASES']`` names database aliases that replicate the
+primary (``default``). PersistedQueryGraphQLView runs each query operation
+inside ``read_from(query_routing(organization_id))``; ReplicaRouter then
+sends its reads to one of the replicas. Everything else uses the primary:
+mutations, other endpoints, reads inside a transaction, and reads that
+follow a write in the same operation.
+
+Replicas lag behind. Each committed write of a tenant (see
+``response_cache.bump_organization_version``) keeps that tenant's queries on
+the primary for ``STICKY_SECONDS``, so a client reading back its own
+mutation sees it. The window must exceed the usual replica lag; it also
+keeps stale replica reads out of the response cache, whose keys change on
+the same writes.
+
+The sticky flags live in ``READ_REPLICAS['CACHE_ALIAS']``, which every
+worker must share: a flag set in one process's local memory would leave the
+other workers reading stale replicas. The ``projects.E002`` system check
+refuses replicas on a process-local cache.
+
+With no replicas configured nothing is routed and no cache is consulted.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_REPLICAS = getattr(settings, 'READ_REPLICAS', {})
+
+ALIASES = tuple(READ_REPLICAS.get('ALIASES', ()))
+STICKY_SECONDS = READ_REPLICAS.get('STICKY_SECONDS', 5)
+
+STICKY_PREFIX = 'replica-sticky:'
+
+
+class ReadRouting:
+    """Where the reads of the current operation go; shared by its tasks."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        # Transactions opened by the operation read from the primary
+        self.atomic_depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+_routing = ContextVar('read_routing', default=None)
+
+
+def get_cache():
+    return caches[READ_REPLICAS.get('CACHE_ALIAS', 'default')]
+
+
+def stick_to_primary(organization_id):
+    """Keep the organization's reads on the primary for STICKY_SECONDS."""
+    if ALIASES:
+        get_cache().set(f'{STICKY_PREFIX}{organization_id}', True, STICKY_SECONDS)
+
+
+def query_routing(organization_id=None):
+    """
+    Return the ReadRouting of a query of the organization, or None when it
+    must read from the primary.
+    """
+    if not ALIASES:
+        return None
+    if organization_id is not None and get_cache().get(f'{STICKY_PREFIX}{organization_id}'):
+        return None
+    return ReadRouting(random.choice(ALIASES))
+
+
+@contextmanager
+def read_from(routing):
+    """Route the reads made inside the block by ``routing`` (None: the primary)."""
+    if routing is None:
+        yield
+        return
+    token = _routing.set(routing)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or routing.alias is None:
+            return DEFAULT_DB_ALIAS
+        if len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > routing.atomic_depth:
+            return DEFAULT_DB_ALIAS
+        return routing.alias
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # Read the rest of the operation back from the primary
+            routing.alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *ALIASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in ALIASES
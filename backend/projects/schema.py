@@ -1,6 +1,16 @@
 import graphene
 from .schemas.queries import Query
 from .schemas.mutations import Mutation  # Import the complete Mutation class
+from .schemas.async_queries import AsyncQuery
+from .schemas.async_mutations import AsyncMutation
+from .schemas.subscriptions import Subscription
 
 # Remove the duplicate Mutation class definition and use the one from mutations.py
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+# Subscriptions are listed for tooling; they are served over WebSocket only
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
+
+# Same API for AsyncGraphQLView and the WebSocket endpoint, resolved without
+# blocking the event loop
+async_schema = graphene.Schema(
+    query=AsyncQuery, mutation=AsyncMutation, subscription=Subscription
+)
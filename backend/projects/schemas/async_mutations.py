@@ -0,0 +1,31 @@
+import graphene
+from asgiref.sync import sync_to_async
+from .mutations import Mutation
+
+
+def run_in_thread(resolver):
+    """
+    Wrap a mutation resolver so it runs on the request's sync thread.
+
+    The mutations need ``transaction.atomic()`` and row locks, which the async
+    ORM does not offer; Django's guidance is to run such blocks through
+    ``sync_to_async``, which keeps the event loop free while they wait.
+    """
+    async def resolve(root, info, **kwargs):
+        return await sync_to_async(resolver)(root, info, **kwargs)
+    return resolve
+
+
+# Same fields, payloads and arguments as Mutation; only the resolvers differ
+AsyncMutation = type('AsyncMutation', (graphene.ObjectType,), {
+    'Meta': type('Meta', (), {'name': 'Mutation'}),
+    **{
+        name: graphene.Field(
+            field.type,
+            args=field.args,
+            resolver=run_in_thread(field.resolver),
+            description=field.description,
+        )
+        for name, field in Mutation._meta.fields.items()
+    },
+})
@@ -0,0 +1,197 @@
+from asgiref.sync import sync_to_async
+
+from ..board import board_columns, board_queryset
+from ..changes import latest_entry_id, read_changes
+from ..models import ArchivedTask, Project, Task, TaskComment
+from ..search import search
+from ..stats import aget_organization_stats, aget_project_stats
+from .loaders import get_loaders
+from .pagination import OffsetPage, apaginate, change_page, encode_change_cursor
+from .projection import CONNECTION_NODES, CURSOR_FIELDS, optimize
+from .queries import (
+    BOARD_FIELDS, BOARD_TASKS, MERGE_FIELDS, ChangesType, OrganizationStatsType, ProjectStatsType, Query,
+    board_page_size, filter_tasks, newest_first,
+)
+from .types import (
+    ProjectConnection, TaskConnection, TaskCommentConnection, SearchResultConnection,
+    TaskBoardColumnType, TaskBoardType, TaskOrder,
+)
+
+
+async def aget_task(organization, id, include_archived=False):
+    try:
+        return await Task.objects.select_related('project').aget(id=id, organization=organization)
+    except Task.DoesNotExist:
+        if not include_archived:
+            return None
+    try:
+        return await ArchivedTask.objects.select_related('project').aget(
+            id=id, organization=organization
+        )
+    except ArchivedTask.DoesNotExist:
+        return None
+
+
+# Query with the same fields as ``Query``, resolved on Django's async ORM.
+# Sibling fields resolve concurrently and the event loop is never blocked
+# while one of them waits on the database. (A docstring here would leak into
+# the schema as the type description.)
+class AsyncQuery(Query):
+    class Meta:
+        name = 'Query'
+
+    async def resolve_projects(self, info):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return []
+        projects = optimize(Project.objects.filter(organization=org), info)
+        projects = [project async for project in projects]
+        return get_loaders(info).register(projects)
+
+    async def resolve_project(self, info, id):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        try:
+            project = await Project.objects.aget(id=id, organization=org)
+        except Project.DoesNotExist:
+            return None
+        get_loaders(info).register([project])
+        return project
+
+    async def resolve_tasks(self, info, project_id, include_archived=False):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return []
+        try:
+            project = await Project.objects.aget(id=project_id, organization=org)
+        except Project.DoesNotExist:
+            return []
+        tasks = Task.objects.filter(project=project).order_by('-created_at')
+        if not include_archived:
+            return get_loaders(info).register([task async for task in optimize(tasks, info)])
+        archived = ArchivedTask.objects.filter(project=project).order_by('-created_at')
+        return get_loaders(info).register(newest_first(
+            [task async for task in optimize(tasks, info, always=MERGE_FIELDS)],
+            [task async for task in optimize(archived, info, always=MERGE_FIELDS)],
+        ))
+
+    async def resolve_task(self, info, id, include_archived=False):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        task = await aget_task(org, id, include_archived)
+        if task is not None:
+            get_loaders(info).register([task])
+        return task
+
+    async def resolve_comments(self, info, task_id, include_archived=False):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return []
+        task = await aget_task(org, task_id, include_archived)
+        if task is None:
+            return []
+        comments = optimize(task.comments.order_by('created_at'), info)
+        return get_loaders(info).register([comment async for comment in comments])
+
+    async def resolve_projects_connection(self, info, **kwargs):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        projects = optimize(
+            Project.objects.filter(organization=org), info, CONNECTION_NODES, CURSOR_FIELDS
+        )
+        connection = await apaginate(projects, ProjectConnection, descending=True, **kwargs)
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_tasks_connection(self, info, project_id, status=None, order_by=None, **kwargs):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        tasks = optimize(
+            filter_tasks(Task.objects.filter(project_id=project_id, organization=org), status),
+            info, CONNECTION_NODES, CURSOR_FIELDS,
+        )
+        connection = await apaginate(
+            tasks, TaskConnection, descending=order_by != TaskOrder.OLDEST, **kwargs
+        )
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_comments_connection(self, info, task_id, **kwargs):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        comments = optimize(
+            TaskComment.objects.filter(task_id=task_id, organization=org),
+            info, CONNECTION_NODES, CURSOR_FIELDS,
+        )
+        connection = await apaginate(comments, TaskCommentConnection, **kwargs)
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_task_board(self, info, project_id, per_column=None, order_by=None):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        tasks = optimize(
+            Task.objects.filter(project_id=project_id, organization=org),
+            info, BOARD_TASKS, BOARD_FIELDS, annotate=False,
+        )
+        rows = board_queryset(tasks, board_page_size(per_column), order_by != TaskOrder.OLDEST)
+        rows = get_loaders(info).register([task async for task in rows])
+        return TaskBoardType(columns=[
+            TaskBoardColumnType(status=status, total_count=total, tasks=tasks)
+            for status, total, tasks in board_columns(rows)
+        ])
+
+    async def resolve_project_stats(self, info, project_id):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        stats = await aget_project_stats(org, project_ids=[project_id])
+        if not stats:
+            return None
+        return ProjectStatsType(**stats[0])
+
+    async def resolve_organization_stats(self, info):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        return OrganizationStatsType(**await aget_organization_stats(org))
+
+    async def resolve_all_project_stats(self, info, project_ids=None):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return []
+        return [
+            ProjectStatsType(**stats)
+            for stats in await aget_project_stats(org, project_ids=project_ids)
+        ]
+
+    async def resolve_search(self, info, query, first=None, after=None, include_archived=False):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        page = OffsetPage(SearchResultConnection, first=first, after=after)
+        # Raw SQL has no async cursor
+        results = await sync_to_async(search)(org, query, page.limit, page.offset, include_archived)
+        get_loaders(info).register(instance for instance, rank in results)
+        return page.build([{'node': instance, 'rank': rank} for instance, rank in results])
+
+    async def resolve_changes(self, info, since=None, first=None):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        if since is None:
+            entry_id = await sync_to_async(latest_entry_id)(org)
+            return ChangesType(
+                cursor=encode_change_cursor(entry_id), has_more=False,
+                projects=[], tasks=[], comments=[], deleted=[],
+            )
+        entry_id, limit = change_page(since, first)
+        change_set = await sync_to_async(read_changes)(org, entry_id, limit)
+        get_loaders(info).register(change_set.instances)
+        return ChangesType.from_change_set(change_set)
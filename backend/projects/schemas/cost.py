@@ -0,0 +1,250 @@
+"""
+Static cost analysis for GraphQL operations.
+
+Each field that returns an object costs its weight (1 unless overridden in
+``FIELD_WEIGHTS``) for every time it may be resolved; scalars are free. The
+number of times is the product of the list sizes above it. A list's size is
+the field's ``first``/``last`` argument when it has one, DEFAULT_PAGE_SIZE
+for a connection called without them, and ``DEFAULT_LIST_SIZE`` for the
+plain list fields. Lists whose length the schema fixes are sized by
+``FIXED_LIST_SIZES``; taskBoard's ``perColumn`` bounds the tasks of every
+column, so it counts once on the board.
+
+An argument passed as a variable counts as the value the request sends.
+Validation has no variables (its result is cached with the document), so
+QueryCostRule counts the variable's default, or MAX_PAGE_SIZE if it has
+none; a request can then send a larger value than the default, so the views
+measure the operation again with the request's variables and refuse it
+(``cost_error``) before executing when it is over MAX_COST.
+
+QueryCostRule rejects operations whose cost, depth or breadth is over the
+``GRAPHQL_QUERY_COST`` limits before anything executes.
+"""
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationType,
+    ValidationRule,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_composite_type,
+    is_list_type,
+    value_from_ast_untyped,
+)
+
+from ..board import STATUSES
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+QUERY_COST = getattr(settings, 'GRAPHQL_QUERY_COST', {})
+
+MAX_COST = QUERY_COST.get('MAX_COST', 5000)
+MAX_DEPTH = QUERY_COST.get('MAX_DEPTH', 8)
+MAX_BREADTH = QUERY_COST.get('MAX_BREADTH', 50)
+DEFAULT_LIST_SIZE = QUERY_COST.get('DEFAULT_LIST_SIZE', 50)
+FIELD_WEIGHTS = QUERY_COST.get('FIELD_WEIGHTS', {})
+
+# Arguments that bound how many items a field returns
+LIST_SIZE_ARGUMENTS = ('first', 'last', 'perColumn')
+
+# Lists of a known length, or bounded by an argument of a field above them
+FIXED_LIST_SIZES = {
+    'TaskBoardType.columns': len(STATUSES),
+    'TaskBoardColumnType.tasks': 1,
+}
+
+
+class OperationCost:
+    """
+    Cost, depth and widest selection of one operation.
+    """
+
+    def __init__(self, cost=0, depth=0, breadth=0):
+        self.cost = cost
+        self.depth = depth
+        self.breadth = breadth
+
+    def as_extension(self):
+        return {
+            'requestedQueryCost': self.cost,
+            'maximumAvailable': MAX_COST,
+            'depth': self.depth,
+        }
+
+
+class CostAnalyzer:
+    """
+    Walks one operation's selection sets against the schema.
+    """
+
+    def __init__(self, schema, fragments, operation, variables=None):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = {}
+        for definition in operation.variable_definitions or ():
+            name = definition.variable.name.value
+            if variables is not None and name in variables:
+                self.variables[name] = variables[name]
+            elif definition.default_value is not None:
+                self.variables[name] = value_from_ast_untyped(definition.default_value)
+        self.breadth = 0
+
+    def measure(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return OperationCost()
+        cost, depth = self.selection_cost(root_type, operation.selection_set)
+        return OperationCost(cost, depth, self.breadth)
+
+    def collect_fields(self, parent_type, selection_set, spreads=frozenset()):
+        """
+        Yield ``(parent_type, field_node)`` for the fields of a selection set,
+        expanding fragments in place.
+        """
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                if fragment_type is not None:
+                    yield from self.collect_fields(fragment_type, selection.selection_set, spreads)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                # Cycles are reported by NoFragmentCyclesRule
+                if fragment is None or name in spreads:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                if fragment_type is not None:
+                    yield from self.collect_fields(
+                        fragment_type, fragment.selection_set, spreads | {name}
+                    )
+
+    def selection_cost(self, parent_type, selection_set):
+        fields = list(self.collect_fields(parent_type, selection_set))
+        self.breadth = max(self.breadth, len(fields))
+
+        total, depth = 0, 0
+        for field_parent, node in fields:
+            name = node.name.value
+            field = getattr(field_parent, 'fields', {}).get(name)
+            if field is None or name.startswith('__'):
+                continue
+
+            field_type = get_named_type(field.type)
+            weight = FIELD_WEIGHTS.get(f'{field_parent.name}.{name}')
+            child_cost, child_depth = 0, 0
+            if is_composite_type(field_type) and node.selection_set:
+                child_cost, child_depth = self.selection_cost(field_type, node.selection_set)
+                if weight is None:
+                    weight = 1
+            total += self.list_size(field_parent, field, node) * ((weight or 0) + child_cost)
+            depth = max(depth, child_depth + 1)
+        return total, depth
+
+    def list_size(self, parent_type, field, node):
+        # A connection's edges are bounded by the connection field's arguments
+        if node.name.value == 'edges' and parent_type.name.endswith('Connection'):
+            return 1
+        fixed = FIXED_LIST_SIZES.get(f'{parent_type.name}.{node.name.value}')
+        if fixed is not None:
+            return fixed
+
+        sizes = []
+        for argument in node.arguments:
+            if argument.name.value not in LIST_SIZE_ARGUMENTS:
+                continue
+            size = None
+            if isinstance(argument.value, VariableNode):
+                size = self.variables.get(argument.value.name.value)
+                # Values that are not integers fail coercion later on
+                if not isinstance(size, int) or isinstance(size, bool):
+                    size = None
+            elif isinstance(argument.value, IntValueNode):
+                size = int(argument.value.value)
+            sizes.append(MAX_PAGE_SIZE if size is None else min(size, MAX_PAGE_SIZE))
+        if sizes:
+            return min(sizes)
+        if any(name in field.args for name in LIST_SIZE_ARGUMENTS):
+            return DEFAULT_PAGE_SIZE
+        if is_list_type(get_nullable_type(field.type)):
+            return DEFAULT_LIST_SIZE
+        return 1
+
+
+def _fragments(document):
+    return {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+
+def measure_operation(schema, document, operation_name=None, variables=None):
+    """
+    Return the OperationCost of the operation ``operation_name`` selects in
+    ``document``, or None if there is no such operation. List sizes passed
+    as variables are taken from ``variables`` when given.
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return None
+    return CostAnalyzer(schema, _fragments(document), operation, variables).measure(operation)
+
+
+def _label(operation):
+    return 'Mutation' if operation.operation == OperationType.MUTATION else 'Query'
+
+
+def _too_complex(measured, label, node=None):
+    return GraphQLError(
+        f'{label} cost {measured.cost} exceeds the maximum of {MAX_COST}',
+        node,
+        extensions={'code': 'QUERY_TOO_COMPLEX', 'cost': measured.as_extension()},
+    )
+
+
+def cost_error(measured, operation):
+    """
+    The error refusing ``operation`` if its cost ``measured`` with the
+    request's variables is over MAX_COST, else None.
+    """
+    if measured is None or measured.cost <= MAX_COST:
+        return None
+    return _too_complex(measured, _label(operation), operation)
+
+
+class QueryCostRule(ValidationRule):
+    """
+    Reject operations that are too expensive, too deep or too broad.
+    """
+
+    def enter_operation_definition(self, node, *_args):
+        context = self.context
+        measured = CostAnalyzer(context.schema, _fragments(context.document), node).measure(node)
+        label = _label(node)
+
+        if measured.depth > MAX_DEPTH:
+            context.report_error(GraphQLError(
+                f'{label} depth {measured.depth} exceeds the maximum of {MAX_DEPTH}',
+                node,
+                extensions={'code': 'QUERY_TOO_DEEP', 'depth': measured.depth},
+            ))
+        if measured.breadth > MAX_BREADTH:
+            context.report_error(GraphQLError(
+                f'{label} selects {measured.breadth} fields in one selection set; '
+                f'the maximum is {MAX_BREADTH}',
+                node,
+                extensions={'code': 'QUERY_TOO_BROAD', 'breadth': measured.breadth},
+            ))
+        if measured.cost > MAX_COST:
+            context.report_error(_too_complex(measured, label, node))
+        return self.SKIP
@@ -0,0 +1,252 @@
+"""
+Request-scoped batch loaders for the relation fields on the GraphQL types.
+
+Every list of rows handed to the schema is registered here, which queues the
+keys of the relations reachable from those rows. The first time any one of
+them is resolved, the whole queue is fetched with a single ``IN (...)`` query,
+so ``projects { tasks { comments } }`` costs one query per nesting level
+instead of one per row.
+
+Under the async schema the same loaders hand back coroutines built on the
+async ORM; concurrent resolvers for keys of one batch share its query.
+
+Archived tasks and comments (see archive.py) resolve through the same types
+as live ones; their relations to each other have loaders of their own.
+"""
+import asyncio
+from inspect import isawaitable
+
+from ..models import ArchivedTask, ArchivedTaskComment, Organization, Project, Task, TaskComment
+from .projection import comment_summary
+
+
+def in_event_loop():
+    """True when called from a coroutine, where sync ORM calls are not allowed."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class RelationLoader:
+    """
+    Batch-load rows of ``model`` keyed by ``key_field``.
+
+    ``many`` loaders return a list per key (reverse relations), the others
+    return a single instance or None (forward relations).
+    """
+
+    def __init__(self, registry, model, key_field, many=False):
+        self.registry = registry
+        self.model = model
+        self.key_field = key_field
+        self.key_attname = model._meta.get_field(key_field).attname
+        self.many = many
+        self.cache = {}
+        self.pending = set()
+        self.inflight = {}
+
+    def add(self, instance):
+        """Cache a row that was loaded elsewhere under its own key."""
+        key = getattr(instance, self.key_attname)
+        self.cache.setdefault(key, instance)
+        self.pending.discard(key)
+
+    def prime(self, key):
+        """Queue a key so it is fetched with the next batch."""
+        if key is not None and key not in self.cache:
+            self.pending.add(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            self.dispatch()
+        return self.cache[key]
+
+    async def aload(self, key):
+        if key not in self.cache:
+            if key not in self.inflight:
+                self.pending.add(key)
+                await self.adispatch()
+            else:
+                await self.inflight[key]
+        return self.cache[key]
+
+    def get_queryset(self, keys):
+        return self.model._default_manager.filter(**{f'{self.key_field}__in': keys})
+
+    def dispatch(self):
+        keys, self.pending = self.pending, set()
+        self.store(keys, list(self.get_queryset(keys)))
+
+    async def adispatch(self):
+        keys, self.pending = self.pending, set()
+        batch = asyncio.get_running_loop().create_future()
+        self.inflight.update(dict.fromkeys(keys, batch))
+        try:
+            self.store(keys, [row async for row in self.get_queryset(keys)])
+            batch.set_result(None)
+        except BaseException as e:
+            batch.set_exception(e)
+            raise
+        finally:
+            for key in keys:
+                self.inflight.pop(key, None)
+
+    def store(self, keys, rows):
+        if self.many:
+            results = {key: [] for key in keys}
+            for row in rows:
+                results[getattr(row, self.key_attname)].append(row)
+        else:
+            results = dict.fromkeys(keys)
+            for row in rows:
+                results[getattr(row, self.key_attname)] = row
+
+        self.cache.update(results)
+        self.registry.register(rows)
+
+
+class CommentSummaryLoader(RelationLoader):
+    """
+    The ``comment_summary`` values of tasks by id, for tasks that were not
+    loaded with them annotated (see projection.py).
+    """
+
+    def __init__(self, registry, model=Task, comment_model=TaskComment):
+        super().__init__(registry, model, 'id')
+        self.comment_model = comment_model
+
+    def get_queryset(self, keys):
+        summary = comment_summary(self.comment_model)
+        return (
+            self.model.objects.filter(id__in=keys).order_by()
+            .annotate(**summary).values('id', *summary)
+        )
+
+    def store(self, keys, rows):
+        # Tasks deleted meanwhile have no comments
+        empty = {'comment_count': 0, 'last_comment_at': None, 'last_comment_author': None}
+        self.cache.update(dict.fromkeys(keys, empty))
+        self.cache.update({row['id']: row for row in rows})
+
+
+class LoaderRegistry:
+    """
+    All loaders for a single request, plus the rules for priming them.
+    """
+
+    def __init__(self, organization=None):
+        self.organization = RelationLoader(self, Organization, 'id')
+        self.project = RelationLoader(self, Project, 'id')
+        self.task = RelationLoader(self, Task, 'id')
+        self.tasks = RelationLoader(self, Task, 'project', many=True)
+        self.comments = RelationLoader(self, TaskComment, 'task', many=True)
+        self.comment_summary = CommentSummaryLoader(self)
+        self.archived_task = RelationLoader(self, ArchivedTask, 'id')
+        self.archived_comments = RelationLoader(self, ArchivedTaskComment, 'task', many=True)
+        self.archived_comment_summary = CommentSummaryLoader(self, ArchivedTask, ArchivedTaskComment)
+
+        # The tenant is already loaded by OrganizationMiddleware
+        if organization is not None:
+            self.organization.add(organization)
+
+        # model -> loader fetching that model by primary key
+        self.by_pk = {
+            Organization: self.organization,
+            Project: self.project,
+            Task: self.task,
+            ArchivedTask: self.archived_task,
+        }
+
+        # model -> [(loader, attribute holding its key)]
+        self.primers = {
+            Project: [(self.tasks, 'pk'), (self.organization, 'organization_id')],
+            Task: [
+                (self.comments, 'pk'),
+                (self.comment_summary, 'pk'),
+                (self.project, 'project_id'),
+            ],
+            TaskComment: [(self.task, 'task_id')],
+            ArchivedTask: [
+                (self.archived_comments, 'pk'),
+                (self.archived_comment_summary, 'pk'),
+                (self.project, 'project_id'),
+            ],
+            ArchivedTaskComment: [(self.archived_task, 'task_id')],
+        }
+
+        # (model, name) -> loader used instead of the one called ``name``
+        self.overrides = {
+            (ArchivedTask, 'comments'): self.archived_comments,
+            (ArchivedTask, 'comment_summary'): self.archived_comment_summary,
+            (ArchivedTaskComment, 'task'): self.archived_task,
+        }
+
+    def loader(self, instance, name):
+        """The loader for relation ``name`` of ``instance``."""
+        return self.overrides.get((type(instance), name)) or getattr(self, name)
+
+    def register(self, instances):
+        """
+        Queue the relation keys of ``instances`` and return them as a list.
+        """
+        instances = list(instances)
+        for instance in instances:
+            # Rows projected onto a selection set (projection.py) would
+            # lack columns other fields need, so they are not shared
+            if type(instance) in self.by_pk and not instance.get_deferred_fields():
+                self.by_pk[type(instance)].add(instance)
+        for instance in instances:
+            for loader, attname in self.primers.get(type(instance), ()):
+                loader.prime(getattr(instance, attname))
+        return instances
+
+    def load(self, loader, key):
+        """
+        Return the cached value for ``key``, or fetch its batch; a coroutine
+        is returned when running under the async schema.
+        """
+        if key in loader.cache:
+            return loader.cache[key]
+        if in_event_loop():
+            return loader.aload(key)
+        return loader.load(key)
+
+    def load_forward(self, instance, field_name):
+        """Resolve a ForeignKey, reusing a select_related value if present."""
+        field = instance._meta.get_field(field_name)
+        if field.is_cached(instance):
+            return getattr(instance, field_name)
+        return self.load(self.loader(instance, field_name), getattr(instance, field.attname))
+
+    def load_reverse(self, instance, related_name):
+        """Resolve a reverse ForeignKey, reusing a prefetch if present."""
+        prefetched = getattr(instance, '_prefetched_objects_cache', {})
+        if related_name in prefetched:
+            return self.register(prefetched[related_name])
+        return self.load(self.loader(instance, related_name), instance.pk)
+
+    def load_comment_summary(self, task, name):
+        """Resolve a comment summary field, reusing its annotation if present."""
+        if name in task.__dict__:
+            return task.__dict__[name]
+        summary = self.load(self.loader(task, 'comment_summary'), task.pk)
+        if isawaitable(summary):
+            return self._field(summary, name)
+        return summary[name]
+
+    @staticmethod
+    async def _field(summary, name):
+        return (await summary)[name]
+
+
+def get_loaders(info):
+    """Return the loader registry bound to the current request."""
+    context = info.context
+    loaders = getattr(context, '_loaders', None)
+    if loaders is None:
+        loaders = LoaderRegistry(getattr(context, 'organization', None))
+        context._loaders = loaders
+    return loaders
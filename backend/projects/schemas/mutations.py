@@ -1,6 +1,17 @@
+import csv
+import io
+from collections import defaultdict
+
 import graphene
-from ..models import Project, Task, TaskComment
-from .types import ProjectType, TaskType, TaskCommentType
+from django.db import transaction
+from django.utils import timezone
+from .. import events
+from ..changes import COMMENT, PROJECT, TASK, project_tombstones, record_changes, task_tombstones
+from ..counters import adjust_counters
+from ..imports import FORMATS, ImportFailed, Importer, guess_format, read_rows
+from ..models import ImportJob, Project, ProjectTaskCounters, Task, TaskComment
+from ..response_cache import bump_organization_version
+from .types import ImportJobType, ProjectType, TaskType, TaskCommentType, Upload
 
 
 class CreateProject(graphene.Mutation):
@@ -19,13 +30,17 @@ class CreateProject(graphene.Mutation):
         if not org:
             return CreateProject(success=False, message="No organization header")
         
-        project = Project.objects.create(
-            organization=org,
-            name=name,
-            description=kwargs.get('description', ''),
-            status=kwargs.get('status', 'planning'),
-            due_date=kwargs.get('due_date')
-        )
+        with transaction.atomic():
+            project = Project.objects.create(
+                organization=org,
+                name=name,
+                description=kwargs.get('description', ''),
+                status=kwargs.get('status', 'planning'),
+                due_date=kwargs.get('due_date')
+            )
+            ProjectTaskCounters.objects.create(project=project)
+            record_changes(org.id, saved=[(PROJECT, project.id)])
+        bump_organization_version(org.id)
         return CreateProject(project=project, success=True, message="Project created")
 
 
@@ -55,7 +70,10 @@ class UpdateProject(graphene.Mutation):
             if value is not None:
                 setattr(project, field, value)
         
-        project.save()
+        with transaction.atomic():
+            project.save()
+            record_changes(org.id, saved=[(PROJECT, project.id)])
+        bump_organization_version(org.id)
         return UpdateProject(project=project, success=True, message="Project updated")
 
 
@@ -74,7 +92,10 @@ class DeleteProject(graphene.Mutation):
         try:
             project = Project.objects.get(id=project_id, organization=org)
             project_name = project.name  # Store name before deletion
-            project.delete()
+            with transaction.atomic():
+                record_changes(org.id, deleted=project_tombstones([project.id]))
+                project.delete()
+            bump_organization_version(org.id)
             return DeleteProject(
                 success=True, 
                 message=f"Project '{project_name}' deleted successfully"
@@ -107,15 +128,20 @@ class CreateTask(graphene.Mutation):
         except Project.DoesNotExist:
             return CreateTask(success=False, message="Project not found")
         
-        task = Task.objects.create(
-            project=project,
-            title=title,
-            description=kwargs.get('description', ''),
-            status=kwargs.get('status', 'todo'),
-            priority=kwargs.get('priority', 'medium'),
-            assignee=kwargs.get('assignee', ''),
-            due_date=kwargs.get('due_date')
-        )
+        with transaction.atomic():
+            task = Task.objects.create(
+                project=project,
+                title=title,
+                description=kwargs.get('description', ''),
+                status=kwargs.get('status', 'todo'),
+                priority=kwargs.get('priority', 'medium'),
+                assignee=kwargs.get('assignee', ''),
+                due_date=kwargs.get('due_date')
+            )
+            adjust_counters(project.id, added=[(task.status, task.priority)])
+            record_changes(org.id, saved=[(TASK, task.id)])
+        bump_organization_version(org.id)
+        events.task_changed('created', task.project_id, task.id, task)
         return CreateTask(task=task, success=True, message="Task created")
 
 
@@ -138,18 +164,28 @@ class UpdateTask(graphene.Mutation):
         if not org:
             return UpdateTask(success=False, message="No organization header")
         
-        try:
-            task = Task.objects.select_related('project').get(
-                id=task_id, project__organization=org
+        with transaction.atomic():
+            try:
+                task = (
+                    Task.objects.select_related('project')
+                    .select_for_update(of=('self',))
+                    .get(id=task_id, organization=org)
+                )
+            except Task.DoesNotExist:
+                return UpdateTask(success=False, message="Task not found")
+            
+            previous = (task.status, task.priority)
+            for field, value in kwargs.items():
+                if value is not None:
+                    setattr(task, field, value)
+            
+            task.save()
+            adjust_counters(
+                task.project_id, added=[(task.status, task.priority)], removed=[previous]
             )
-        except Task.DoesNotExist:
-            return UpdateTask(success=False, message="Task not found")
-        
-        for field, value in kwargs.items():
-            if value is not None:
-                setattr(task, field, value)
-        
-        task.save()
+            record_changes(org.id, saved=[(TASK, task.id)])
+        bump_organization_version(org.id)
+        events.task_changed('updated', task.project_id, task.id, task)
         return UpdateTask(task=task, success=True, message="Task updated")
 
 
@@ -166,11 +202,19 @@ class DeleteTask(graphene.Mutation):
             return DeleteTask(success=False, message="No organization header")
         
         try:
-            task = Task.objects.select_related('project').get(
-                id=task_id, project__organization=org
-            )
-            task_title = task.title  # Store title before deletion
-            task.delete()
+            with transaction.atomic():
+                task = (
+                    Task.objects.select_related('project')
+                    .select_for_update(of=('self',))
+                    .get(id=task_id, organization=org)
+                )
+                task_title = task.title  # Store title before deletion
+                deleted_id = task.id
+                record_changes(org.id, deleted=task_tombstones([task.id]))
+                task.delete()
+                adjust_counters(task.project_id, removed=[(task.status, task.priority)])
+            bump_organization_version(org.id)
+            events.task_changed('deleted', task.project_id, deleted_id)
             return DeleteTask(
                 success=True, 
                 message=f"Task '{task_title}' deleted successfully"
@@ -194,16 +238,24 @@ class AddComment(graphene.Mutation):
         if not org:
             return AddComment(success=False, message="No organization header")
         
-        try:
-            task = Task.objects.select_related('project').get(
-                id=task_id, project__organization=org
+        with transaction.atomic():
+            # The lock waits for an archival batch holding the task, which
+            # would otherwise delete it before this comment commits
+            try:
+                task = (
+                    Task.objects.select_related('project')
+                    .select_for_update(of=('self',), no_key=True)
+                    .get(id=task_id, organization=org)
+                )
+            except Task.DoesNotExist:
+                return AddComment(success=False, message="Task not found")
+            
+            comment = TaskComment.objects.create(
+                task=task, author=author, content=content
             )
-        except Task.DoesNotExist:
-            return AddComment(success=False, message="Task not found")
-        
-        comment = TaskComment.objects.create(
-            task=task, author=author, content=content
-        )
+            record_changes(org.id, saved=[(COMMENT, comment.id)])
+        bump_organization_version(org.id)
+        events.comment_added(comment)
         return AddComment(comment=comment, success=True, message="Comment added")
 
 
@@ -223,13 +275,16 @@ class UpdateComment(graphene.Mutation):
         
         try:
             comment = TaskComment.objects.select_related('task__project').get(
-                id=comment_id, task__project__organization=org
+                id=comment_id, organization=org
             )
         except TaskComment.DoesNotExist:
             return UpdateComment(success=False, message="Comment not found")
         
         comment.content = content
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            record_changes(org.id, saved=[(COMMENT, comment.id)])
+        bump_organization_version(org.id)
         return UpdateComment(comment=comment, success=True, message="Comment updated")
 
 
@@ -247,14 +302,297 @@ class DeleteComment(graphene.Mutation):
         
         try:
             comment = TaskComment.objects.select_related('task__project').get(
-                id=comment_id, task__project__organization=org
+                id=comment_id, organization=org
             )
-            comment.delete()
+            with transaction.atomic():
+                record_changes(org.id, deleted=[(COMMENT, comment.id)])
+                comment.delete()
+            bump_organization_version(org.id)
             return DeleteComment(success=True, message="Comment deleted successfully")
         except TaskComment.DoesNotExist:
             return DeleteComment(success=False, message="Comment not found")
 
 
+MAX_BULK_TASKS = 500
+
+
+def parse_id(value):
+    """Return ``value`` as an integer primary key, or None if it is not one."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TaskInput(graphene.InputObjectType):
+    project_id = graphene.ID(required=True)
+    title = graphene.String(required=True)
+    description = graphene.String()
+    status = graphene.String()
+    priority = graphene.String()
+    assignee = graphene.String()
+    due_date = graphene.DateTime()
+
+
+class TaskUpdateInput(graphene.InputObjectType):
+    task_id = graphene.ID(required=True)
+    title = graphene.String()
+    description = graphene.String()
+    status = graphene.String()
+    priority = graphene.String()
+    assignee = graphene.String()
+    due_date = graphene.DateTime()
+
+
+class BulkTaskResult(graphene.ObjectType):
+    """Outcome for one item of a bulk task mutation, in input order."""
+    index = graphene.Int()
+    task_id = graphene.ID()
+    task = graphene.Field(TaskType)
+    success = graphene.Boolean()
+    message = graphene.String()
+
+
+class BulkCreateTasks(graphene.Mutation):
+    class Arguments:
+        tasks = graphene.List(graphene.NonNull(TaskInput), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    message = graphene.String()
+    
+    def mutate(self, info, tasks):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return BulkCreateTasks(success=False, message="No organization header")
+        if len(tasks) > MAX_BULK_TASKS:
+            return BulkCreateTasks(success=False, message=f"At most {MAX_BULK_TASKS} tasks per request")
+        
+        # One query to check every referenced project belongs to the tenant
+        project_ids = {parse_id(item.project_id) for item in tasks} - {None}
+        owned = set(
+            Project.objects.filter(id__in=project_ids, organization=org)
+            .order_by().values_list('id', flat=True)
+        )
+        
+        results = []
+        new_tasks = []
+        for index, item in enumerate(tasks):
+            project_id = parse_id(item.project_id)
+            if project_id not in owned:
+                results.append(BulkTaskResult(index=index, success=False, message="Project not found"))
+                continue
+            task = Task(
+                organization=org,
+                project_id=project_id,
+                title=item.title,
+                description=item.description or '',
+                status=item.status or 'todo',
+                priority=item.priority or 'medium',
+                assignee=item.assignee or '',
+                due_date=item.due_date,
+            )
+            new_tasks.append(task)
+            results.append(BulkTaskResult(index=index, task=task, success=True, message="Task created"))
+        
+        with transaction.atomic():
+            Task.objects.bulk_create(new_tasks)
+            added = defaultdict(list)
+            for task in new_tasks:
+                added[task.project_id].append((task.status, task.priority))
+            for project_id, pairs in added.items():
+                adjust_counters(project_id, added=pairs)
+            record_changes(org.id, saved=[(TASK, task.id) for task in new_tasks])
+        
+        for result in results:
+            if result.task is not None:
+                result.task_id = result.task.id
+        bump_organization_version(org.id)
+        for task in new_tasks:
+            events.task_changed('created', task.project_id, task.id, task)
+        return BulkCreateTasks(
+            results=results,
+            success=True,
+            message=f"{len(new_tasks)} of {len(tasks)} tasks created"
+        )
+
+
+class BulkUpdateTasks(graphene.Mutation):
+    class Arguments:
+        tasks = graphene.List(graphene.NonNull(TaskUpdateInput), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    message = graphene.String()
+    
+    def mutate(self, info, tasks):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return BulkUpdateTasks(success=False, message="No organization header")
+        if len(tasks) > MAX_BULK_TASKS:
+            return BulkUpdateTasks(success=False, message=f"At most {MAX_BULK_TASKS} tasks per request")
+        
+        task_ids = {parse_id(item.task_id) for item in tasks} - {None}
+        results = []
+        with transaction.atomic():
+            # One query loads and locks every task the tenant owns
+            found = {
+                task.id: task
+                for task in Task.objects.select_for_update(of=('self',))
+                .filter(id__in=task_ids, organization=org)
+            }
+            previous = {task_id: (task.status, task.priority) for task_id, task in found.items()}
+            
+            changed_fields = set()
+            for index, item in enumerate(tasks):
+                task = found.get(parse_id(item.task_id))
+                if task is None:
+                    results.append(BulkTaskResult(
+                        index=index, task_id=item.task_id, success=False, message="Task not found"
+                    ))
+                    continue
+                for field, value in item.items():
+                    if field != 'task_id' and value is not None:
+                        setattr(task, field, value)
+                        changed_fields.add(field)
+                results.append(BulkTaskResult(
+                    index=index, task_id=task.id, task=task, success=True, message="Task updated"
+                ))
+            
+            if changed_fields:
+                # bulk_update bypasses auto_now
+                now = timezone.now()
+                for task in found.values():
+                    task.updated_at = now
+                Task.objects.bulk_update(
+                    found.values(), sorted(changed_fields) + ['updated_at'], batch_size=MAX_BULK_TASKS
+                )
+                
+                added = defaultdict(list)
+                removed = defaultdict(list)
+                for task_id, task in found.items():
+                    added[task.project_id].append((task.status, task.priority))
+                    removed[task.project_id].append(previous[task_id])
+                for project_id in added:
+                    adjust_counters(project_id, added=added[project_id], removed=removed[project_id])
+                for task in found.values():
+                    events.task_changed('updated', task.project_id, task.id, task)
+                record_changes(org.id, saved=[(TASK, task_id) for task_id in found])
+        
+        updated = sum(1 for result in results if result.success)
+        bump_organization_version(org.id)
+        return BulkUpdateTasks(
+            results=results,
+            success=True,
+            message=f"{updated} of {len(tasks)} tasks updated"
+        )
+
+
+class BulkDeleteTasks(graphene.Mutation):
+    class Arguments:
+        task_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+    
+    results = graphene.List(BulkTaskResult)
+    success = graphene.Boolean()
+    message = graphene.String()
+    
+    def mutate(self, info, task_ids):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return BulkDeleteTasks(success=False, message="No organization header")
+        if len(task_ids) > MAX_BULK_TASKS:
+            return BulkDeleteTasks(success=False, message=f"At most {MAX_BULK_TASKS} tasks per request")
+        
+        pks = {parse_id(task_id) for task_id in task_ids} - {None}
+        with transaction.atomic():
+            owned = {
+                task_id: (project_id, status, priority)
+                for task_id, project_id, status, priority in Task.objects.select_for_update(of=('self',))
+                .filter(id__in=pks, organization=org)
+                .values_list('id', 'project_id', 'status', 'priority')
+            }
+            record_changes(org.id, deleted=task_tombstones(owned))
+            Task.objects.filter(id__in=owned).delete()
+            
+            removed = defaultdict(list)
+            for project_id, status, priority in owned.values():
+                removed[project_id].append((status, priority))
+            for project_id, pairs in removed.items():
+                adjust_counters(project_id, removed=pairs)
+            for task_id, (project_id, status, priority) in owned.items():
+                events.task_changed('deleted', project_id, task_id)
+        
+        results = []
+        for index, task_id in enumerate(task_ids):
+            if parse_id(task_id) in owned:
+                results.append(BulkTaskResult(
+                    index=index, task_id=task_id, success=True, message="Task deleted"
+                ))
+            else:
+                results.append(BulkTaskResult(
+                    index=index, task_id=task_id, success=False, message="Task not found"
+                ))
+        bump_organization_version(org.id)
+        return BulkDeleteTasks(
+            results=results,
+            success=True,
+            message=f"{len(owned)} of {len(task_ids)} tasks deleted"
+        )
+
+
+class ImportTasks(graphene.Mutation):
+    """
+    Import tasks and comments from an uploaded NDJSON or CSV file (see
+    imports.py). To continue an import that stopped part way, upload the
+    same file again with its job id as ``resume_job_id``.
+    """
+    class Arguments:
+        file = Upload(required=True)
+        format = graphene.String()
+        resume_job_id = graphene.ID()
+    
+    job = graphene.Field(ImportJobType)
+    success = graphene.Boolean()
+    message = graphene.String()
+    
+    def mutate(self, info, file, format=None, resume_job_id=None):
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return ImportTasks(success=False, message="No organization header")
+        if not hasattr(file, 'read'):
+            return ImportTasks(success=False, message="Expected an uploaded file")
+        format = (format or guess_format(file.name)).lower()
+        if format not in FORMATS:
+            return ImportTasks(success=False, message=f"Unknown format {format}")
+        
+        if resume_job_id:
+            try:
+                job = ImportJob.objects.get(id=parse_id(resume_job_id), organization=org)
+            except ImportJob.DoesNotExist:
+                return ImportTasks(success=False, message="Import not found")
+            if job.status == 'completed':
+                return ImportTasks(job=job, success=False, message="Import already completed")
+            if (job.source, job.format) != (file.name[:255], format):
+                return ImportTasks(job=job, success=False, message="File does not match the import")
+        else:
+            job = ImportJob.objects.create(organization=org, source=file.name[:255], format=format)
+        
+        importer = Importer(job)
+        stream = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            job = importer.run(read_rows(stream, format))
+        except (ImportFailed, UnicodeDecodeError, csv.Error) as e:
+            return ImportTasks(
+                job=importer.job, success=False, message=f"Import stopped after {importer.job.checkpoint} rows: {e}"
+            )
+        return ImportTasks(
+            job=job,
+            success=True,
+            message=f"{job.imported_tasks} tasks and {job.imported_comments} comments imported, "
+                    f"{job.failed_rows} rows skipped"
+        )
+
+
 # Main Mutation class with all mutations
 class Mutation(graphene.ObjectType):
     # Project mutations
@@ -266,6 +604,10 @@ class Mutation(graphene.ObjectType):
     create_task = CreateTask.Field()
     update_task = UpdateTask.Field()
     delete_task = DeleteTask.Field()
+    bulk_create_tasks = BulkCreateTasks.Field()
+    bulk_update_tasks = BulkUpdateTasks.Field()
+    bulk_delete_tasks = BulkDeleteTasks.Field()
+    import_tasks = ImportTasks.Field()
     
     # Comment mutations
     add_comment = AddComment.Field()
@@ -0,0 +1,184 @@
+"""
+Keyset pagination for the Relay-style connection fields.
+
+Rows are ordered by ``(created_at, id)`` and cursors encode that pair, so a
+page is fetched with ``WHERE (created_at, id) > cursor ... LIMIT n`` rather
+than an OFFSET; the hundredth page costs the same as the first.
+
+Ranked results (search) have no such key and use OffsetPage instead. The
+change feed pages through its log by entry id (``change_page``).
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+from graphql_relay import cursor_to_offset, offset_to_cursor
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(instance):
+    value = f'{instance.created_at.isoformat()}|{instance.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError):
+        raise GraphQLError(f'Invalid cursor: {cursor}')
+
+
+def _beyond(cursor, forward):
+    """
+    Filter for rows strictly after ``cursor`` in ascending order (``forward``)
+    or strictly before it. The redundant bound on created_at lets the
+    database use it as an index range condition.
+    """
+    created_at, pk = decode_cursor(cursor)
+    if forward:
+        return Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+    return Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+
+
+def _page_size(value, name):
+    if value is None:
+        return None
+    if value < 0:
+        raise GraphQLError(f'`{name}` must be a non-negative integer')
+    return min(value, MAX_PAGE_SIZE)
+
+
+class KeysetPage:
+    """
+    One requested page: the bounded queryset to fetch and how to turn the
+    fetched rows into a connection. ``descending`` selects newest-first
+    ordering. With neither ``first`` nor ``last`` the first DEFAULT_PAGE_SIZE
+    rows are returned.
+    """
+
+    def __init__(self, queryset, connection_type, first=None, after=None, last=None,
+                 before=None, descending=False):
+        self.connection_type = connection_type
+        self.first = _page_size(first, 'first')
+        self.last = _page_size(last, 'last')
+        if self.first is None and self.last is None:
+            self.first = DEFAULT_PAGE_SIZE
+
+        if after:
+            queryset = queryset.filter(_beyond(after, forward=not descending))
+        if before:
+            queryset = queryset.filter(_beyond(before, forward=descending))
+
+        self.has_previous_page = bool(after)
+        self.has_next_page = bool(before)
+
+        # Paging backwards fetches in reverse order and flips the result
+        self.backwards = self.last is not None and self.first is None
+        if self.backwards != descending:
+            ordering = ['-created_at', '-id']
+        else:
+            ordering = ['created_at', 'id']
+        limit = self.last if self.backwards else self.first
+        self.queryset = queryset.order_by(*ordering)[:limit + 1]
+
+    def build(self, rows):
+        if self.backwards:
+            self.has_previous_page = len(rows) > self.last
+            rows = rows[:self.last][::-1]
+        else:
+            self.has_next_page = len(rows) > self.first
+            rows = rows[:self.first]
+            if self.last is not None:
+                rows = rows[-self.last:] if self.last else []
+
+        edges = [
+            self.connection_type.Edge(node=row, cursor=encode_cursor(row))
+            for row in rows
+        ]
+        return self.connection_type(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=self.has_previous_page,
+                has_next_page=self.has_next_page,
+            ),
+        )
+
+
+class OffsetPage:
+    """
+    One forward page of a list ordered by something other than a key, such
+    as search rank. Cursors are offsets; fetch ``limit`` rows from
+    ``offset`` and pass them to ``build``.
+    """
+
+    def __init__(self, connection_type, first=None, after=None):
+        self.connection_type = connection_type
+        self.first = _page_size(first, 'first')
+        if self.first is None:
+            self.first = DEFAULT_PAGE_SIZE
+
+        self.offset = 0
+        if after:
+            position = cursor_to_offset(after)
+            if position is None or position < 0:
+                raise GraphQLError(f'Invalid cursor: {after}')
+            self.offset = position + 1
+        self.limit = self.first + 1
+
+    def build(self, edges):
+        """``edges`` are keyword arguments for the connection's Edge type."""
+        has_next_page = len(edges) > self.first
+        edges = [
+            self.connection_type.Edge(cursor=offset_to_cursor(self.offset + i), **edge)
+            for i, edge in enumerate(edges[:self.first])
+        ]
+        return self.connection_type(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=self.offset > 0,
+                has_next_page=has_next_page,
+            ),
+        )
+
+
+def paginate(queryset, connection_type, **kwargs):
+    """
+    Return one page of ``queryset`` as an instance of ``connection_type``.
+    """
+    page = KeysetPage(queryset, connection_type, **kwargs)
+    return page.build(list(page.queryset))
+
+
+async def apaginate(queryset, connection_type, **kwargs):
+    """Async counterpart of ``paginate``."""
+    page = KeysetPage(queryset, connection_type, **kwargs)
+    return page.build([row async for row in page.queryset])
+
+
+def encode_change_cursor(entry_id):
+    return base64.urlsafe_b64encode(f'changes|{entry_id}'.encode()).decode()
+
+
+def change_page(since, first):
+    """
+    Return ``(entry_id, limit)`` for a page of the change feed after the
+    cursor ``since``.
+    """
+    try:
+        prefix, entry_id = base64.urlsafe_b64decode(since.encode()).decode().split('|')
+        entry_id = int(entry_id)
+    except (ValueError, UnicodeError):
+        raise GraphQLError(f'Invalid cursor: {since}')
+    if prefix != 'changes' or entry_id < 0:
+        raise GraphQLError(f'Invalid cursor: {since}')
+    limit = _page_size(first, 'first')
+    return entry_id, DEFAULT_PAGE_SIZE if limit is None else limit
@@ -0,0 +1,137 @@
+"""
+Column projection for list resolvers, driven by the GraphQL selection set.
+
+``optimize(queryset, info)`` loads only the model fields the operation
+selected (``.only()``), joins the forward relations it selected
+(``select_related``) and prefetches the reverse ones (``prefetch_related``),
+each projected the same way. ``projects { id name }`` then never reads the
+unbounded description columns, and ``tasks { project { name } }`` costs no
+extra query.
+
+Primary keys and foreign key columns are always loaded, since the batch
+loaders key on them (see loaders.py); loaders reuse joined and prefetched
+rows instead of querying again. Computed fields listed in ANNOTATIONS are
+added to the list query as annotations; other selected fields that are not
+model fields (``__typename``, ``archivedAt`` of a live task) need no
+columns.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from ..models import ArchivedTask, ArchivedTaskComment, Task, TaskComment
+
+# Where the rows of a connection field sit, and the columns its cursors read
+CONNECTION_NODES = ('edges', 'node')
+CURSOR_FIELDS = ('created_at',)
+
+
+def comment_summary(comment_model=TaskComment):
+    """Per-task comment count and latest comment, as subquery annotations."""
+    comments = comment_model.objects.filter(task=OuterRef('pk')).order_by()
+    latest = comments.order_by('-created_at', '-id')
+    return {
+        'comment_count': Coalesce(
+            Subquery(comments.values('task').annotate(count=Count('id')).values('count')), 0
+        ),
+        'last_comment_at': Subquery(latest.values('created_at')[:1]),
+        'last_comment_author': Subquery(latest.values('author')[:1]),
+    }
+
+
+def archived_comment_summary():
+    return comment_summary(ArchivedTaskComment)
+
+
+# model -> function returning {computed field: annotation}
+ANNOTATIONS = {Task: comment_summary, ArchivedTask: archived_comment_summary}
+
+
+def selections(nodes, fragments):
+    """
+    Merge the sub-selections of field ``nodes`` into ``{snake_case name:
+    [field nodes]}``, expanding fragments.
+    """
+    fields = {}
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(to_snake_case(selection.name.value), []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode) and selection.name.value in fragments:
+                collect(fragments[selection.name.value].selection_set)
+
+    for node in nodes:
+        collect(node.selection_set)
+    return fields
+
+
+def _plan(model, fields, fragments, prefix='', annotate=True):
+    """
+    Return ``(only, select_related, prefetches, annotations)`` for rows of
+    ``model`` reached through ``prefix``, given their selected ``fields``.
+    Joined rows, and rows planned with ``annotate`` off, get no annotations.
+    """
+    only = [prefix + model._meta.pk.name]
+    only += [prefix + field.name for field in model._meta.concrete_fields if field.is_relation]
+    related = []
+    prefetches = []
+    annotations = {}
+    for name, nodes in fields.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if annotate and not prefix and model in ANNOTATIONS:
+                available = ANNOTATIONS[model]()
+                if name in available:
+                    annotations[name] = available[name]
+            continue
+        if not field.is_relation:
+            only.append(prefix + name)
+        elif field.many_to_one:
+            related.append(prefix + name)
+            sub_only, sub_related, sub_prefetches, _ = _plan(
+                field.related_model, selections(nodes, fragments), fragments, f'{prefix}{name}__'
+            )
+            only += sub_only
+            related += sub_related
+            prefetches += sub_prefetches
+        elif field.one_to_many:
+            queryset = _apply(
+                field.related_model._default_manager.all(), selections(nodes, fragments), fragments
+            )
+            prefetches.append(Prefetch(prefix + field.get_accessor_name(), queryset=queryset))
+    return only, related, prefetches, annotations
+
+
+def _apply(queryset, fields, fragments, always=(), annotate=True):
+    only, related, prefetches, annotations = _plan(queryset.model, fields, fragments, annotate=annotate)
+    queryset = queryset.only(*only, *always)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    if related:
+        queryset = queryset.select_related(*related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def optimize(queryset, info, path=(), always=(), annotate=True):
+    """
+    Project ``queryset`` onto what the current field selects. ``path``
+    leads from the field to the rows (CONNECTION_NODES for a connection);
+    ``always`` names columns the resolver itself reads. With ``annotate``
+    off, computed fields are left to their loaders, batched by the ids of
+    the rows returned.
+    """
+    fragments = info.fragments
+    nodes = info.field_nodes
+    for name in path:
+        nodes = selections(nodes, fragments).get(name, [])
+    return _apply(queryset, selections(nodes, fragments), fragments, always, annotate)
@@ -1,7 +1,64 @@
+import heapq
+
 import graphene
-from django.db.models import Count, Q
-from ..models import Organization, Project, Task, TaskComment
-from .types import OrganizationType, ProjectType, TaskType, TaskCommentType
+from graphql import GraphQLError
+
+from ..board import board_columns, board_queryset
+from ..changes import COMMENT, PROJECT, TASK, latest_entry_id, read_changes
+from ..models import ArchivedTask, Organization, Project, Task, TaskComment
+from ..search import search
+from ..stats import get_organization_stats, get_project_stats
+from .loaders import get_loaders
+from .pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, OffsetPage, change_page, encode_change_cursor, paginate,
+)
+from .projection import CONNECTION_NODES, CURSOR_FIELDS, optimize
+from .types import (
+    OrganizationType, ProjectType, TaskType, TaskCommentType,
+    ProjectConnection, TaskConnection, TaskCommentConnection, SearchResultConnection,
+    TaskBoardColumnType, TaskBoardType, TaskOrder,
+)
+
+# Where the tasks of a taskBoard sit, and the columns grouping them reads
+BOARD_TASKS = ('columns', 'tasks')
+BOARD_FIELDS = ('status', 'created_at')
+
+# What live and archived task lists are merged on
+MERGE_FIELDS = ('created_at',)
+
+
+def board_page_size(per_column):
+    if per_column is None:
+        return DEFAULT_PAGE_SIZE
+    if per_column < 0:
+        raise GraphQLError('`perColumn` must be a non-negative integer')
+    return min(per_column, MAX_PAGE_SIZE)
+
+
+def filter_tasks(tasks, status=None):
+    return tasks if status is None else tasks.filter(status=status)
+
+
+def include_archived_argument(description):
+    return graphene.Boolean(default_value=False, description=description)
+
+
+def newest_first(*task_lists):
+    """Merge lists of tasks that are each ordered newest first."""
+    return list(heapq.merge(*task_lists, key=lambda task: task.created_at, reverse=True))
+
+
+def get_task(organization, id, include_archived=False):
+    """The task ``id`` of ``organization``, or its archived copy, or None."""
+    try:
+        return Task.objects.select_related('project').get(id=id, organization=organization)
+    except Task.DoesNotExist:
+        if not include_archived:
+            return None
+    try:
+        return ArchivedTask.objects.select_related('project').get(id=id, organization=organization)
+    except ArchivedTask.DoesNotExist:
+        return None
 
 
 class ProjectStatsType(graphene.ObjectType):
@@ -23,19 +80,94 @@ class OrganizationStatsType(graphene.ObjectType):
     overall_completion_rate = graphene.Float()
 
 
+class TombstoneType(graphene.ObjectType):
+    kind = graphene.String(description="project, task or comment")
+    id = graphene.ID()
+
+
+class ChangesType(graphene.ObjectType):
+    cursor = graphene.String(description="Pass as `since` to fetch the next changes")
+    has_more = graphene.Boolean(description="Whether more changes are waiting after `cursor`")
+    projects = graphene.List(ProjectType)
+    tasks = graphene.List(TaskType)
+    comments = graphene.List(TaskCommentType)
+    deleted = graphene.List(TombstoneType)
+
+    @classmethod
+    def from_change_set(cls, change_set):
+        return cls(
+            cursor=encode_change_cursor(change_set.cursor),
+            has_more=change_set.has_more,
+            projects=change_set.saved[PROJECT],
+            tasks=change_set.saved[TASK],
+            comments=change_set.saved[COMMENT],
+            deleted=[TombstoneType(kind=kind, id=pk) for kind, pk in change_set.deleted],
+        )
+
+
 class Query(graphene.ObjectType):
     # MISSING BASIC QUERIES - ADD THESE:
     organization = graphene.Field(OrganizationType)
     projects = graphene.List(ProjectType)
     project = graphene.Field(ProjectType, id=graphene.ID(required=True))
-    tasks = graphene.List(TaskType, project_id=graphene.ID(required=True))
-    task = graphene.Field(TaskType, id=graphene.ID(required=True))
-    comments = graphene.List(TaskCommentType, task_id=graphene.ID(required=True))
+    tasks = graphene.List(
+        TaskType,
+        project_id=graphene.ID(required=True),
+        include_archived=include_archived_argument("Also list the project's archived tasks"),
+    )
+    task = graphene.Field(
+        TaskType,
+        id=graphene.ID(required=True),
+        include_archived=include_archived_argument("Also look the task up among archived tasks"),
+    )
+    comments = graphene.List(
+        TaskCommentType,
+        task_id=graphene.ID(required=True),
+        include_archived=include_archived_argument("Also return the comments of an archived task"),
+    )
+    
+    # PAGINATED (KEYSET) VARIANTS OF THE LISTS ABOVE:
+    projects_connection = graphene.ConnectionField(ProjectConnection)
+    tasks_connection = graphene.ConnectionField(
+        TaskConnection,
+        project_id=graphene.ID(required=True),
+        status=graphene.String(),
+        order_by=TaskOrder(default_value=TaskOrder.NEWEST),
+    )
+    comments_connection = graphene.ConnectionField(
+        TaskCommentConnection, task_id=graphene.ID(required=True)
+    )
+    
+    # A PROJECT'S TASKS GROUPED BY STATUS, THE FIRST perColumn OF EACH:
+    task_board = graphene.Field(
+        TaskBoardType,
+        project_id=graphene.ID(required=True),
+        per_column=graphene.Int(),
+        order_by=TaskOrder(default_value=TaskOrder.NEWEST),
+    )
     
     # EXISTING STATISTICS QUERIES:
     project_stats = graphene.Field(ProjectStatsType, project_id=graphene.ID(required=True))
     organization_stats = graphene.Field(OrganizationStatsType)
-    all_project_stats = graphene.List(ProjectStatsType)
+    all_project_stats = graphene.List(
+        ProjectStatsType, project_ids=graphene.List(graphene.NonNull(graphene.ID))
+    )
+    
+    # FULL-TEXT SEARCH OVER TASKS AND COMMENTS, BEST MATCH FIRST:
+    search = graphene.Field(
+        SearchResultConnection,
+        query=graphene.String(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        include_archived=include_archived_argument("Also search archived tasks and their comments"),
+    )
+    
+    # INCREMENTAL SYNC: WHAT CHANGED SINCE A CURSOR
+    changes = graphene.Field(
+        ChangesType,
+        since=graphene.String(description="Cursor from an earlier call; omit to get the current one"),
+        first=graphene.Int(description="Maximum number of changes to read"),
+    )
     
     # NEW BASIC RESOLVERS:
     def resolve_organization(self, info):
@@ -47,7 +179,9 @@ class Query(graphene.ObjectType):
         org = getattr(info.context, 'organization', None)
         if not org:
             return []
-        return Project.objects.filter(organization=org)
+        return get_loaders(info).register(
+            optimize(Project.objects.filter(organization=org), info)
+        )
     
     def resolve_project(self, info, id):
         """Get specific project by ID"""
@@ -55,46 +189,106 @@ class Query(graphene.ObjectType):
         if not org:
             return None
         try:
-            return Project.objects.get(id=id, organization=org)
+            project = Project.objects.get(id=id, organization=org)
         except Project.DoesNotExist:
             return None
+        get_loaders(info).register([project])
+        return project
     
-    def resolve_tasks(self, info, project_id):
-        """Get all tasks for a project"""
+    def resolve_tasks(self, info, project_id, include_archived=False):
+        """Get all tasks for a project, newest first"""
         org = getattr(info.context, 'organization', None)
         if not org:
             return []
         try:
             project = Project.objects.get(id=project_id, organization=org)
-            return Task.objects.filter(project=project).order_by('-created_at')
         except Project.DoesNotExist:
             return []
+        tasks = Task.objects.filter(project=project).order_by('-created_at')
+        if not include_archived:
+            return get_loaders(info).register(optimize(tasks, info))
+        archived = ArchivedTask.objects.filter(project=project).order_by('-created_at')
+        return get_loaders(info).register(newest_first(
+            optimize(tasks, info, always=MERGE_FIELDS), optimize(archived, info, always=MERGE_FIELDS)
+        ))
     
-    def resolve_task(self, info, id):
+    def resolve_task(self, info, id, include_archived=False):
         """Get specific task by ID"""
         org = getattr(info.context, 'organization', None)
         if not org:
             return None
-        try:
-            task = Task.objects.select_related('project').get(
-                id=id, project__organization=org
-            )
-            return task
-        except Task.DoesNotExist:
-            return None
+        task = get_task(org, id, include_archived)
+        if task is not None:
+            get_loaders(info).register([task])
+        return task
     
-    def resolve_comments(self, info, task_id):
+    def resolve_comments(self, info, task_id, include_archived=False):
         """Get all comments for a task"""
         org = getattr(info.context, 'organization', None)
         if not org:
             return []
-        try:
-            task = Task.objects.select_related('project').get(
-                id=task_id, project__organization=org
-            )
-            return TaskComment.objects.filter(task=task).order_by('created_at')
-        except Task.DoesNotExist:
+        task = get_task(org, task_id, include_archived)
+        if task is None:
             return []
+        return get_loaders(info).register(
+            optimize(task.comments.order_by('created_at'), info)
+        )
+    
+    # PAGINATED RESOLVERS:
+    def resolve_projects_connection(self, info, **kwargs):
+        """Page through projects for current organization, newest first"""
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        projects = optimize(
+            Project.objects.filter(organization=org), info, CONNECTION_NODES, CURSOR_FIELDS
+        )
+        connection = paginate(projects, ProjectConnection, descending=True, **kwargs)
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+    
+    def resolve_tasks_connection(self, info, project_id, status=None, order_by=None, **kwargs):
+        """Page through tasks of a project, newest first unless ordered OLDEST"""
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        tasks = optimize(
+            filter_tasks(Task.objects.filter(project_id=project_id, organization=org), status),
+            info, CONNECTION_NODES, CURSOR_FIELDS,
+        )
+        connection = paginate(
+            tasks, TaskConnection, descending=order_by != TaskOrder.OLDEST, **kwargs
+        )
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+    
+    def resolve_comments_connection(self, info, task_id, **kwargs):
+        """Page through comments on a task, oldest first"""
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        comments = optimize(
+            TaskComment.objects.filter(task_id=task_id, organization=org),
+            info, CONNECTION_NODES, CURSOR_FIELDS,
+        )
+        connection = paginate(comments, TaskCommentConnection, **kwargs)
+        get_loaders(info).register(edge.node for edge in connection.edges)
+        return connection
+    
+    def resolve_task_board(self, info, project_id, per_column=None, order_by=None):
+        """Get the first tasks of every status column of a project, in one query"""
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
+        tasks = optimize(
+            Task.objects.filter(project_id=project_id, organization=org),
+            info, BOARD_TASKS, BOARD_FIELDS, annotate=False,
+        )
+        rows = board_queryset(tasks, board_page_size(per_column), order_by != TaskOrder.OLDEST)
+        return TaskBoardType(columns=[
+            TaskBoardColumnType(status=status, total_count=total, tasks=tasks)
+            for status, total, tasks in board_columns(get_loaders(info).register(rows))
+        ])
     
     # EXISTING STATISTICS RESOLVERS:
     def resolve_project_stats(self, info, project_id):
@@ -102,79 +296,56 @@ class Query(graphene.ObjectType):
         if not org:
             return None
         
-        try:
-            project = Project.objects.get(id=project_id, organization=org)
-        except Project.DoesNotExist:
+        stats = get_project_stats(org, project_ids=[project_id])
+        if not stats:
             return None
-        
-        tasks = Task.objects.filter(project=project)
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(status='done').count()
-        in_progress_tasks = tasks.filter(status='in_progress').count()
-        todo_tasks = tasks.filter(status='todo').count()
-        
-        completion_rate = (completed_tasks / total_tasks) if total_tasks > 0 else 0
-        
-        return ProjectStatsType(
-            project_id=project.id,
-            project_name=project.name,
-            total_tasks=total_tasks,
-            completed_tasks=completed_tasks,
-            in_progress_tasks=in_progress_tasks,
-            todo_tasks=todo_tasks,
-            completion_rate=completion_rate
-        )
+        return ProjectStatsType(**stats[0])
     
     def resolve_organization_stats(self, info):
         org = getattr(info.context, 'organization', None)
         if not org:
             return None
         
-        projects = Project.objects.filter(organization=org)
-        total_projects = projects.count()
-        active_projects = projects.filter(status='active').count()
-        completed_projects = projects.filter(status='completed').count()
-        
-        all_tasks = Task.objects.filter(project__organization=org)
-        total_tasks = all_tasks.count()
-        completed_tasks = all_tasks.filter(status='done').count()
-        
-        overall_completion_rate = (completed_tasks / total_tasks) if total_tasks > 0 else 0
-        
-        return OrganizationStatsType(
-            total_projects=total_projects,
-            active_projects=active_projects,
-            completed_projects=completed_projects,
-            total_tasks=total_tasks,
-            completed_tasks=completed_tasks,
-            overall_completion_rate=overall_completion_rate
-        )
+        return OrganizationStatsType(**get_organization_stats(org))
     
-    def resolve_all_project_stats(self, info):
+    def resolve_all_project_stats(self, info, project_ids=None):
         org = getattr(info.context, 'organization', None)
         if not org:
             return []
         
-        projects = Project.objects.filter(organization=org)
-        stats_list = []
+        return [
+            ProjectStatsType(**stats)
+            for stats in get_project_stats(org, project_ids=project_ids)
+        ]
+    
+    # SEARCH RESOLVER:
+    def resolve_search(self, info, query, first=None, after=None, include_archived=False):
+        """Search task titles, descriptions and comments of current organization"""
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
         
-        for project in projects:
-            tasks = Task.objects.filter(project=project)
-            total_tasks = tasks.count()
-            completed_tasks = tasks.filter(status='done').count()
-            in_progress_tasks = tasks.filter(status='in_progress').count()
-            todo_tasks = tasks.filter(status='todo').count()
-            
-            completion_rate = (completed_tasks / total_tasks) if total_tasks > 0 else 0
-            
-            stats_list.append(ProjectStatsType(
-                project_id=project.id,
-                project_name=project.name,
-                total_tasks=total_tasks,
-                completed_tasks=completed_tasks,
-                in_progress_tasks=in_progress_tasks,
-                todo_tasks=todo_tasks,
-                completion_rate=completion_rate
-            ))
+        page = OffsetPage(SearchResultConnection, first=first, after=after)
+        results = search(org, query, page.limit, page.offset, include_archived)
+        get_loaders(info).register(instance for instance, rank in results)
+        return page.build([{'node': instance, 'rank': rank} for instance, rank in results])
+    
+    # CHANGE FEED RESOLVER:
+    def resolve_changes(self, info, since=None, first=None):
+        """
+        Objects saved and deleted since ``since``. Without it only the
+        current cursor is returned; take it before a full fetch.
+        """
+        org = getattr(info.context, 'organization', None)
+        if not org:
+            return None
         
-        return stats_list
\ No newline at end of file
+        if since is None:
+            return ChangesType(
+                cursor=encode_change_cursor(latest_entry_id(org)), has_more=False,
+                projects=[], tasks=[], comments=[], deleted=[],
+            )
+        entry_id, limit = change_page(since, first)
+        change_set = read_changes(org, entry_id, limit)
+        get_loaders(info).register(change_set.instances)
+        return ChangesType.from_change_set(change_set)
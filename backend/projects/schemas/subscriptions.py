@@ -0,0 +1,67 @@
+import graphene
+from graphql import GraphQLError
+
+from .. import events
+from ..models import Project, Task, TaskComment
+from .mutations import parse_id
+from .types import TaskType, TaskCommentType
+
+
+class TaskChangedEvent(graphene.ObjectType):
+    action = graphene.String(description="created, updated or deleted")
+    task_id = graphene.ID()
+    task = graphene.Field(TaskType, description="The task as saved; null once deleted")
+
+
+def fresh_context(info):
+    # One context serves every event of a subscription; drop the loaders so
+    # relations are not served from an earlier event's cache
+    info.context._loaders = None
+
+
+async def load_object(message, model, pk):
+    """Return the row carried by ``message``, or reload it if it was too large."""
+    if message['object'] is not None:
+        return events.deserialize(message['object'])
+    return await model.objects.filter(pk=pk).afirst()
+
+
+class Subscription(graphene.ObjectType):
+    task_changed = graphene.Field(TaskChangedEvent, project_id=graphene.ID(required=True))
+    comment_added = graphene.Field(TaskCommentType, task_id=graphene.ID(required=True))
+
+    async def subscribe_task_changed(root, info, project_id):
+        org = getattr(info.context, 'organization', None)
+        # Channels are named after the integer id: "05" must listen on 5
+        project_id = parse_id(project_id)
+        if not org or project_id is None or not await Project.objects.filter(
+            id=project_id, organization=org
+        ).aexists():
+            raise GraphQLError('Project not found')
+
+        async def stream():
+            async for message in events.get_broker().subscribe(events.task_channel(project_id)):
+                fresh_context(info)
+                task = None
+                if message['action'] != 'deleted':
+                    task = await load_object(message, Task, message['task_id'])
+                yield TaskChangedEvent(
+                    action=message['action'], task_id=message['task_id'], task=task
+                )
+        return stream()
+
+    async def subscribe_comment_added(root, info, task_id):
+        org = getattr(info.context, 'organization', None)
+        task_id = parse_id(task_id)
+        if not org or task_id is None or not await Task.objects.filter(
+            id=task_id, organization=org
+        ).aexists():
+            raise GraphQLError('Task not found')
+
+        async def stream():
+            async for message in events.get_broker().subscribe(events.comment_channel(task_id)):
+                fresh_context(info)
+                comment = await load_object(message, TaskComment, message['comment_id'])
+                if comment is not None:
+                    yield comment
+        return stream()
@@ -1,5 +1,8 @@
+import graphene
 from graphene_django import DjangoObjectType
-from ..models import Organization, Project, Task, TaskComment
+from ..models import ArchivedTask, ArchivedTaskComment, ImportJob, Organization, Project, Task, TaskComment
+from .loaders import get_loaders
+from .pagination import encode_cursor
 
 
 class OrganizationType(DjangoObjectType):
@@ -13,14 +16,152 @@ class ProjectType(DjangoObjectType):
         model = Project
         fields = '__all__'
 
+    def resolve_organization(self, info):
+        return get_loaders(info).load_forward(self, 'organization')
+
+    def resolve_tasks(self, info):
+        return get_loaders(info).load_reverse(self, 'tasks')
+
 
 class TaskType(DjangoObjectType):
     class Meta:
         model = Task
         fields = '__all__'
 
+    comment_count = graphene.Int(required=True)
+    last_comment_at = graphene.DateTime()
+    last_comment_author = graphene.String()
+    archived_at = graphene.DateTime(description="When the task was archived; null for live tasks")
+
+    @classmethod
+    def is_type_of(cls, root, info):
+        # Archived tasks have the same fields
+        return isinstance(root, ArchivedTask) or super().is_type_of(root, info)
+
+    def resolve_archived_at(self, info):
+        return getattr(self, 'archived_at', None)
+
+    def resolve_organization(self, info):
+        return get_loaders(info).load_forward(self, 'organization')
+
+    def resolve_project(self, info):
+        return get_loaders(info).load_forward(self, 'project')
+
+    def resolve_comments(self, info):
+        return get_loaders(info).load_reverse(self, 'comments')
+
+    def resolve_comment_count(self, info):
+        return get_loaders(info).load_comment_summary(self, 'comment_count')
+
+    def resolve_last_comment_at(self, info):
+        return get_loaders(info).load_comment_summary(self, 'last_comment_at')
+
+    def resolve_last_comment_author(self, info):
+        return get_loaders(info).load_comment_summary(self, 'last_comment_author')
+
 
 class TaskCommentType(DjangoObjectType):
     class Meta:
         model = TaskComment
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    @classmethod
+    def is_type_of(cls, root, info):
+        return isinstance(root, ArchivedTaskComment) or super().is_type_of(root, info)
+
+    def resolve_organization(self, info):
+        return get_loaders(info).load_forward(self, 'organization')
+
+    def resolve_task(self, info):
+        return get_loaders(info).load_forward(self, 'task')
+
+
+class ProjectConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProjectType
+
+
+class TaskConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+
+
+class TaskCommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskCommentType
+
+
+class TaskOrder(graphene.Enum):
+    NEWEST = 'newest'
+    OLDEST = 'oldest'
+
+
+class TaskBoardColumnType(graphene.ObjectType):
+    status = graphene.String()
+    total_count = graphene.Int(description="Tasks with this status")
+    tasks = graphene.List(graphene.NonNull(TaskType))
+    has_more = graphene.Boolean()
+    end_cursor = graphene.String(
+        description="Pass as `after` to tasksConnection with the same status and orderBy for more"
+    )
+
+    def resolve_has_more(self, info):
+        return self.total_count > len(self.tasks)
+
+    def resolve_end_cursor(self, info):
+        return encode_cursor(self.tasks[-1]) if self.tasks else None
+
+
+class TaskBoardType(graphene.ObjectType):
+    columns = graphene.List(graphene.NonNull(TaskBoardColumnType))
+
+
+class SearchResult(graphene.Union):
+    class Meta:
+        types = (TaskType, TaskCommentType)
+
+
+class SearchResultConnection(graphene.relay.Connection):
+    class Meta:
+        node = SearchResult
+
+    class Edge:
+        rank = graphene.Float(description="Relevance; higher is better")
+
+
+class Upload(graphene.Scalar):
+    """
+    A file sent with the GraphQL multipart request spec; resolvers receive
+    the Django UploadedFile.
+    """
+
+    @staticmethod
+    def serialize(value):
+        return None
+
+    @staticmethod
+    def parse_literal(node, _variables=None):
+        return None
+
+    @staticmethod
+    def parse_value(value):
+        return value
+
+
+class ImportRowErrorType(graphene.ObjectType):
+    row = graphene.Int()
+    message = graphene.String()
+
+
+class ImportJobType(DjangoObjectType):
+    class Meta:
+        model = ImportJob
+        fields = (
+            'id', 'source', 'format', 'status', 'checkpoint', 'imported_tasks',
+            'imported_comments', 'failed_rows', 'created_at', 'updated_at',
+        )
+
+    errors = graphene.List(graphene.NonNull(ImportRowErrorType))
+
+    def resolve_errors(self, info):
+        return [ImportRowErrorType(**error) for error in self.errors]
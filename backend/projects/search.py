@@ -0,0 +1,140 @@
+"""
+Full-text search over task titles and descriptions and comment contents.
+
+On PostgreSQL both tables carry a ``search_vector`` column kept up to date
+by triggers, with a GIN index (migration 0005); queries go through
+websearch_to_tsquery and are ranked with ts_rank. SQLite, used for local
+development and tests, has external-content FTS5 tables kept up to date by
+triggers, ranked with bm25.
+Either way a search costs one statement however many rows match.
+
+Every branch keeps only its own best ``offset + limit`` rows before the
+UNION, so the final sort handles at most that many rows per table rather
+than every match of a frequent word.
+
+The archive tables are indexed the same way (migration 0009); searches that
+include archived tasks and comments add them to the statement as further
+branches of the UNION.
+"""
+import re
+
+from django.db import NotSupportedError, connection
+
+from .models import ArchivedTask, ArchivedTaskComment, Task, TaskComment
+
+TASK = 'task'
+COMMENT = 'comment'
+ARCHIVED_TASK = 'archived_task'
+ARCHIVED_COMMENT = 'archived_comment'
+
+MODELS = {
+    TASK: Task,
+    COMMENT: TaskComment,
+    ARCHIVED_TASK: ArchivedTask,
+    ARCHIVED_COMMENT: ArchivedTaskComment,
+}
+
+POSTGRESQL_BRANCH = """
+    SELECT '{kind}' AS kind, r.id AS id, ts_rank(r.search_vector, q.query) AS rank
+    FROM q, {table} r
+    WHERE r.search_vector @@ q.query AND r.organization_id = %(organization)s
+"""
+
+# Only a branch's best rows can be among the page's
+BRANCH = """
+    SELECT * FROM ({branch}
+        ORDER BY rank DESC, id DESC
+        LIMIT %(window)s
+    ) AS {kind}
+"""
+
+POSTGRESQL_SEARCH = """
+    WITH q AS (SELECT websearch_to_tsquery('english', %(query)s) AS query)
+    {branches}
+    ORDER BY rank DESC, kind DESC, id DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# bm25() is lower for better matches; titles weigh twice as much as descriptions
+SQLITE_WEIGHTS = {TASK: ', 2.0, 1.0', ARCHIVED_TASK: ', 2.0, 1.0'}
+
+SQLITE_BRANCH = """
+    SELECT '{kind}' AS kind, r.id AS id, -bm25({table}_fts{weights}) AS rank
+    FROM {table}_fts
+    JOIN {table} r ON r.id = {table}_fts.rowid
+    WHERE {table}_fts MATCH %(query)s AND r.organization_id = %(organization)s
+"""
+
+SQLITE_SEARCH = """
+    {branches}
+    ORDER BY rank DESC, kind DESC, id DESC
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+
+def search_sql(vendor, kinds):
+    """The search statement for ``vendor`` over the tables of ``kinds``."""
+    if vendor == 'postgresql':
+        branch, statement = POSTGRESQL_BRANCH, POSTGRESQL_SEARCH
+    else:
+        branch, statement = SQLITE_BRANCH, SQLITE_SEARCH
+    branches = '    UNION ALL'.join(
+        BRANCH.format(kind=kind, branch=branch.format(
+            kind=kind, table=MODELS[kind]._meta.db_table, weights=SQLITE_WEIGHTS.get(kind, ''),
+        ))
+        for kind in kinds
+    )
+    return statement.format(branches=branches)
+
+
+def fts5_query(text):
+    """
+    Turn free text into an FTS5 query matching every word, so that user
+    input can never be parsed as FTS5 syntax.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def search_rows(organization, text, limit, offset=0, include_archived=False):
+    """
+    Return ``(kind, id, rank)`` for the best matches of ``text`` among the
+    tasks and comments of ``organization``, best first.
+    """
+    kinds = [TASK, COMMENT]
+    if include_archived:
+        kinds += [ARCHIVED_TASK, ARCHIVED_COMMENT]
+    params = {
+        'query': text,
+        'organization': organization.pk,
+        'limit': limit,
+        'offset': offset,
+        'window': offset + limit,
+    }
+    if connection.vendor == 'sqlite':
+        params['query'] = fts5_query(text)
+        if not params['query']:
+            return []
+    elif connection.vendor != 'postgresql':
+        raise NotSupportedError(f'Full-text search is not available on {connection.vendor}')
+
+    with connection.cursor() as cursor:
+        cursor.execute(search_sql(connection.vendor, kinds), params)
+        return cursor.fetchall()
+
+
+def search(organization, text, limit, offset=0, include_archived=False):
+    """
+    Return ``(instance, rank)`` pairs of Task and TaskComment matches, best
+    first; with ``include_archived``, ArchivedTask and ArchivedTaskComment
+    ones too.
+    """
+    rows = search_rows(organization, text, limit, offset, include_archived)
+    instances = {
+        kind: model.objects.in_bulk([pk for k, pk, rank in rows if k == kind])
+        for kind, model in MODELS.items()
+    }
+    return [
+        (instances[kind][pk], rank)
+        for kind, pk, rank in rows
+        if pk in instances[kind]
+    ]
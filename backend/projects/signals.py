@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .middleware import organization_cache
+from .models import Organization
+from .response_cache import bump_organization_version
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_organization_cache(sender, **kwargs):
+    """
+    Drop every cached tenant lookup; a rename or a new slug can change
+    what any header value resolves to, including cached misses.
+    """
+    organization_cache.clear()
+
+
+@receiver(post_save, sender=Organization)
+def invalidate_organization_responses(sender, instance, created, **kwargs):
+    """Organization fields appear in responses, so an edit is a new version."""
+    if not created:
+        bump_organization_version(instance.pk)
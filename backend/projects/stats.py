@@ -0,0 +1,94 @@
+"""
+Queries behind the statistics resolvers.
+
+Task counts come from the materialized ProjectTaskCounters rows (see
+counters.py), so each function reads one row per project in a single query
+and never scans the Task table. Results are plain dicts whose keys match
+the fields of ProjectStatsType / OrganizationStatsType.
+"""
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Project
+
+
+def completion_rate(completed, total):
+    return (completed / total) if total > 0 else 0
+
+
+def _project_stats_rows(organization, project_ids=None):
+    projects = Project.objects.filter(organization=organization)
+    if project_ids is not None:
+        projects = projects.filter(id__in=project_ids)
+
+    return projects.values(
+        'id',
+        'name',
+        total_tasks=Coalesce('task_counters__total', 0),
+        completed_tasks=Coalesce('task_counters__done', 0),
+        in_progress_tasks=Coalesce('task_counters__in_progress', 0),
+        todo_tasks=Coalesce('task_counters__todo', 0),
+    ).order_by('-created_at')
+
+
+def _project_stats(row):
+    return {
+        'project_id': row['id'],
+        'project_name': row['name'],
+        'total_tasks': row['total_tasks'],
+        'completed_tasks': row['completed_tasks'],
+        'in_progress_tasks': row['in_progress_tasks'],
+        'todo_tasks': row['todo_tasks'],
+        'completion_rate': completion_rate(row['completed_tasks'], row['total_tasks']),
+    }
+
+
+def get_project_stats(organization, project_ids=None):
+    """
+    Return task counts for every project of ``organization``, or only for
+    ``project_ids`` when given, in the projects' default ordering.
+    """
+    return [
+        _project_stats(row)
+        for row in _project_stats_rows(organization, project_ids)
+    ]
+
+
+async def aget_project_stats(organization, project_ids=None):
+    """Async counterpart of ``get_project_stats``."""
+    return [
+        _project_stats(row)
+        async for row in _project_stats_rows(organization, project_ids)
+    ]
+
+
+ORGANIZATION_AGGREGATES = {
+    'total_projects': Count('id'),
+    'active_projects': Count('id', filter=Q(status='active')),
+    'completed_projects': Count('id', filter=Q(status='completed')),
+    'total_tasks': Coalesce(Sum('task_counters__total'), 0),
+    'completed_tasks': Coalesce(Sum('task_counters__done'), 0),
+}
+
+
+def _organization_stats(totals):
+    totals['overall_completion_rate'] = completion_rate(
+        totals['completed_tasks'], totals['total_tasks']
+    )
+    return totals
+
+
+def get_organization_stats(organization):
+    """
+    Return project and task totals for ``organization``.
+    """
+    return _organization_stats(
+        Project.objects.filter(organization=organization).aggregate(**ORGANIZATION_AGGREGATES)
+    )
+
+
+async def aget_organization_stats(organization):
+    """Async counterpart of ``get_organization_stats``."""
+    return _organization_stats(
+        await Project.objects.filter(organization=organization).aaggregate(**ORGANIZATION_AGGREGATES)
+    )
@@ -1,3 +1,2401 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.test import AsyncClient, AsyncRequestFactory, Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from graphql import execute, get_introspection_query, get_operation_ast, parse, validate
+from prometheus_client import REGISTRY
+
+from . import archive, counters, events, metrics
+from .archive import archive_cutoff, archive_tasks
+from .bulk import RowWriter
+from .changes import record_changes
+from .checks import check_read_replicas, check_response_cache
+from .response_cache import bump_organization_version, organization_version
+from .management.commands.benchmark_graphql import load_documents
+from .counters import find_drift, rebuild_counters
+from .middleware import OrganizationCache, organization_cache
+from .models import (
+    ArchivedTask, ArchivedTaskComment, ChangeLogEntry, ImportJob, Organization, Project,
+    ProjectTaskCounters, Task, TaskComment,
+)
+from .schema import async_schema, schema
+from .routers import STICKY_PREFIX, ReadRouting, ReplicaRouter, read_from
+from .schemas.cost import QueryCostRule, measure_operation
+from .schemas.loaders import LoaderRegistry
+from .search import search, search_rows
+from .schemas.pagination import encode_change_cursor, encode_cursor
+from .schemas.queries import Query
+from .views import AsyncGraphQLView, PersistedQueryGraphQLView, document_cache
+from .websockets import GraphQLWebSocketApp
+
+
+class GraphQLTestCase(TestCase):
+    """
+    Base class that runs operations against the schema as a tenant.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(
+            name='Acme', slug='acme', contact_email='ops@acme.test'
+        )
+
+    def execute(self, query, variables=None, organization=None):
+        request = RequestFactory().post('/graphql/')
+        request.organization = organization or self.org
+        result = schema.execute(query, variables=variables, context_value=request)
+        self.assertIsNone(result.errors, result.errors)
+        return result.data
+
+    def execute_mutation(self, mutation, variables=None, organization=None):
+        data = self.execute(mutation, variables, organization)
+        payload = next(iter(data.values()))
+        self.assertTrue(payload['success'], payload.get('message'))
+        return payload
+
+    def seed(self, projects=2, tasks=3, comments=2, organization=None):
+        organization = organization or self.org
+        for p in range(projects):
+            project = Project.objects.create(organization=organization, name=f'Project {p}')
+            for t in range(tasks):
+                task = Task.objects.create(project=project, title=f'Task {p}.{t}')
+                for c in range(comments):
+                    TaskComment.objects.create(task=task, author=f'user{c}', content='...')
+
+
+class RelationBatchingTests(GraphQLTestCase):
+    NESTED_QUERY = '''
+        query {
+            projects {
+                id
+                organization { slug }
+                tasks {
+                    id
+                    project { id }
+                    comments { author task { id } }
+                }
+            }
+        }
+    '''
+
+    def test_nested_relations_cost_one_query_per_level(self):
+        # projects, tasks and comments; the forward relations are served from
+        # rows already loaded at the level above
+        self.seed(projects=2, tasks=2, comments=1)
+        with self.assertNumQueries(3):
+            self.execute(self.NESTED_QUERY)
+
+        self.seed(projects=5, tasks=4, comments=3)
+        with self.assertNumQueries(3):
+            data = self.execute(self.NESTED_QUERY)
+
+        self.assertEqual(len(data['projects']), 7)
+        self.assertEqual(sum(len(p['tasks']) for p in data['projects']), 24)
+        for project in data['projects']:
+            self.assertEqual(project['organization']['slug'], 'acme')
+            for task in project['tasks']:
+                self.assertEqual(task['project']['id'], project['id'])
+                for comment in task['comments']:
+                    self.assertEqual(comment['task']['id'], task['id'])
+
+    def test_empty_relations_resolve_to_empty_lists(self):
+        Project.objects.create(organization=self.org, name='Empty')
+        data = self.execute('query { projects { tasks { id } } }')
+        self.assertEqual(data['projects'], [{'tasks': []}])
+
+
+class ProjectionTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            organization=self.org, name='Board', description='Long project description'
+        )
+        for i in range(3):
+            task = Task.objects.create(
+                project=self.project, title=f'Task {i}', description='Long task description'
+            )
+            TaskComment.objects.create(task=task, author='ann', content='Long comment')
+
+    def capture(self, query, variables=None):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query, variables)
+        return data, [q['sql'] for q in queries.captured_queries]
+
+    def test_lists_read_only_selected_columns(self):
+        data, queries = self.capture('query { projects { id name } }')
+        self.assertEqual(data['projects'], [{'id': str(self.project.id), 'name': 'Board'}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0])
+
+    def test_selected_relations_are_joined_and_prefetched(self):
+        data, queries = self.capture('''
+            query ($projectId: ID!) {
+                tasks(projectId: $projectId) { title project { name } comments { author } }
+            }
+        ''', {'projectId': str(self.project.id)})
+        # The project lookup, tasks joined with their project, comments
+        self.assertEqual(len(queries), 3)
+        self.assertIn('JOIN "projects_project"', queries[1])
+        self.assertNotIn('description', queries[1])
+        self.assertNotIn('content', queries[2])
+        self.assertEqual(data['tasks'][0], {
+            'title': 'Task 2', 'project': {'name': 'Board'}, 'comments': [{'author': 'ann'}],
+        })
+
+    def test_connections_project_nodes_through_fragments(self):
+        query = '''
+            query ($projectId: ID!, $after: String) {
+                tasksConnection(projectId: $projectId, first: 2, after: $after) {
+                    edges { node { ...TaskTitle } }
+                    pageInfo { endCursor }
+                }
+            }
+            fragment TaskTitle on TaskType { title }
+        '''
+        data, queries = self.capture(query, {'projectId': str(self.project.id)})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0])
+        connection = data['tasksConnection']
+        self.assertEqual([e['node']['title'] for e in connection['edges']], ['Task 2', 'Task 1'])
+
+        data = self.execute(query, {
+            'projectId': str(self.project.id), 'after': connection['pageInfo']['endCursor'],
+        })
+        self.assertEqual(data['tasksConnection']['edges'], [{'node': {'title': 'Task 0'}}])
+
+    def test_projected_rows_are_not_shared_with_other_fields(self):
+        loaders = LoaderRegistry()
+        loaders.register(Project.objects.only('id', 'organization'))
+        loaders.register(Task.objects.all())
+        self.assertEqual(loaders.project.cache, {})
+        self.assertEqual(loaders.project.pending, {self.project.id})
+        self.assertEqual(len(loaders.task.cache), 3)
+
+
+class StatsTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alpha = Project.objects.create(organization=self.org, name='Alpha', status='active')
+        self.beta = Project.objects.create(organization=self.org, name='Beta', status='completed')
+        Project.objects.create(organization=self.org, name='Empty')
+        for status in ['todo', 'todo', 'in_progress', 'done']:
+            Task.objects.create(project=self.alpha, title=status, status=status)
+        Task.objects.create(project=self.beta, title='done', status='done')
+
+        other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        self.seed(projects=2, tasks=3, comments=0, organization=other)
+        # Rows above bypass the mutations that maintain the counters
+        rebuild_counters()
+
+    def test_all_project_stats_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.execute('''
+                query {
+                    allProjectStats {
+                        projectName totalTasks completedTasks
+                        inProgressTasks todoTasks completionRate
+                    }
+                }
+            ''')
+
+        stats = {row['projectName']: row for row in data['allProjectStats']}
+        self.assertEqual(list(stats), ['Empty', 'Beta', 'Alpha'])
+        self.assertEqual(stats['Alpha'], {
+            'projectName': 'Alpha', 'totalTasks': 4, 'completedTasks': 1,
+            'inProgressTasks': 1, 'todoTasks': 2, 'completionRate': 0.25,
+        })
+        self.assertEqual(stats['Beta']['completionRate'], 1.0)
+        self.assertEqual(stats['Empty']['totalTasks'], 0)
+        self.assertEqual(stats['Empty']['completionRate'], 0)
+
+    def test_all_project_stats_subset(self):
+        data = self.execute(
+            'query ($ids: [ID!]) { allProjectStats(projectIds: $ids) { projectId } }',
+            variables={'ids': [str(self.beta.id)]},
+        )
+        self.assertEqual(data['allProjectStats'], [{'projectId': str(self.beta.id)}])
+
+    def test_project_stats_is_tenant_scoped(self):
+        query = 'query ($id: ID!) { projectStats(projectId: $id) { todoTasks } }'
+        data = self.execute(query, variables={'id': str(self.alpha.id)})
+        self.assertEqual(data['projectStats'], {'todoTasks': 2})
+
+        foreign = Project.objects.exclude(organization=self.org).first()
+        data = self.execute(query, variables={'id': str(foreign.id)})
+        self.assertIsNone(data['projectStats'])
+
+    def test_organization_stats_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.execute('''
+                query {
+                    organizationStats {
+                        totalProjects activeProjects completedProjects
+                        totalTasks completedTasks overallCompletionRate
+                    }
+                }
+            ''')
+        self.assertEqual(data['organizationStats'], {
+            'totalProjects': 3, 'activeProjects': 1, 'completedProjects': 1,
+            'totalTasks': 5, 'completedTasks': 2, 'overallCompletionRate': 0.4,
+        })
+
+
+class CommentSummaryTests(GraphQLTestCase):
+    SUMMARY = 'commentCount lastCommentAt lastCommentAuthor'
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        now = timezone.now()
+        self.tasks = [Task.objects.create(project=self.project, title=f'Task {i}') for i in range(3)]
+        for i, author in enumerate(['ann', 'bob', 'cy']):
+            TaskComment.objects.create(
+                task=self.tasks[0], author=author, content='...', created_at=now + timedelta(minutes=i)
+            )
+        self.latest = now + timedelta(minutes=2)
+
+    def test_task_lists_annotate_the_summary_in_their_query(self):
+        # The project lookup and the tasks
+        with self.assertNumQueries(2):
+            data = self.execute(
+                'query ($id: ID!) { tasks(projectId: $id) { title %s } }' % self.SUMMARY,
+                {'id': str(self.project.id)},
+            )
+        summaries = {task.pop('title'): task for task in data['tasks']}
+        self.assertEqual(summaries['Task 0'], {
+            'commentCount': 3, 'lastCommentAt': self.latest.isoformat(), 'lastCommentAuthor': 'cy',
+        })
+        self.assertEqual(summaries['Task 1'], {
+            'commentCount': 0, 'lastCommentAt': None, 'lastCommentAuthor': None,
+        })
+
+        with self.assertNumQueries(2):
+            data = self.execute('query { projects { tasks { commentCount } } }')
+        self.assertEqual(sorted(t['commentCount'] for t in data['projects'][0]['tasks']), [0, 0, 3])
+
+    def test_other_tasks_load_the_summary_in_one_batch(self):
+        query = 'query ($id: ID!) { task(id: $id) { %s } }' % self.SUMMARY
+        with self.assertNumQueries(2):
+            data = self.execute(query, {'id': str(self.tasks[0].id)})
+        self.assertEqual(data['task']['commentCount'], 3)
+        self.assertEqual(data['task']['lastCommentAuthor'], 'cy')
+
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        result = async_to_sync(async_schema.execute_async)(
+            query, variable_values={'id': str(self.tasks[0].id)}, context_value=request
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data, data)
+
+
+class TaskOrganizationTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        self.project = Project.objects.create(organization=self.org, name='Board')
+
+    def test_tasks_and_comments_take_the_project_organization(self):
+        payload = self.execute_mutation('''
+            mutation ($projectId: ID!) {
+                createTask(projectId: $projectId, title: "Ship") { success task { id organization { slug } } }
+            }
+        ''', {'projectId': str(self.project.id)})
+        self.assertEqual(payload['task']['organization'], {'slug': 'acme'})
+        task = Task.objects.get(pk=payload['task']['id'])
+        comment = TaskComment.objects.create(task=task, author='ann', content='On it')
+        self.assertEqual((task.organization_id, comment.organization_id), (self.org.id, self.org.id))
+
+    def test_database_rejects_a_mismatched_organization(self):
+        task = Task.objects.create(project=self.project, title='Ship')
+        comment = TaskComment.objects.create(task=task, author='ann', content='On it')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Task.objects.filter(pk=task.pk).update(organization=self.other)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TaskComment.objects.filter(pk=comment.pk).update(organization=self.other)
+        # Saving through the ORM follows the project instead
+        stray = Task.objects.create(project=self.project, organization=self.other, title='Stray')
+        self.assertEqual(stray.organization_id, self.org.id)
+
+    def test_moving_a_project_moves_its_tasks_and_comments(self):
+        task = Task.objects.create(project=self.project, title='Ship')
+        TaskComment.objects.create(task=task, author='ann', content='On it')
+        Project.objects.filter(pk=self.project.pk).update(organization=self.other)
+        self.assertEqual(Task.objects.get(pk=task.pk).organization_id, self.other.id)
+        self.assertEqual(TaskComment.objects.get(task=task).organization_id, self.other.id)
+
+    def test_tenant_filters_do_not_join_projects(self):
+        Task.objects.create(project=self.project, title='Ship')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute('''
+                query ($projectId: ID!) {
+                    tasksConnection(projectId: $projectId) { edges { node { title } } }
+                }
+            ''', {'projectId': str(self.project.id)})
+        self.assertEqual(data['tasksConnection']['edges'], [{'node': {'title': 'Ship'}}])
+        self.assertNotIn('projects_project', queries[0]['sql'])
+
+
+class TaskCountersTests(GraphQLTestCase):
+    CREATE_PROJECT = 'mutation { createProject(name: "Board") { success message project { id } } }'
+    CREATE_TASK = '''
+        mutation ($projectId: ID!, $status: String, $priority: String) {
+            createTask(projectId: $projectId, title: "Card", status: $status, priority: $priority) {
+                success message task { id }
+            }
+        }
+    '''
+    UPDATE_TASK = '''
+        mutation ($taskId: ID!, $status: String, $priority: String) {
+            updateTask(taskId: $taskId, status: $status, priority: $priority) { success message }
+        }
+    '''
+    DELETE_TASK = 'mutation ($taskId: ID!) { deleteTask(taskId: $taskId) { success message } }'
+
+    def counters(self, project_id):
+        values = ProjectTaskCounters.objects.filter(project_id=project_id).values(
+            'total', 'todo', 'in_progress', 'done', 'low', 'medium', 'high', 'urgent'
+        )
+        return values.get()
+
+    def test_task_mutations_maintain_counters(self):
+        project_id = self.execute_mutation(self.CREATE_PROJECT)['project']['id']
+        self.assertEqual(set(self.counters(project_id).values()), {0})
+
+        ids = [
+            self.execute_mutation(self.CREATE_TASK, {'projectId': project_id})['task']['id'],
+            self.execute_mutation(
+                self.CREATE_TASK, {'projectId': project_id, 'status': 'done', 'priority': 'urgent'}
+            )['task']['id'],
+        ]
+        self.execute_mutation(self.UPDATE_TASK, {'taskId': ids[0], 'status': 'in_progress'})
+        self.execute_mutation(self.UPDATE_TASK, {'taskId': ids[1], 'priority': 'low'})
+        self.assertEqual(self.counters(project_id), {
+            'total': 2, 'todo': 0, 'in_progress': 1, 'done': 1,
+            'low': 1, 'medium': 1, 'high': 0, 'urgent': 0,
+        })
+
+        self.execute_mutation(self.DELETE_TASK, {'taskId': ids[0]})
+        self.assertEqual(self.counters(project_id)['total'], 1)
+        self.assertEqual(self.counters(project_id)['in_progress'], 0)
+        self.assertEqual(find_drift(), [])
+
+    def test_missing_counters_row_is_created_on_first_write(self):
+        project = Project.objects.create(organization=self.org, name='Unmanaged')
+        self.execute_mutation(self.CREATE_TASK, {'projectId': str(project.id)})
+        self.assertEqual(self.counters(project.id)['total'], 1)
+        self.assertEqual(find_drift([project.id]), [])
+
+        # The write applies its delta without recounting; tasks from before
+        # the row existed are drift for rebuild_counters
+        legacy = Project.objects.create(organization=self.org, name='Legacy')
+        Task.objects.create(project=legacy, title='Old', status='done')
+        self.execute_mutation(self.CREATE_TASK, {'projectId': str(legacy.id)})
+        self.assertEqual(self.counters(legacy.id)['total'], 1)
+        self.assertIn((legacy.id, 'done', 0, 1), find_drift([legacy.id]))
+        rebuild_counters([legacy.id])
+        self.assertEqual(self.counters(legacy.id)['total'], 2)
+
+    def test_command_reports_and_repairs_drift(self):
+        project_id = self.execute_mutation(self.CREATE_PROJECT)['project']['id']
+        Task.objects.create(project_id=project_id, title='Sneaky', status='done')
+
+        with self.assertRaisesMessage(CommandError, 'counters have drifted'):
+            call_command('rebuild_task_counters', '--verify', stdout=StringIO())
+
+        call_command('rebuild_task_counters', '--organization', 'acme', stdout=StringIO())
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(self.counters(project_id)['done'], 1)
+
+
+class OrganizationMiddlewareTests(TestCase):
+    def setUp(self):
+        organization_cache.clear()
+        self.org = Organization.objects.create(
+            name='Acme Corp', slug='acme', contact_email='ops@acme.test'
+        )
+
+    def get(self, identifier):
+        return self.client.get('/health/', HTTP_X_ORGANIZATION=identifier)
+
+    def test_lookups_are_cached(self):
+        with self.assertNumQueries(1):
+            response = self.get('acme')
+        self.assertEqual(response['X-Current-Organization'], 'acme')
+        with self.assertNumQueries(0):
+            self.get('acme')
+
+        # slug miss, then name hit
+        with self.assertNumQueries(2):
+            self.get('Acme Corp')
+        with self.assertNumQueries(0):
+            response = self.get('Acme Corp')
+        self.assertEqual(response['X-Current-Organization'], 'acme')
+
+    def test_unknown_organizations_are_negatively_cached(self):
+        with self.assertNumQueries(2):
+            response = self.get('nope')
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.get('nope')
+        self.assertEqual(response.status_code, 404)
+
+    def test_saving_an_organization_invalidates_the_cache(self):
+        self.get('nope')
+        Organization.objects.create(name='Nope', slug='nope', contact_email='x@nope.test')
+        self.assertEqual(self.get('nope').status_code, 200)
+
+        self.get('acme')
+        self.org.slug = 'acme-corp'
+        self.org.save()
+        self.assertEqual(self.get('acme').status_code, 404)
+
+        self.org.delete()
+        self.assertEqual(self.get('acme-corp').status_code, 404)
+
+    def test_cache_is_bounded_and_expires(self):
+        cache = OrganizationCache(max_size=2, ttl=60, not_found_ttl=0)
+        cache.set('a', self.org)
+        cache.set('b', self.org)
+        cache.get('a')
+        cache.set('c', self.org)
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.get('a'), (True, self.org))
+
+        cache.set('missing', None)
+        self.assertEqual(cache.get('missing'), (False, None))
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    TASKS_QUERY = '''
+        query ($projectId: ID!, $first: Int, $after: String, $last: Int, $before: String) {
+            tasksConnection(projectId: $projectId, first: $first, after: $after,
+                            last: $last, before: $before) {
+                edges { cursor node { title } }
+                pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        created_at = timezone.now()
+        # Shared timestamps make the id tie-breaker matter
+        for i in range(7):
+            Task.objects.create(
+                project=self.project, title=f'T{i}',
+                created_at=created_at + timedelta(seconds=i // 2),
+            )
+
+    def page(self, **variables):
+        data = self.execute(self.TASKS_QUERY, {'projectId': str(self.project.id), **variables})
+        connection = data['tasksConnection']
+        return [edge['node']['title'] for edge in connection['edges']], connection['pageInfo']
+
+    def test_forward_pages_walk_newest_first(self):
+        titles, info = self.page(first=3)
+        self.assertEqual(titles, ['T6', 'T5', 'T4'])
+        self.assertTrue(info['hasNextPage'])
+
+        titles, info = self.page(first=3, after=info['endCursor'])
+        self.assertEqual(titles, ['T3', 'T2', 'T1'])
+        self.assertTrue(info['hasNextPage'])
+
+        titles, info = self.page(first=3, after=info['endCursor'])
+        self.assertEqual(titles, ['T0'])
+        self.assertFalse(info['hasNextPage'])
+        self.assertTrue(info['hasPreviousPage'])
+
+    def test_backward_pages(self):
+        titles, info = self.page(last=2)
+        self.assertEqual(titles, ['T1', 'T0'])
+        self.assertTrue(info['hasPreviousPage'])
+
+        titles, info = self.page(last=4, before=info['startCursor'])
+        self.assertEqual(titles, ['T5', 'T4', 'T3', 'T2'])
+        self.assertTrue(info['hasPreviousPage'])
+        self.assertTrue(info['hasNextPage'])
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        _, info = self.page(first=5)
+        with self.assertNumQueries(1):
+            titles, _ = self.page(first=5, after=info['endCursor'])
+        self.assertEqual(titles, ['T1', 'T0'])
+
+    def test_comments_are_oldest_first_and_tenant_scoped(self):
+        task = Task.objects.create(project=self.project, title='Discussed')
+        for i in range(3):
+            TaskComment.objects.create(task=task, author=f'a{i}', content='...')
+        query = '''
+            query ($taskId: ID!) {
+                commentsConnection(taskId: $taskId, first: 2) {
+                    edges { node { author } }
+                    pageInfo { hasNextPage }
+                }
+            }
+        '''
+        data = self.execute(query, {'taskId': str(task.id)})
+        self.assertEqual(
+            [edge['node']['author'] for edge in data['commentsConnection']['edges']],
+            ['a0', 'a1'],
+        )
+        self.assertTrue(data['commentsConnection']['pageInfo']['hasNextPage'])
+
+        other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        data = self.execute(query, {'taskId': str(task.id)}, organization=other)
+        self.assertEqual(data['commentsConnection']['edges'], [])
+
+    def test_invalid_cursor_is_rejected(self):
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        result = schema.execute(
+            self.TASKS_QUERY,
+            variable_values={'projectId': str(self.project.id), 'after': 'garbage'},
+            context_value=request,
+        )
+        self.assertIn('Invalid cursor', result.errors[0].message)
+
+
+def query_plan(sql, params):
+    """
+    Return the plan lines of ``sql``. PostgreSQL plans are taken with
+    enable_seqscan off so that a Seq Scan only shows up when no index can
+    serve the query at all.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def sequential_scans(sql, params):
+    """
+    Return the plan lines of ``sql`` that scan a whole table.
+
+    SQLite reports FTS5 index lookups (MATCH) as virtual table scans, and
+    reading back the rows of a subquery (such as a window function's) as a
+    scan of it; those are not counted.
+    """
+    plan = query_plan(sql, params)
+    if connection.vendor == 'postgresql':
+        return [line for line in plan if 'Seq Scan' in line]
+    tables = set(connection.introspection.table_names())
+    return [
+        line for line in plan
+        if line.startswith('SCAN') and line.split()[1] in tables
+        and 'VIRTUAL TABLE INDEX 0:M' not in line
+    ]
+
+
+class TaskBoardTests(GraphQLTestCase):
+    BOARD_QUERY = '''
+        query ($projectId: ID!, $perColumn: Int, $orderBy: TaskOrder) {
+            taskBoard(projectId: $projectId, perColumn: $perColumn, orderBy: $orderBy) {
+                columns { status totalCount hasMore endCursor tasks { title } }
+            }
+        }
+    '''
+    MORE_QUERY = '''
+        query ($projectId: ID!, $status: String, $after: String, $orderBy: TaskOrder) {
+            tasksConnection(projectId: $projectId, status: $status, first: 10, after: $after,
+                            orderBy: $orderBy) {
+                edges { node { title } }
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        created_at = timezone.now()
+        for i, status in enumerate(['todo'] * 5 + ['in_progress'] * 2):
+            Task.objects.create(
+                project=self.project, title=f'{status} {i}', status=status,
+                created_at=created_at + timedelta(seconds=i),
+            )
+        other = Project.objects.create(organization=self.org, name='Other')
+        Task.objects.create(project=other, title='Elsewhere', status='done')
+
+    def request(self):
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        return request
+
+    def board(self, **variables):
+        data = self.execute(self.BOARD_QUERY, {'projectId': str(self.project.id), **variables})
+        return {column.pop('status'): column for column in data['taskBoard']['columns']}
+
+    def test_columns_hold_the_newest_tasks_and_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            columns = self.board(perColumn=3)
+        self.assertEqual(list(columns), ['todo', 'in_progress', 'done'])
+        todo = columns['todo']
+        self.assertEqual([task['title'] for task in todo['tasks']], ['todo 4', 'todo 3', 'todo 2'])
+        self.assertEqual((todo['totalCount'], todo['hasMore']), (5, True))
+        self.assertEqual(columns['in_progress']['totalCount'], 2)
+        self.assertFalse(columns['in_progress']['hasMore'])
+        self.assertEqual(columns['done'], {
+            'totalCount': 0, 'hasMore': False, 'endCursor': None, 'tasks': [],
+        })
+
+        more = self.execute(self.MORE_QUERY, {
+            'projectId': str(self.project.id), 'status': 'todo', 'after': todo['endCursor'],
+        })
+        self.assertEqual(
+            [edge['node']['title'] for edge in more['tasksConnection']['edges']], ['todo 1', 'todo 0']
+        )
+
+    def test_oldest_first_continues_in_the_same_order(self):
+        todo = self.board(perColumn=2, orderBy='OLDEST')['todo']
+        self.assertEqual([task['title'] for task in todo['tasks']], ['todo 0', 'todo 1'])
+        more = self.execute(self.MORE_QUERY, {
+            'projectId': str(self.project.id), 'status': 'todo',
+            'after': todo['endCursor'], 'orderBy': 'OLDEST',
+        })
+        self.assertEqual(
+            [edge['node']['title'] for edge in more['tasksConnection']['edges']],
+            ['todo 2', 'todo 3', 'todo 4'],
+        )
+
+    def test_comment_summary_is_loaded_for_the_returned_tasks_only(self):
+        task = Task.objects.get(title='todo 4')
+        TaskComment.objects.create(task=task, author='ann', content='First')
+        query = self.BOARD_QUERY.replace('tasks { title }', 'tasks { title commentCount }')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query, {'projectId': str(self.project.id), 'perColumn': 1})
+        todo, in_progress, _ = data['taskBoard']['columns']
+        self.assertEqual(todo['tasks'], [{'title': 'todo 4', 'commentCount': 1}])
+        self.assertEqual(in_progress['tasks'], [{'title': 'in_progress 6', 'commentCount': 0}])
+
+        # The windowed query reads every task of the project and no
+        # comments; the summary is one batch over the two returned ids
+        self.assertEqual(len(queries), 2)
+        board, summary = (query['sql'] for query in queries.captured_queries)
+        comments = TaskComment._meta.db_table
+        self.assertNotIn(comments, board)
+        self.assertNotIn(comments, ' '.join(query_plan(board, ())))
+        self.assertIn(comments, summary)
+        self.assertEqual(sequential_scans(summary, ()), [])
+
+    def test_async_schema_matches(self):
+        variables = {'projectId': str(self.project.id), 'perColumn': 2}
+        result = async_to_sync(async_schema.execute_async)(
+            self.BOARD_QUERY, variable_values=variables, context_value=self.request()
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data, self.execute(self.BOARD_QUERY, variables))
+
+    def test_per_column_is_validated_and_costed(self):
+        result = schema.execute(
+            self.BOARD_QUERY, variables={'projectId': str(self.project.id), 'perColumn': -1},
+            context_value=self.request(),
+        )
+        self.assertIn('perColumn', result.errors[0].message)
+
+        # perColumn x (board + 3 columns x (column + task))
+        measured = measure_operation(schema.graphql_schema, parse(
+            '{ taskBoard(projectId: 1, perColumn: 5) { columns { tasks { title } } } }'
+        ))
+        self.assertEqual(measured.cost, 5 * (1 + 3 * (1 + 1)))
+
+
+class QueryPlanTests(GraphQLTestCase):
+    """
+    Every field on Query must be served by an index on a seeded dataset.
+    """
+    OPERATIONS = {
+        'organization': '{ organization { name } }',
+        'projects': '''
+            { projects { organization { id } tasks { project { id } comments { task { id } } } } }
+        ''',
+        'project': 'query ($projectId: ID!) { project(id: $projectId) { tasks { id } } }',
+        'tasks': '''
+            query ($projectId: ID!) {
+                tasks(projectId: $projectId, includeArchived: true) { comments { id } commentCount }
+            }
+        ''',
+        'task': 'query ($taskId: ID!) { task(id: $taskId) { project { id } comments { id } } }',
+        'comments': 'query ($taskId: ID!) { comments(taskId: $taskId) { task { id } } }',
+        'projects_connection': '''
+            query ($cursor: String) {
+                projectsConnection(first: 2, after: $cursor) { edges { node { id } } }
+            }
+        ''',
+        'tasks_connection': '''
+            query ($projectId: ID!, $cursor: String) {
+                tasksConnection(projectId: $projectId, last: 2, before: $cursor) {
+                    edges { node { id } }
+                }
+            }
+        ''',
+        'comments_connection': '''
+            query ($taskId: ID!, $cursor: String) {
+                commentsConnection(taskId: $taskId, first: 2, after: $cursor) {
+                    edges { node { id } }
+                }
+            }
+        ''',
+        'task_board': '''
+            query ($projectId: ID!) {
+                taskBoard(projectId: $projectId, perColumn: 2) { columns { totalCount tasks { id } } }
+            }
+        ''',
+        'project_stats': '''
+            query ($projectId: ID!) { projectStats(projectId: $projectId) { totalTasks } }
+        ''',
+        'organization_stats': '{ organizationStats { totalTasks } }',
+        'all_project_stats': '{ allProjectStats { totalTasks } }',
+        'search': '''
+            {
+                search(query: "task", first: 5, includeArchived: true) {
+                    edges { rank node { ... on TaskType { id } } }
+                }
+            }
+        ''',
+        'changes': '''
+            query ($since: String) {
+                changes(since: $since, first: 5) { cursor tasks { id } deleted { id } }
+            }
+        ''',
+    }
+
+    # Indexes of the models that the operations must be planned with
+    INDEXES = {
+        'tasks': ['task_project_created_idx', 'archivedtask_project_idx'],
+        'comments': ['comment_task_created_idx'],
+        'projects_connection': ['project_org_created_idx'],
+        'tasks_connection': ['task_project_created_idx'],
+        'comments_connection': ['comment_task_created_idx'],
+        'task_board': ['task_project_status_idx'],
+        'organization_stats': ['project_org_status_idx'],
+    }
+
+    def test_every_query_field_is_covered(self):
+        self.assertEqual(set(self.OPERATIONS), set(Query._meta.fields))
+
+    def captured_queries(self):
+        """Run every operation on a seeded dataset; yield (name, [(sql, params)])."""
+        other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        self.seed(projects=4, tasks=10, comments=3, organization=other)
+        self.seed(projects=4, tasks=10, comments=3)
+        task = Task.objects.filter(project__organization=self.org).first()
+        variables = {
+            'projectId': str(task.project_id),
+            'taskId': str(task.id),
+            'cursor': encode_cursor(task),
+            'since': encode_change_cursor(0),
+        }
+
+        for name, query in self.OPERATIONS.items():
+            captured = []
+
+            def capture(execute, sql, params, many, context):
+                captured.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(capture):
+                self.execute(query, variables)
+            yield name, captured
+
+    def test_resolvers_do_not_scan_tables(self):
+        for name, captured in self.captured_queries():
+            for sql, params in captured:
+                with self.subTest(field=name, sql=sql):
+                    self.assertEqual(sequential_scans(sql, params), [])
+
+    def test_resolvers_use_their_indexes(self):
+        for name, captured in self.captured_queries():
+            plan = '\n'.join(line for sql, params in captured for line in query_plan(sql, params))
+            for index in self.INDEXES.get(name, ()):
+                with self.subTest(field=name, index=index):
+                    self.assertIn(index, plan)
+
+
+class SearchTests(GraphQLTestCase):
+    QUERY = '''
+        query ($query: String!, $first: Int, $after: String) {
+            search(query: $query, first: $first, after: $after) {
+                edges {
+                    cursor
+                    rank
+                    node {
+                        __typename
+                        ... on TaskType { title project { name } }
+                        ... on TaskCommentType { content task { title } }
+                    }
+                }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        self.login = Task.objects.create(
+            project=self.project, title='Login fails', description='Password reset emails bounce'
+        )
+        self.docs = Task.objects.create(
+            project=self.project, title='Write docs', description='Describe the login flow'
+        )
+        TaskComment.objects.create(task=self.docs, author='ann', content='Login screenshots attached')
+
+        other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        foreign = Project.objects.create(organization=other, name='Foreign')
+        Task.objects.create(project=foreign, title='Login for them')
+
+    def search(self, query, **variables):
+        return self.execute(self.QUERY, {'query': query, **variables})['search']
+
+    def test_results_are_ranked_and_tenant_scoped(self):
+        edges = self.search('login')['edges']
+        self.assertEqual(len(edges), 3)
+        # The title match outranks the description match
+        titles = [e['node'].get('title') for e in edges if e['node']['__typename'] == 'TaskType']
+        self.assertEqual(titles, ['Login fails', 'Write docs'])
+        ranks = [e['rank'] for e in edges]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        comment = next(e['node'] for e in edges if e['node']['__typename'] == 'TaskCommentType')
+        self.assertEqual(comment['task'], {'title': 'Write docs'})
+
+    def test_index_follows_writes(self):
+        self.login.title = 'Signup fails'
+        self.login.description = ''
+        self.login.save()
+        self.docs.delete()
+        self.assertEqual(self.search('login')['edges'], [])
+        self.assertEqual(len(self.search('signup')['edges']), 1)
+
+    def test_pages_by_offset_cursor(self):
+        first = self.search('login', first=2)
+        self.assertEqual(len(first['edges']), 2)
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        rest = self.search('login', first=2, after=first['pageInfo']['endCursor'])
+        self.assertEqual(len(rest['edges']), 1)
+        self.assertFalse(rest['pageInfo']['hasNextPage'])
+
+    def test_pages_match_the_full_ranking(self):
+        for i in range(6):
+            task = Task.objects.create(project=self.project, title=f'Login step {i}', description='login ' * i)
+            TaskComment.objects.create(task=task, author='ann', content='login ' * (i + 1))
+        ranking = search_rows(self.org, 'login', limit=100)
+        self.assertEqual(len(ranking), 15)
+        # Each table contributes at most offset + limit rows to a page
+        pages = [search_rows(self.org, 'login', limit=4, offset=offset) for offset in range(0, 15, 4)]
+        self.assertEqual([row for page in pages for row in page], ranking)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"login" ) (:')['edges'][0]['node']['title'], 'Login fails')
+        self.assertEqual(self.search('  ')['edges'], [])
+
+    def test_async_schema_matches(self):
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        result = async_to_sync(async_schema.execute_async)(
+            self.QUERY, variables={'query': 'login'}, context_value=request
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['search'], self.search('login'))
+
+
+class BulkTaskMutationTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        other = Organization.objects.create(name='Other', slug='other', contact_email='x@other.test')
+        self.foreign = Project.objects.create(organization=other, name='Foreign')
+        self.foreign_task = Task.objects.create(project=self.foreign, title='Theirs')
+        rebuild_counters()
+
+    def create(self, count):
+        payload = self.execute_mutation('''
+            mutation ($tasks: [TaskInput!]!) {
+                bulkCreateTasks(tasks: $tasks) {
+                    success message results { index taskId success message }
+                }
+            }
+        ''', {'tasks': [
+            {'projectId': str(self.project.id), 'title': f'Card {i}', 'priority': 'high'}
+            for i in range(count)
+        ]})
+        return [result['taskId'] for result in payload['results']]
+
+    def test_bulk_create_reports_per_item_results(self):
+        payload = self.execute_mutation('''
+            mutation ($tasks: [TaskInput!]!) {
+                bulkCreateTasks(tasks: $tasks) {
+                    success message results { index success message task { title status } }
+                }
+            }
+        ''', {'tasks': [
+            {'projectId': str(self.project.id), 'title': 'Mine'},
+            {'projectId': str(self.foreign.id), 'title': 'Not mine'},
+            {'projectId': 'bogus', 'title': 'Broken'},
+        ]})
+        self.assertEqual(payload['message'], '1 of 3 tasks created')
+        self.assertEqual(
+            [(r['index'], r['success']) for r in payload['results']],
+            [(0, True), (1, False), (2, False)],
+        )
+        self.assertEqual(payload['results'][0]['task'], {'title': 'Mine', 'status': 'TODO'})
+        self.assertEqual(payload['results'][1]['message'], 'Project not found')
+        self.assertFalse(self.foreign.tasks.filter(title='Not mine').exists())
+
+    def test_bulk_operations_use_constant_queries(self):
+        # savepoints around the single INSERT, the counters UPDATE and the
+        # change log lock and INSERT
+        with self.assertNumQueries(7):
+            ids = self.create(50)
+        self.assertEqual(Task.objects.filter(project=self.project).count(), 50)
+
+        with self.assertNumQueries(7):
+            payload = self.execute_mutation('''
+                mutation ($tasks: [TaskUpdateInput!]!) {
+                    bulkUpdateTasks(tasks: $tasks) { success message results { success } }
+                }
+            ''', {'tasks': [{'taskId': task_id, 'status': 'done'} for task_id in ids]
+                  + [{'taskId': str(self.foreign_task.id), 'status': 'done'}]})
+        self.assertEqual(payload['message'], '50 of 51 tasks updated')
+        self.assertEqual(self.project.tasks.filter(status='done').count(), 50)
+        self.foreign_task.refresh_from_db()
+        self.assertEqual(self.foreign_task.status, 'todo')
+
+        payload = self.execute_mutation('''
+            mutation ($ids: [ID!]!) {
+                bulkDeleteTasks(taskIds: $ids) { success message results { taskId success } }
+            }
+        ''', {'ids': ids[:10] + [str(self.foreign_task.id)]})
+        self.assertEqual(payload['message'], '10 of 11 tasks deleted')
+        self.assertFalse(payload['results'][-1]['success'])
+        self.assertTrue(Task.objects.filter(id=self.foreign_task.id).exists())
+
+        counters = self.project.task_counters
+        counters.refresh_from_db()
+        self.assertEqual((counters.total, counters.done, counters.high), (40, 40, 40))
+        self.assertEqual(find_drift(), [])
+
+
+class PersistedQueryTests(TestCase):
+    QUERY = '{ organization { slug } }'
+
+    def setUp(self):
+        organization_cache.clear()
+        document_cache.clear()
+        cache.clear()
+        Organization.objects.create(name='Acme', slug='acme', contact_email='ops@acme.test')
+        self.sha = hashlib.sha256(self.QUERY.encode()).hexdigest()
+
+    def post(self, body):
+        return self.client.post(
+            '/graphql/', body, content_type='application/json', HTTP_X_ORGANIZATION='acme'
+        ).json()
+
+    def persisted(self, sha=None):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha or self.sha}}
+
+    def test_apq_round_trip(self):
+        response = self.post({'extensions': self.persisted()})
+        self.assertEqual(response['errors'][0]['message'], 'PersistedQueryNotFound')
+
+        response = self.post({'query': self.QUERY, 'extensions': self.persisted()})
+        self.assertEqual(response['data'], {'organization': {'slug': 'acme'}})
+
+        document_cache.clear()
+        response = self.post({'extensions': self.persisted()})
+        self.assertEqual(response['data'], {'organization': {'slug': 'acme'}})
+
+    def test_hash_mismatch_is_rejected(self):
+        response = self.post({'query': self.QUERY, 'extensions': self.persisted('0' * 64)})
+        self.assertEqual(response['errors'][0]['message'], 'provided sha does not match query')
+
+    def test_validated_documents_are_reused(self):
+        self.post({'query': self.QUERY})
+        with mock.patch('projects.views.parse') as parse, \
+                mock.patch('projects.views.validate') as validate:
+            response = self.post({'query': self.QUERY})
+        parse.assert_not_called()
+        validate.assert_not_called()
+        self.assertEqual(response['data'], {'organization': {'slug': 'acme'}})
+
+    def test_invalid_documents_are_not_cached(self):
+        response = self.post({'query': '{ nope }'})
+        self.assertIn('errors', response)
+        self.assertIsNone(document_cache.get(hashlib.sha256(b'{ nope }').hexdigest()))
+
+    def test_allow_list_only_mode(self):
+        with mock.patch.multiple(
+            PersistedQueryGraphQLView, allow_list_only=True, _manifest={self.sha: self.QUERY}
+        ):
+            response = self.post({'extensions': self.persisted()})
+            self.assertEqual(response['data'], {'organization': {'slug': 'acme'}})
+
+            response = self.post({'query': '{ organizationStats { totalTasks } }'})
+            self.assertEqual(
+                response['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_ALLOWED'
+            )
+
+
+class QueryCostTests(TestCase):
+    def setUp(self):
+        organization_cache.clear()
+        document_cache.clear()
+        cache.clear()
+        Organization.objects.create(name='Acme', slug='acme', contact_email='ops@acme.test')
+
+    def post(self, query):
+        return self.client.post(
+            '/graphql/', {'query': query}, content_type='application/json',
+            HTTP_X_ORGANIZATION='acme',
+        )
+
+    def measure(self, query):
+        return measure_operation(schema.graphql_schema, parse(query))
+
+    def error_codes(self, query):
+        errors = validate(schema.graphql_schema, parse(query), [QueryCostRule])
+        return [error.extensions['code'] for error in errors]
+
+    def test_cost_is_reported_in_extensions(self):
+        response = self.post('{ organization { slug } }')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['extensions']['cost'], {
+            'requestedQueryCost': 1, 'maximumAvailable': 5000, 'depth': 2,
+        })
+
+    def test_list_sizes_come_from_pagination_arguments(self):
+        # 10 tasks x (task + edge + up to 50 comments each)
+        measured = self.measure('''
+            { tasksConnection(projectId: 1, first: 10) {
+                pageInfo { hasNextPage }
+                edges { node { title comments { author } } }
+            } }
+        ''')
+        self.assertEqual(measured.cost, 10 * (1 + 1 + 1 + 1 + 50))
+        self.assertEqual(measured.depth, 5)
+
+        with_default = 'query ($n: Int = 5) { projectsConnection(first: $n) { edges { node { id } } } }'
+        self.assertEqual(self.measure(with_default).cost, 5 * 3)
+        unbounded = 'query ($n: Int) { projectsConnection(first: $n) { edges { node { id } } } }'
+        self.assertEqual(self.measure(unbounded).cost, 200 * 3)
+        self.assertEqual(self.measure('{ projectsConnection { edges { node { id } } } }').cost, 50 * 3)
+
+    def test_fan_out_is_rejected_before_execution(self):
+        query = '{ projects { tasks { comments { task { comments { author } } } } } }'
+        with mock.patch('projects.schemas.queries.Query.resolve_projects') as resolve:
+            response = self.post(query)
+        resolve.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        error = response.json()['errors'][0]
+        self.assertEqual(error['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertIn('exceeds the maximum of 5000', error['message'])
+
+    def test_variables_are_costed_with_the_values_sent(self):
+        query = '''
+            query ($n: Int = 1) {
+                tasksConnection(projectId: 1, first: $n) {
+                    edges { node { comments { task { comments { id } } } } }
+                }
+            }
+        '''
+        # Within budget at its default, so it passes validation
+        self.assertEqual(self.error_codes(query), [])
+        self.assertGreater(
+            measure_operation(schema.graphql_schema, parse(query), variables={'n': 200}).cost, 5000
+        )
+        with mock.patch('projects.schemas.queries.Query.resolve_tasks_connection') as resolve:
+            response = self.client.post(
+                '/graphql/', {'query': query, 'variables': {'n': 200}},
+                content_type='application/json', HTTP_X_ORGANIZATION='acme',
+            )
+        resolve.assert_not_called()
+        self.assertEqual(response.json()['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+
+        response = self.client.post(
+            '/graphql/', {'query': query, 'variables': {'n': 1}},
+            content_type='application/json', HTTP_X_ORGANIZATION='acme',
+        )
+        self.assertNotIn('errors', response.json())
+
+    def test_depth_and_breadth_limits(self):
+        deep = '{ project(id: 1) { tasks { project { tasks { project { tasks { project { tasks { title } } } } } } } } }'
+        self.assertIn('QUERY_TOO_DEEP', self.error_codes(deep))
+
+        broad = '''
+            { organization { ...a ...b } }
+            fragment a on OrganizationType { n1: name n2: name }
+            fragment b on OrganizationType { n3: name n4: name }
+        '''
+        self.assertEqual(self.measure(broad).breadth, 4)
+        with mock.patch('projects.schemas.cost.MAX_BREADTH', 3):
+            self.assertEqual(self.error_codes(broad), ['QUERY_TOO_BROAD'])
+
+    def test_introspection_is_free(self):
+        self.assertEqual(self.error_codes(get_introspection_query()), [])
+
+
+class ResponseCacheTests(TestCase):
+    QUERY = 'query ($id: ID!) { projectStats(projectId: $id) { totalTasks } }'
+
+    def setUp(self):
+        organization_cache.clear()
+        document_cache.clear()
+        cache.clear()
+        self.org = Organization.objects.create(name='Acme', slug='acme', contact_email='ops@acme.test')
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        rebuild_counters()
+        patcher = mock.patch.object(PersistedQueryGraphQLView, 'cache_responses', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, query, variables=None, organization='acme', **headers):
+        return self.client.post(
+            '/graphql/', {'query': query, 'variables': variables or {}},
+            content_type='application/json', HTTP_X_ORGANIZATION=organization, **headers,
+        )
+
+    def stats(self, **headers):
+        return self.post(self.QUERY, {'id': str(self.project.id)}, **headers)
+
+    def test_repeated_queries_are_served_from_cache(self):
+        first = self.stats()
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        with mock.patch('projects.views.execute') as execute, self.assertNumQueries(0):
+            second = self.stats()
+        execute.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_gets_304_without_running(self):
+        etag = self.stats()['ETag']
+        with self.assertNumQueries(0):
+            response = self.stats(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_mutations_bump_the_version(self):
+        etag = self.stats()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(
+                'mutation ($id: ID!) { createTask(projectId: $id, title: "New") { success } }',
+                {'id': str(self.project.id)},
+            )
+        self.assertNotIn('ETag', response)
+
+        response = self.stats(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['projectStats'], {'totalTasks': 1})
+
+    def test_concurrent_bumps_each_leave_a_new_version(self):
+        first = organization_version(self.org.id)
+        # incr is not atomic on every shared backend; bumps must not rely on it
+        with mock.patch.object(type(caches['default']), 'incr', side_effect=AssertionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_organization_version(self.org.id)
+            second = organization_version(self.org.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_organization_version(self.org.id)
+        self.assertEqual(len({first, second, organization_version(self.org.id)}), 3)
+
+    def test_keys_are_per_organization_and_variables(self):
+        other = Organization.objects.create(name='Other', slug='other', contact_email='o@o.test')
+        Project.objects.create(organization=other, name='Theirs')
+        query = '{ projects { name } }'
+        self.assertEqual(self.post(query).json()['data'], {'projects': [{'name': 'Board'}]})
+        self.assertEqual(
+            self.post(query, organization='other').json()['data'], {'projects': [{'name': 'Theirs'}]}
+        )
+        self.assertNotEqual(
+            self.stats()['ETag'], self.post(self.QUERY, {'id': '0'})['ETag']
+        )
+
+    def test_failed_queries_are_not_cached(self):
+        query = 'query ($id: ID!) { project(id: $id) { name } }'
+        response = self.post(query, {'id': 'x'})
+        self.assertIn('errors', response.json())
+        self.assertNotIn('ETag', response)
+        with mock.patch('projects.views.execute', wraps=execute) as spy:
+            self.assertIn('errors', self.post(query, {'id': 'x'}).json())
+        spy.assert_called_once()
+        self.assertNotIn('ETag', self.post('{ nope }'))
+
+    def test_a_process_local_cache_fails_the_system_checks(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.gettempdir()}}
+        enabled = {'ENABLED': True, 'CACHE_ALIAS': 'default'}
+        with override_settings(GRAPHQL_RESPONSE_CACHE=enabled, CACHES=local):
+            self.assertEqual([e.id for e in check_response_cache(None)], ['projects.E001'])
+        with override_settings(GRAPHQL_RESPONSE_CACHE=enabled, CACHES=shared):
+            self.assertEqual(check_response_cache(None), [])
+        with override_settings(GRAPHQL_RESPONSE_CACHE={'ENABLED': False}, CACHES=local):
+            self.assertEqual(check_response_cache(None), [])
+
+
+class ReadReplicaTests(TestCase):
+    QUERY = 'query { projects { name } }'
+
+    def setUp(self):
+        organization_cache.clear()
+        document_cache.clear()
+        cache.clear()
+        self.org = Organization.objects.create(name='Acme', slug='acme', contact_email='ops@acme.test')
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        # The replica shares the test database connection
+        connections['replica1'] = connection
+        self.addCleanup(connections.__delitem__, 'replica1')
+        for patcher in (
+            mock.patch('projects.routers.ALIASES', ('replica1',)),
+            mock.patch.object(PersistedQueryGraphQLView, 'cache_responses', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, query, variables=None):
+        """Run an operation; returns its data and the alias of every read."""
+        reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            reads.append(alias)
+            return alias
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', record), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/graphql/', {'query': query, 'variables': variables or {}},
+                content_type='application/json', HTTP_X_ORGANIZATION='acme',
+            )
+        body = response.json()
+        self.assertNotIn('errors', body)
+        return body['data'], reads
+
+    def test_replicas_need_a_shared_cache(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                              'LOCATION': tempfile.gettempdir()}}
+        replicas = {'ALIASES': ['replica1'], 'CACHE_ALIAS': 'default'}
+        with override_settings(READ_REPLICAS=replicas, CACHES=local):
+            self.assertEqual([e.id for e in check_read_replicas(None)], ['projects.E002'])
+        with override_settings(READ_REPLICAS=replicas, CACHES=shared):
+            self.assertEqual(check_read_replicas(None), [])
+        with override_settings(READ_REPLICAS={'ALIASES': []}, CACHES=local):
+            self.assertEqual(check_read_replicas(None), [])
+
+    def create_task(self):
+        return self.post(
+            'mutation ($id: ID!) { createTask(projectId: $id, title: "New") { success } }',
+            {'id': str(self.project.id)},
+        )
+
+    def test_queries_read_from_a_replica(self):
+        data, reads = self.post(self.QUERY)
+        self.assertEqual(data, {'projects': [{'name': 'Board'}]})
+        # The middleware looks the tenant up on the primary
+        self.assertEqual(reads, ['default', 'replica1'])
+
+    def test_mutations_and_later_queries_of_the_tenant_use_the_primary(self):
+        data, reads = self.create_task()
+        self.assertTrue(data['createTask']['success'])
+        self.assertNotIn('replica1', reads)
+
+        data, reads = self.post('query { tasks(projectId: %d) { title } }' % self.project.id)
+        self.assertEqual(data['tasks'], [{'title': 'New'}])
+        self.assertEqual(set(reads), {'default'})
+
+        # Once the sticky window has passed
+        cache.delete(f'{STICKY_PREFIX}{self.org.id}')
+        _, reads = self.post(self.QUERY)
+        self.assertEqual(set(reads), {'replica1'})
+
+    def test_reads_after_a_write_or_in_a_transaction_use_the_primary(self):
+        router = ReplicaRouter()
+        routing = ReadRouting('replica1')
+        with read_from(routing):
+            self.assertEqual(router.db_for_read(Task), 'replica1')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Task), 'default')
+            self.assertEqual(router.db_for_read(Task), 'replica1')
+            self.assertEqual(router.db_for_write(Task), 'default')
+            self.assertEqual(router.db_for_read(Task), 'default')
+        self.assertEqual(router.db_for_read(Task), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'projects'))
+        self.assertTrue(router.allow_migrate('default', 'projects'))
+
+
+class AsyncGraphQLViewTests(GraphQLTestCase):
+    def post(self, query, variables=None):
+        request = AsyncRequestFactory().post(
+            '/graphql/', {'query': query, 'variables': variables or {}},
+            content_type='application/json',
+        )
+        request.organization = self.org
+        response = async_to_sync(AsyncGraphQLView.as_view())(request)
+        body = json.loads(response.content)
+        self.assertNotIn('errors', body)
+        return body['data']
+
+    @mock.patch('projects.schemas.cost.MAX_COST', 10 ** 6)
+    def test_matches_sync_schema_with_batched_relations(self):
+        self.seed(projects=3, tasks=4, comments=2)
+        rebuild_counters()
+        query = '''
+            query {
+                projects { name tasks { title project { name } comments { author } } }
+                allProjectStats { projectName totalTasks }
+                organizationStats { totalTasks }
+            }
+        '''
+        expected = self.execute(query)
+        # projects, tasks, comments, allProjectStats, organizationStats
+        with self.assertNumQueries(5):
+            data = self.post(query)
+        self.assertEqual(data, expected)
+        self.assertEqual(data['organizationStats']['totalTasks'], 12)
+
+    def test_mutations_run_in_a_transaction_off_the_event_loop(self):
+        project = Project.objects.create(organization=self.org, name='Board')
+        rebuild_counters()
+        data = self.post('''
+            mutation ($projectId: ID!) {
+                createTask(projectId: $projectId, title: "Async", status: "done") {
+                    success task { title project { name } }
+                }
+            }
+        ''', {'projectId': str(project.id)})
+        self.assertTrue(data['createTask']['success'])
+        self.assertEqual(data['createTask']['task']['project'], {'name': 'Board'})
+
+        data = self.post(
+            'query ($id: ID!) { projectStats(projectId: $id) { completedTasks } }',
+            {'id': str(project.id)},
+        )
+        self.assertEqual(data['projectStats'], {'completedTasks': 1})
+
+    def test_connections_page_on_the_async_orm(self):
+        project = Project.objects.create(organization=self.org, name='Board')
+        for i in range(3):
+            Task.objects.create(project=project, title=f'T{i}')
+        data = self.post('''
+            query ($projectId: ID!) {
+                tasksConnection(projectId: $projectId, first: 2) {
+                    edges { node { title } } pageInfo { hasNextPage }
+                }
+            }
+        ''', {'projectId': str(project.id)})
+        connection = data['tasksConnection']
+        self.assertEqual([e['node']['title'] for e in connection['edges']], ['T2', 'T1'])
+        self.assertTrue(connection['pageInfo']['hasNextPage'])
+
+
+class WebSocketClient:
+    """Drives GraphQLWebSocketApp through in-memory ASGI queues."""
+
+    def __init__(self, subprotocols=('graphql-transport-ws',), headers=()):
+        self.scope = {
+            'type': 'websocket',
+            'path': '/graphql/',
+            'subprotocols': list(subprotocols),
+            'headers': list(headers),
+        }
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+
+    async def connect(self):
+        self.app = asyncio.ensure_future(
+            GraphQLWebSocketApp()(self.scope, self.inbox.get, self.outbox.put)
+        )
+        await self.inbox.put({'type': 'websocket.connect'})
+        return await self.receive_event()
+
+    async def send(self, message):
+        await self.inbox.put({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive_event(self):
+        return await asyncio.wait_for(self.outbox.get(), 5)
+
+    async def receive(self):
+        event = await self.receive_event()
+        if event['type'] != 'websocket.send':
+            raise AssertionError(f'Expected a message, got {event}')
+        return json.loads(event['text'])
+
+    async def disconnect(self):
+        await self.inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.app, 5)
+
+
+class SubscriptionTests(GraphQLTestCase):
+    TASK_CHANGED = '''
+        subscription ($projectId: ID!) {
+            taskChanged(projectId: $projectId) { action taskId task { title status } }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        rebuild_counters()
+
+    def committed_mutation(self, mutation, variables):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.execute_mutation(mutation, variables)
+
+    async def open(self, organization='acme'):
+        client = WebSocketClient()
+        accepted = await client.connect()
+        self.assertEqual(accepted['subprotocol'], 'graphql-transport-ws')
+        await client.send({'type': 'connection_init', 'payload': {'X-Organization': organization}})
+        self.assertEqual(await client.receive(), {'type': 'connection_ack'})
+        return client
+
+    async def wait_for_subscribers(self, channel, count=1):
+        for _ in range(500):
+            if events.get_broker().subscriber_count(channel) == count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f'{channel} never reached {count} subscribers')
+
+    def test_task_changes_are_pushed_to_project_subscribers(self):
+        channel = events.task_channel(self.project.id)
+
+        async def scenario():
+            client = await self.open()
+            await client.send({
+                'id': '1', 'type': 'subscribe',
+                'payload': {'query': self.TASK_CHANGED, 'variables': {'projectId': str(self.project.id)}},
+            })
+            await self.wait_for_subscribers(channel)
+
+            created = await sync_to_async(self.committed_mutation)(
+                'mutation ($id: ID!) { createTask(projectId: $id, title: "Live") { success task { id } } }',
+                {'id': str(self.project.id)},
+            )
+            task_id = created['task']['id']
+            message = await client.receive()
+            self.assertEqual(message['id'], '1')
+            self.assertEqual(message['type'], 'next')
+            self.assertEqual(message['payload']['data']['taskChanged'], {
+                'action': 'created', 'taskId': task_id, 'task': {'title': 'Live', 'status': 'TODO'},
+            })
+
+            await sync_to_async(self.committed_mutation)(
+                'mutation ($id: ID!) { updateTask(taskId: $id, status: "done") { success } }',
+                {'id': task_id},
+            )
+            message = await client.receive()
+            self.assertEqual(message['payload']['data']['taskChanged']['task']['status'], 'DONE')
+
+            await sync_to_async(self.committed_mutation)(
+                'mutation ($id: ID!) { deleteTask(taskId: $id) { success } }', {'id': task_id},
+            )
+            message = await client.receive()
+            self.assertEqual(message['payload']['data']['taskChanged'], {
+                'action': 'deleted', 'taskId': task_id, 'task': None,
+            })
+
+            await client.send({'id': '1', 'type': 'complete'})
+            await self.wait_for_subscribers(channel, 0)
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_comment_added(self):
+        task = Task.objects.create(project=self.project, title='Discussed')
+        channel = events.comment_channel(task.id)
+
+        async def scenario():
+            client = await self.open()
+            await client.send({
+                'id': 'c', 'type': 'subscribe',
+                'payload': {
+                    'query': 'subscription ($id: ID!) { commentAdded(taskId: $id) { author content task { title } } }',
+                    'variables': {'id': str(task.id)},
+                },
+            })
+            await self.wait_for_subscribers(channel)
+            await sync_to_async(self.committed_mutation)(
+                'mutation ($id: ID!) { addComment(taskId: $id, author: "ann", content: "Hi") { success } }',
+                {'id': str(task.id)},
+            )
+            message = await client.receive()
+            self.assertEqual(message['payload']['data']['commentAdded'], {
+                'author': 'ann', 'content': 'Hi', 'task': {'title': 'Discussed'},
+            })
+            await client.disconnect()
+            # Disconnecting cancels the subscription
+            await self.wait_for_subscribers(channel, 0)
+
+        async_to_sync(scenario)()
+
+    def test_cannot_subscribe_to_another_tenants_project(self):
+        other = Organization.objects.create(name='Other', slug='other', contact_email='o@o.test')
+        foreign = Project.objects.create(organization=other, name='Secret')
+
+        async def scenario():
+            client = await self.open()
+            await client.send({
+                'id': '1', 'type': 'subscribe',
+                'payload': {'query': self.TASK_CHANGED, 'variables': {'projectId': str(foreign.id)}},
+            })
+            message = await client.receive()
+            self.assertEqual(message['type'], 'error')
+            self.assertEqual(message['payload'][0]['message'], 'Project not found')
+            self.assertEqual(events.get_broker().subscriber_count(events.task_channel(foreign.id)), 0)
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_ids_are_normalized_before_picking_the_channel(self):
+        channel = events.task_channel(self.project.id)
+
+        async def scenario():
+            client = await self.open()
+            await client.send({
+                'id': '1', 'type': 'subscribe',
+                'payload': {'query': self.TASK_CHANGED, 'variables': {'projectId': f'0{self.project.id}'}},
+            })
+            await self.wait_for_subscribers(channel)
+            self.assertEqual(events.get_broker().subscriber_count(f'tasks.project.0{self.project.id}'), 0)
+            await client.send({
+                'id': '2', 'type': 'subscribe',
+                'payload': {'query': self.TASK_CHANGED, 'variables': {'projectId': 'x'}},
+            })
+            message = await client.receive()
+            self.assertEqual(message['payload'][0]['message'], 'Project not found')
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_protocol_errors_close_the_connection(self):
+        async def scenario():
+            client = WebSocketClient(subprotocols=())
+            self.assertEqual((await client.connect())['code'], 4406)
+
+            client = WebSocketClient()
+            await client.connect()
+            await client.send({'type': 'subscribe', 'id': '1', 'payload': {}})
+            self.assertEqual((await client.receive_event())['code'], 4401)
+
+            client = WebSocketClient()
+            await client.connect()
+            await client.send({'type': 'connection_init', 'payload': {'X-Organization': 'nope'}})
+            self.assertEqual((await client.receive_event())['code'], 4403)
+
+            await sync_to_async(Organization.objects.bulk_create)([
+                Organization(name='Twin', slug=f'twin-{i}', contact_email='t@t.test') for i in range(2)
+            ])
+            client = WebSocketClient()
+            await client.connect()
+            await client.send({'type': 'connection_init', 'payload': {'X-Organization': 'Twin'}})
+            self.assertEqual((await client.receive_event())['code'], 4403)
+
+            for payload in (['acme'], {'X-Organization': 1}):
+                client = WebSocketClient()
+                await client.connect()
+                await client.send({'type': 'connection_init', 'payload': payload})
+                self.assertEqual((await client.receive_event())['code'], 4400)
+
+            client = await self.open()
+            await client.send({'type': 'ping'})
+            self.assertEqual(await client.receive(), {'type': 'pong'})
+            await client.send({'type': 'connection_init'})
+            self.assertEqual((await client.receive_event())['code'], 4429)
+
+            client = await self.open()
+            await client.send({'id': '1', 'type': 'subscribe', 'payload': 'query'})
+            self.assertEqual((await client.receive_event())['code'], 4400)
+
+        async_to_sync(scenario)()
+
+    def test_queries_and_mutations_are_refused(self):
+        mutation = 'mutation { createProject(name: "Sneaky") { success } }'
+
+        async def scenario():
+            client = await self.open()
+            for operation_id, query in (('q', '{ projects { name } }'), ('m', mutation)):
+                await client.send({'id': operation_id, 'type': 'subscribe', 'payload': {'query': query}})
+                message = await client.receive()
+                self.assertEqual(message['type'], 'error')
+                self.assertEqual(message['payload'][0]['extensions']['code'], 'OPERATION_NOT_SUPPORTED')
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+        self.assertFalse(Project.objects.filter(name='Sneaky').exists())
+
+    def test_allow_list_applies(self):
+        allowed = hashlib.sha256(self.TASK_CHANGED.encode()).hexdigest()
+        channel = events.task_channel(self.project.id)
+
+        async def scenario():
+            client = await self.open()
+            await client.send({'id': 'm', 'type': 'subscribe', 'payload': {
+                'query': 'mutation { createProject(name: "Sneaky") { success } }',
+            }})
+            message = await client.receive()
+            self.assertEqual(message['payload'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_ALLOWED')
+
+            # Listed documents may be sent by hash alone
+            await client.send({'id': 's', 'type': 'subscribe', 'payload': {
+                'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': allowed}},
+                'variables': {'projectId': str(self.project.id)},
+            }})
+            await self.wait_for_subscribers(channel)
+            await client.disconnect()
+
+        with mock.patch.multiple(
+            PersistedQueryGraphQLView, allow_list_only=True, _manifest={allowed: self.TASK_CHANGED}
+        ):
+            async_to_sync(scenario)()
+        self.assertFalse(Project.objects.filter(name='Sneaky').exists())
+
+    def test_http_endpoint_rejects_subscriptions(self):
+        request = RequestFactory().post(
+            '/graphql/', {'query': self.TASK_CHANGED, 'variables': {'projectId': str(self.project.id)}},
+            content_type='application/json',
+        )
+        request.organization = self.org
+        response = PersistedQueryGraphQLView.as_view(schema=schema)(request)
+        body = json.loads(response.content)
+        self.assertIn('WebSocket', body['errors'][0]['message'])
+
+
+class ChangeFeedTests(GraphQLTestCase):
+    CHANGES = '''
+        query ($since: String, $first: Int) {
+            changes(since: $since, first: $first) {
+                cursor hasMore
+                projects { name }
+                tasks { title status }
+                comments { content }
+                deleted { kind id }
+            }
+        }
+    '''
+
+    def changes(self, since=None, first=None, organization=None):
+        return self.execute(self.CHANGES, {'since': since, 'first': first}, organization)['changes']
+
+    def test_returns_only_what_changed_since_the_cursor(self):
+        project = self.execute_mutation(
+            'mutation { createProject(name: "Board") { success project { id } } }'
+        )['project']
+        task = self.execute_mutation(
+            'mutation ($id: ID!) { createTask(projectId: $id, title: "Draft") { success task { id } } }',
+            {'id': project['id']},
+        )['task']
+        cursor = self.changes()['cursor']
+
+        self.execute_mutation(
+            'mutation ($id: ID!) { updateTask(taskId: $id, status: "done") { success } }',
+            {'id': task['id']},
+        )
+        self.execute_mutation(
+            'mutation ($id: ID!) { updateTask(taskId: $id, title: "Final") { success } }',
+            {'id': task['id']},
+        )
+        self.execute_mutation(
+            'mutation ($id: ID!) { addComment(taskId: $id, author: "ann", content: "Done") { success } }',
+            {'id': task['id']},
+        )
+
+        changes = self.changes(cursor)
+        # Two updates of the same task come back once, in its current state
+        self.assertEqual(changes['tasks'], [{'title': 'Final', 'status': 'DONE'}])
+        self.assertEqual(changes['comments'], [{'content': 'Done'}])
+        self.assertEqual(changes['projects'], [])
+        self.assertEqual(changes['deleted'], [])
+        self.assertFalse(changes['hasMore'])
+
+        unchanged = self.changes(changes['cursor'])
+        self.assertEqual(unchanged['cursor'], changes['cursor'])
+        self.assertEqual(unchanged['tasks'], [])
+
+    def test_deletes_leave_tombstones_for_cascaded_rows(self):
+        project = Project.objects.create(organization=self.org, name='Board')
+        task = Task.objects.create(project=project, title='Doomed')
+        comment = TaskComment.objects.create(task=task, author='ann', content='...')
+        rebuild_counters()
+        cursor = self.changes()['cursor']
+
+        self.execute_mutation(
+            'mutation ($id: ID!) { deleteProject(projectId: $id) { success } }', {'id': str(project.id)}
+        )
+        changes = self.changes(cursor)
+        self.assertCountEqual(changes['deleted'], [
+            {'kind': 'project', 'id': str(project.id)},
+            {'kind': 'task', 'id': str(task.id)},
+            {'kind': 'comment', 'id': str(comment.id)},
+        ])
+
+    def test_pages_through_the_log(self):
+        project = Project.objects.create(organization=self.org, name='Board')
+        rebuild_counters()
+        cursor = self.changes()['cursor']
+        self.execute_mutation(
+            'mutation ($tasks: [TaskInput!]!) { bulkCreateTasks(tasks: $tasks) { success } }',
+            {'tasks': [{'projectId': str(project.id), 'title': f'T{i}'} for i in range(5)]},
+        )
+
+        titles = []
+        while True:
+            changes = self.changes(cursor, first=2)
+            titles += [task['title'] for task in changes['tasks']]
+            cursor = changes['cursor']
+            if not changes['hasMore']:
+                break
+        self.assertEqual(sorted(titles), ['T0', 'T1', 'T2', 'T3', 'T4'])
+
+    def test_feed_is_scoped_to_the_organization(self):
+        other = Organization.objects.create(name='Other', slug='other', contact_email='o@o.test')
+        start = self.changes()['cursor']
+        self.execute_mutation('mutation { createProject(name: "Theirs") { success } }', organization=other)
+        self.assertEqual(self.changes(start)['projects'], [])
+        self.assertEqual(ChangeLogEntry.objects.filter(organization=other).count(), 1)
+
+    def test_rejects_foreign_cursors(self):
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        result = schema.execute(self.CHANGES, variables={'since': encode_cursor(
+            Project.objects.create(organization=self.org, name='Board')
+        )}, context_value=request)
+        self.assertIn('Invalid cursor', result.errors[0].message)
+
+
+class MetricsTests(GraphQLTestCase):
+    QUERY = 'query BoardProjects { projects { name tasks { title } } }'
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(metrics.METRICS, {'ENABLED': True, 'TOKEN': 's3cret'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_operations_are_measured_per_operation_and_organization(self):
+        self.seed(projects=2, tasks=3, comments=0)
+        labels = {'operation': 'BoardProjects', 'organization': str(self.org.pk)}
+        before = {
+            name: self.sample(name, **labels) for name in (
+                'graphql_operation_db_queries_sum',
+                'graphql_response_size_bytes_sum',
+            )
+        }
+        duration_before = self.sample('graphql_operation_duration_seconds_count', outcome='ok', **labels)
+        resolver_before = self.sample(
+            'graphql_resolver_duration_seconds_count', operation='BoardProjects', path='projects.tasks'
+        )
+
+        response = Client().post(
+            '/graphql/', {'query': self.QUERY, 'operationName': 'BoardProjects'},
+            content_type='application/json', HTTP_X_ORGANIZATION='acme',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            self.sample('graphql_operation_duration_seconds_count', outcome='ok', **labels),
+            duration_before + 1,
+        )
+        # projects, then every task of the page in one batch
+        self.assertEqual(
+            self.sample('graphql_operation_db_queries_sum', **labels),
+            before['graphql_operation_db_queries_sum'] + 2,
+        )
+        self.assertEqual(
+            self.sample('graphql_response_size_bytes_sum', **labels),
+            before['graphql_response_size_bytes_sum'] + len(response.content),
+        )
+        # Observed once per operation, however many projects there are
+        self.assertEqual(
+            self.sample(
+                'graphql_resolver_duration_seconds_count', operation='BoardProjects', path='projects.tasks'
+            ),
+            resolver_before + 1,
+        )
+
+    def test_async_view_counts_queries_on_the_sync_thread(self):
+        self.seed(projects=1, tasks=2, comments=0)
+        labels = {'operation': 'BoardProjects', 'organization': str(self.org.pk)}
+        before = self.sample('graphql_operation_db_queries_sum', **labels)
+        request = AsyncRequestFactory().post(
+            '/graphql/', {'query': self.QUERY, 'operationName': 'BoardProjects'},
+            content_type='application/json',
+        )
+        request.organization = self.org
+        async_to_sync(AsyncGraphQLView.as_view())(request)
+        self.assertEqual(self.sample('graphql_operation_db_queries_sum', **labels), before + 2)
+
+    def test_only_validated_operation_names_become_labels(self):
+        def label(query, operation_name=None, allowed=None):
+            return metrics.operation_label(get_operation_ast(parse(query), operation_name), allowed)
+
+        with mock.patch.object(metrics, '_operation_names', set()), \
+                mock.patch.object(metrics, 'MAX_OPERATIONS', 2):
+            self.assertEqual(label('{ organization { name } }'), 'anonymous')
+            self.assertEqual(label('query Board_2 { organization { name } }'), 'Board_2')
+            self.assertEqual(label(f'query {"x" * 65} {{ organization {{ name }} }}'), 'other')
+            self.assertEqual(label('query A { organization { name } }'), 'A')
+            # Past MAX_OPERATIONS names, new ones are not labels
+            self.assertEqual(label('query B { organization { name } }'), 'other')
+            self.assertEqual(label('query Board_2 { organization { name } }'), 'Board_2')
+            # No operation of that name in the document
+            self.assertEqual(label('query A { organization { name } }', 'Missing'), 'other')
+            self.assertEqual(label('query C { organization { name } }', allowed={'C'}), 'C')
+            self.assertEqual(label('query A { organization { name } }', allowed={'C'}), 'other')
+
+        # Names of documents that fail validation are never labels
+        labels = {'operation': 'other', 'organization': str(self.org.pk), 'outcome': 'error'}
+        before = self.sample('graphql_operation_duration_seconds_count', **labels)
+        Client().post(
+            '/graphql/', {'query': 'query Unknown1 { nope }', 'operationName': 'Unknown1'},
+            content_type='application/json', HTTP_X_ORGANIZATION='acme',
+        )
+        self.assertEqual(self.sample('graphql_operation_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(self.sample(
+            'graphql_operation_duration_seconds_count', operation='Unknown1', organization=str(self.org.pk),
+            outcome='error',
+        ), 0)
+
+    def test_failed_operations_are_timed_with_their_outcome(self):
+        labels = {'operation': 'BoardProjects', 'organization': str(self.org.pk), 'outcome': 'exception'}
+        before = self.sample('graphql_operation_duration_seconds_count', **labels)
+        request = {'query': self.QUERY, 'operationName': 'BoardProjects'}
+
+        with mock.patch.object(PersistedQueryGraphQLView, 'encode_result', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                Client(raise_request_exception=True).post(
+                    '/graphql/', request, content_type='application/json', HTTP_X_ORGANIZATION='acme',
+                )
+        self.assertEqual(self.sample('graphql_operation_duration_seconds_count', **labels), before + 1)
+
+    def test_endpoint_serves_prometheus_text(self):
+        Client().post('/graphql/', {'query': '{ organization { name } }'},
+                      content_type='application/json', HTTP_X_ORGANIZATION='acme')
+        response = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'graphql_operation_duration_seconds_bucket{', response.content)
+        self.assertNotIn(b'organization="acme"', response.content)
+
+        self.assertEqual(Client().get('/metrics').status_code, 401)
+        self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+        # Without a token the endpoint does not exist
+        with mock.patch.dict(metrics.METRICS, {'TOKEN': None}):
+            self.assertEqual(Client().get('/metrics').status_code, 404)
+
+
+@mock.patch('projects.management.commands.seed_load.TEXT_POOL_SIZE', 500)
+class SeedLoadTests(TestCase):
+    def seed_load(self, *args):
+        call_command(
+            'seed_load', '--organizations', '2', '--projects', '3', '--tasks', '5',
+            '--comments', '2', *args, stdout=StringIO(),
+        )
+
+    def snapshot(self):
+        return (
+            list(Task.objects.order_by('project__organization__slug', 'project__name', 'title', 'created_at')
+                 .values_list('project__organization__slug', 'project__name', 'title', 'status',
+                              'priority', 'assignee', 'due_date', 'created_at')),
+            list(TaskComment.objects.order_by('created_at', 'content')
+                 .values_list('task__title', 'author', 'content', 'created_at')),
+        )
+
+    def test_same_seed_generates_the_same_data(self):
+        self.seed_load()
+        first = self.snapshot()
+        self.assertTrue(first[0] and first[1])
+        self.assertEqual(find_drift(), [])
+
+        Organization.objects.all().delete()
+        self.seed_load()
+        self.assertEqual(self.snapshot(), first)
+
+        Organization.objects.all().delete()
+        self.seed_load('--seed', '1')
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_rows_are_searchable(self):
+        self.seed_load()
+        task = Task.objects.select_related('project__organization').first()
+        word = task.title.split()[0]
+        results = search(task.project.organization, word, limit=1000)
+        self.assertIn(task, [instance for instance, rank in results])
+
+    def test_weights_shape_the_distribution(self):
+        self.seed_load('--statuses', 'done=1', '--unassigned', '1')
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(set(Task.objects.values_list('assignee', flat=True)), {''})
+
+        with self.assertRaises(CommandError):
+            self.seed_load('--prefix', 'other', '--statuses', 'finished=1')
+
+    def test_ids_of_deleted_rows_are_not_reused(self):
+        self.seed_load()
+        last = Task.objects.order_by('-id').values_list('id', flat=True).first()
+        Task.objects.filter(id=last).delete()
+        with transaction.atomic():
+            ids = RowWriter(batch_size=10).reserve_ids(Task._meta.db_table, 2)
+        self.assertEqual(ids, [last + 1, last + 2])
+
+    def test_existing_organizations_are_skipped(self):
+        self.seed_load()
+        tasks = Task.objects.count()
+        self.seed_load()
+        self.assertEqual(Task.objects.count(), tasks)
+
+
+@mock.patch('projects.management.commands.seed_load.TEXT_POOL_SIZE', 500)
+class BenchmarkGraphQLTests(TestCase):
+    def setUp(self):
+        call_command(
+            'seed_load', '--organizations', '1', '--projects', '2', '--tasks', '5',
+            '--comments', '2', stdout=StringIO(),
+        )
+
+    def benchmark(self, *args):
+        call_command('benchmark_graphql', '--iterations', '2', '--warmup', '0', *args,
+                     stdout=StringIO(), stderr=StringIO())
+
+    def test_frontend_operations_are_loaded(self):
+        documents = load_documents()
+        for name in ('GetProjects', 'GetTasks', 'GetComments', 'CreateTask', 'AddComment'):
+            self.assertIn(name, documents)
+
+    def test_results_and_regressions(self):
+        path = self.enterContext(tempfile.TemporaryDirectory())
+        output = f'{path}/results.json'
+        tasks = Task.objects.count()
+        self.benchmark('--include-mutations', '--output', output)
+        results = json.loads(open(output).read())
+        self.assertEqual(results['meta']['dataset']['tasks'], tasks)
+        for name in ('GetProjects', 'GetTasks', 'GetComments', 'CreateTask', 'DeleteProject'):
+            self.assertEqual(results['operations'][name]['errors'], 0, name)
+            self.assertGreater(results['operations'][name]['queries'], 0, name)
+        # Mutations are rolled back
+        self.assertEqual(Task.objects.count(), tasks)
+        self.assertEqual(Project.objects.count(), 2)
+
+        results['operations']['GetTasks']['queries'] = 1
+        results['operations']['GetTasks']['p95_ms'] = 1e6
+        with open(output, 'w') as f:
+            json.dump(results, f)
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.benchmark('--operations', 'GetTasks', '--baseline', output)
+
+
+class ExportTests(GraphQLTestCase):
+    def export(self, **params):
+        headers = params.pop('headers', {})
+        response = Client().get(
+            '/export/', params, HTTP_X_ORGANIZATION='acme', **headers
+        )
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_is_scoped_to_the_organization(self):
+        self.seed(projects=2, tasks=2, comments=1)
+        other = Organization.objects.create(name='Other', slug='other', contact_email='o@example.com')
+        self.seed(projects=1, tasks=1, comments=1, organization=other)
+
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        counts = {}
+        for record in records:
+            counts[record['type']] = counts.get(record['type'], 0) + 1
+        self.assertEqual(counts, {'project': 2, 'task': 4, 'comment': 4})
+        task = Task.objects.filter(project__organization=self.org).order_by('id').first()
+        self.assertIn(
+            {'type': 'task', 'id': task.id, 'project_id': task.project_id, 'title': task.title,
+             'description': '', 'status': 'todo', 'priority': 'medium', 'assignee': '',
+             'due_date': None, 'created_at': task.created_at.isoformat(),
+             'updated_at': task.updated_at.isoformat()},
+            records,
+        )
+
+    def test_csv_and_gzip(self):
+        self.seed(projects=1, tasks=3, comments=0)
+        response, body = self.export(format='csv', kind='task', headers={'HTTP_ACCEPT_ENCODING': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'project_id', 'title'])
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ['Task 0.0', 'Task 0.1', 'Task 0.2'])
+
+        response = Client().get('/export/', {'format': 'csv'}, HTTP_X_ORGANIZATION='acme')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Client().get('/export/').status_code, 400)
+
+    def test_rows_are_streamed_in_chunks(self):
+        self.seed(projects=1, tasks=30, comments=0)
+        with mock.patch('projects.export.BUFFER_SIZE', 1000):
+            response = Client().get('/export/', {'kind': 'task'}, HTTP_X_ORGANIZATION='acme')
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(len(b''.join(chunks).splitlines()), 30)
+
+    def test_asgi_streams_without_collecting(self):
+        self.seed(projects=1, tasks=3, comments=0)
+
+        async def export():
+            response = await AsyncClient().get('/export/', headers={'X-Organization': 'acme'})
+            return [chunk async for chunk in response.streaming_content]
+
+        with mock.patch('projects.export.BUFFER_SIZE', 1):
+            chunks = async_to_sync(export)()
+        self.assertEqual(len(chunks), 4)
+
+    def test_command(self):
+        self.seed(projects=1, tasks=2, comments=1)
+        out = StringIO()
+        call_command('export_organization', 'acme', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        with self.assertRaises(CommandError):
+            call_command('export_organization', 'acme', '--format', 'csv', stdout=StringIO())
+
+
+class ImportTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Website')
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def write(self, name, lines):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w') as f:
+            f.write('\n'.join(json.dumps(line) if isinstance(line, dict) else line for line in lines))
+        return path
+
+    def import_file(self, path, *args):
+        out = StringIO()
+        call_command('import_tasks', 'acme', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_rows_are_imported_and_errors_reported(self):
+        existing = Task.objects.create(project=self.project, title='Existing')
+        rebuild_counters([self.project.id])
+        path = self.write('tasks.ndjson', [
+            {'ref': 'T-1', 'project': 'Website', 'title': 'Imported', 'status': 'In Progress',
+             'due_date': '2026-03-01'},
+            {'ref': 'T-2', 'project': str(self.project.id), 'title': 'Second', 'priority': 'urgent'},
+            {'type': 'comment', 'task_ref': 'T-1', 'author': 'ann', 'content': 'From the old tool'},
+            {'type': 'comment', 'task_id': existing.id, 'author': 'bob', 'content': 'On an existing task'},
+            {'project': 'Nowhere', 'title': 'Lost'},
+            {'project': 'Website', 'title': 'Bad', 'status': 'blocked'},
+            '{not json',
+            {'type': 'comment', 'task_ref': 'T-9', 'author': 'ann', 'content': 'Orphan'},
+        ])
+        report = f'{self.directory}/errors.csv'
+        self.import_file(path, '--batch-size', '3', '--error-report', report)
+
+        job = ImportJob.objects.get()
+        self.assertEqual(
+            (job.status, job.checkpoint, job.imported_tasks, job.imported_comments, job.failed_rows),
+            ('completed', 8, 2, 2, 4),
+        )
+        self.assertEqual([error['row'] for error in job.errors], [5, 6, 7, 8])
+        with open(report) as f:
+            self.assertEqual(len(list(csv.reader(f))), 5)
+
+        task = Task.objects.get(title='Imported')
+        self.assertEqual((task.status, task.due_date.day), ('in_progress', 1))
+        self.assertEqual(task.comments.get().author, 'ann')
+        self.assertEqual(existing.comments.get().author, 'bob')
+        self.assertEqual(find_drift(), [])
+        self.assertEqual(ChangeLogEntry.objects.filter(organization=self.org).count(), 4)
+
+    def test_failed_import_resumes_after_its_checkpoint(self):
+        path = self.write('tasks.ndjson', [
+            {'ref': f'T-{i}', 'project': 'Website', 'title': f'Task {i}'} for i in range(4)
+        ] + [{'type': 'comment', 'task_ref': 'T-0', 'author': 'ann', 'content': 'First'}])
+
+        def adjust_then_fail(*args, **kwargs):
+            if adjust.call_count > 1:
+                raise DatabaseError('connection lost')
+            counters.adjust_counters(*args, **kwargs)
+
+        adjust = mock.Mock(side_effect=adjust_then_fail)
+        with mock.patch('projects.imports.adjust_counters', adjust):
+            with self.assertRaises(DatabaseError):
+                self.import_file(path, '--batch-size', '2')
+        job = ImportJob.objects.get()
+        self.assertEqual((job.status, job.checkpoint), ('failed', 2))
+        self.assertEqual(Task.objects.count(), 2)
+
+        with self.assertRaises(CommandError):
+            self.import_file(self.write('other.ndjson', []), '--resume', str(job.id))
+        self.import_file(path, '--batch-size', '2', '--resume', str(job.id))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.imported_tasks, job.imported_comments), ('completed', 4, 1))
+        self.assertEqual(Task.objects.count(), 4)
+        # The comment's task was imported by the first run
+        self.assertEqual(TaskComment.objects.get().task.title, 'Task 0')
+        self.assertEqual(find_drift(), [])
+
+    def test_upload_mutation(self):
+        upload = SimpleUploadedFile(
+            'tasks.csv',
+            b'project,title,status\r\nWebsite,From CSV,done\r\nWebsite,,todo\r\n',
+            content_type='text/csv',
+        )
+        operations = {
+            'query': '''
+                mutation Import($file: Upload!) {
+                    importTasks(file: $file) {
+                        success message
+                        job { id status format importedTasks failedRows errors { row message } }
+                    }
+                }
+            ''',
+            'variables': {'file': None},
+        }
+        response = Client().post('/graphql/', {
+            'operations': json.dumps(operations),
+            'map': json.dumps({'0': ['variables.file']}),
+            '0': upload,
+        }, HTTP_X_ORGANIZATION='acme')
+        payload = response.json()['data']['importTasks']
+        self.assertTrue(payload['success'], payload['message'])
+        self.assertEqual(payload['job']['status'], 'COMPLETED')
+        self.assertEqual(payload['job']['format'], 'CSV')
+        self.assertEqual(payload['job']['importedTasks'], 1)
+        self.assertEqual(payload['job']['errors'], [{'row': 2, 'message': 'title is required'}])
+        self.assertEqual(Task.objects.get().status, 'done')
+
+        response = Client().post('/graphql/', {
+            'operations': json.dumps(operations),
+            'map': json.dumps({'1': ['variables.file']}),
+        }, HTTP_X_ORGANIZATION='acme')
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTests(GraphQLTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(organization=self.org, name='Board')
+        now = timezone.now()
+        self.old = [
+            Task.objects.create(
+                project=self.project, title=f'Shipped {i}', status='done',
+                created_at=now - timedelta(days=500, seconds=i),
+            )
+            for i in range(3)
+        ]
+        for task in self.old:
+            for author in ['ann', 'bob']:
+                TaskComment.objects.create(task=task, author=author, content='Released')
+        self.recent = Task.objects.create(project=self.project, title='Shipped today', status='done')
+        self.open = Task.objects.create(project=self.project, title='Stale', status='todo')
+        # updated_at is auto_now
+        Task.objects.filter(id__in=[t.id for t in self.old] + [self.open.id]).update(
+            updated_at=now - timedelta(days=400)
+        )
+        rebuild_counters([self.project.id])
+
+    def archive(self, **kwargs):
+        return archive_tasks(archive_cutoff(365), **kwargs)
+
+    def test_old_done_tasks_move_with_their_comments_in_batches(self):
+        self.assertEqual(self.archive(batch_size=2, max_batches=1), (2, 4))
+        self.assertEqual(self.archive(batch_size=2), (1, 2))
+        self.assertEqual(self.archive(), (0, 0))
+
+        old_ids = {task.id for task in self.old}
+        self.assertEqual(set(Task.objects.values_list('id', flat=True)), {self.recent.id, self.open.id})
+        self.assertEqual(set(ArchivedTask.objects.values_list('id', flat=True)), old_ids)
+        archived = ArchivedTask.objects.get(id=self.old[0].id)
+        self.assertEqual((archived.title, archived.organization_id), ('Shipped 0', self.org.id))
+        self.assertEqual(archived.created_at, self.old[0].created_at)
+        self.assertEqual(
+            set(ArchivedTaskComment.objects.values_list('task_id', flat=True)), old_ids
+        )
+        self.assertFalse(TaskComment.objects.exists())
+        # Archived tasks stay counted
+        self.assertEqual(find_drift([self.project.id]), [])
+        self.assertEqual(ProjectTaskCounters.objects.get(project=self.project).done, 4)
+
+        self.assertEqual([task for task, rank in search(self.org, 'shipped', 10)], [self.recent])
+        found = [task for task, rank in search(self.org, 'shipped', 10, include_archived=True)]
+        self.assertEqual({task.id for task in found if isinstance(task, ArchivedTask)}, old_ids)
+        self.assertIn(self.recent, found)
+        self.assertEqual(len(search(self.org, 'released', 10, include_archived=True)), 6)
+
+    def test_comments_added_during_archival_are_not_lost(self):
+        copy = archive._copy
+        task = self.old[0]
+
+        def copy_then_comment(source, *args, **kwargs):
+            copied = copy(source, *args, **kwargs)
+            if source is Task:
+                # A writer that got the task before the batch locked it
+                self.execute_mutation(
+                    'mutation ($id: ID!) { addComment(taskId: $id, author: "cy", content: "Late") { success } }',
+                    {'id': str(task.id)},
+                )
+            return copied
+
+        with mock.patch.object(archive, '_copy', copy_then_comment):
+            self.assertEqual(self.archive(), (3, 7))
+        self.assertTrue(ArchivedTaskComment.objects.filter(task_id=task.id, author='cy').exists())
+
+        # Once the task is archived, new comments are refused
+        result = self.execute(
+            'mutation ($id: ID!) { addComment(taskId: $id, author: "cy", content: "Later") { success message } }',
+            {'id': str(task.id)},
+        )
+        self.assertEqual(result['addComment'], {'success': False, 'message': 'Task not found'})
+
+    def test_statistics_are_unchanged_by_archival(self):
+        query = '''
+            query ($id: ID!) {
+                projectStats(projectId: $id) { totalTasks completedTasks completionRate }
+                organizationStats { totalTasks completedTasks overallCompletionRate }
+            }
+        '''
+        variables = {'id': str(self.project.id)}
+        before = self.execute(query, variables)
+        self.assertEqual(before['projectStats']['completedTasks'], 4)
+        self.archive()
+        self.assertEqual(self.execute(query, variables), before)
+        rebuild_counters([self.project.id])
+        self.assertEqual(self.execute(query, variables), before)
+
+    def test_queries_include_archived_rows_on_request(self):
+        self.archive()
+        query = '''
+            query ($projectId: ID!, $all: Boolean) {
+                tasks(projectId: $projectId, includeArchived: $all) {
+                    title archivedAt commentCount comments { author task { title } }
+                }
+            }
+        '''
+        variables = {'projectId': str(self.project.id)}
+        titles = [task['title'] for task in self.execute(query, variables)['tasks']]
+        self.assertEqual(titles, ['Stale', 'Shipped today'])
+
+        # Project, live and archived tasks, and the comments of each
+        with self.assertNumQueries(5):
+            tasks = self.execute(query, {**variables, 'all': True})['tasks']
+        self.assertEqual(
+            [task['title'] for task in tasks],
+            ['Stale', 'Shipped today', 'Shipped 0', 'Shipped 1', 'Shipped 2'],
+        )
+        self.assertIsNone(tasks[0]['archivedAt'])
+        self.assertIsNotNone(tasks[2]['archivedAt'])
+        self.assertEqual(tasks[2]['commentCount'], 2)
+        self.assertEqual(
+            tasks[2]['comments'], [{'author': 'ann', 'task': {'title': 'Shipped 0'}},
+                                   {'author': 'bob', 'task': {'title': 'Shipped 0'}}]
+        )
+
+        query = '''
+            query ($id: ID!, $all: Boolean) {
+                task(id: $id, includeArchived: $all) { title comments { author } commentCount }
+                comments(taskId: $id, includeArchived: $all) { task { archivedAt } }
+            }
+        '''
+        variables = {'id': str(self.old[1].id)}
+        self.assertEqual(self.execute(query, variables), {'task': None, 'comments': []})
+        data = self.execute(query, {**variables, 'all': True})
+        self.assertEqual(data['task'], {
+            'title': 'Shipped 1', 'comments': [{'author': 'ann'}, {'author': 'bob'}], 'commentCount': 2,
+        })
+        self.assertEqual(len(data['comments']), 2)
+        self.assertIsNotNone(data['comments'][0]['task']['archivedAt'])
+
+        result = async_to_sync(async_schema.execute_async)(
+            query, variable_values={**variables, 'all': True}, context_value=self.request()
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data, data)
+
+        found = self.execute('''
+            { search(query: "released", first: 10, includeArchived: true) {
+                edges { node { ... on TaskCommentType { task { title archivedAt } } } }
+            } }
+        ''')['search']['edges']
+        self.assertEqual(len(found), 6)
+        self.assertTrue(all(edge['node']['task']['archivedAt'] for edge in found))
+
+    def test_changes_feed_reads_archived_rows(self):
+        query = '''
+            query ($since: String) {
+                changes(since: $since) { cursor tasks { title archivedAt } comments { author } deleted { kind id } }
+            }
+        '''
+        cursor = self.execute(query)['changes']['cursor']
+        task = self.old[0]
+        comment = task.comments.first()
+        with transaction.atomic():
+            record_changes(self.org.id, saved=[('task', task.id), ('comment', comment.id)])
+        self.archive()
+
+        # Saved before archival, read back from the archive
+        changes = self.execute(query, {'since': cursor})['changes']
+        self.assertEqual(len(changes['tasks']), 1)
+        self.assertEqual(changes['tasks'][0]['title'], 'Shipped 0')
+        self.assertIsNotNone(changes['tasks'][0]['archivedAt'])
+        self.assertEqual(changes['comments'], [{'author': comment.author}])
+
+        # Deleting the project cascades to its archived rows too
+        self.execute_mutation(
+            'mutation ($id: ID!) { deleteProject(projectId: $id) { success } }', {'id': str(self.project.id)}
+        )
+        deleted = self.execute(query, {'since': changes['cursor']})['changes']['deleted']
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertEqual({d['id'] for d in deleted if d['kind'] == 'task'}, {
+            str(pk) for pk in [self.recent.id, self.open.id, *(t.id for t in self.old)]
+        })
+        self.assertEqual(len([d for d in deleted if d['kind'] == 'comment']), 6)
+
+    def test_export_includes_archived_rows(self):
+        self.archive()
+        response = Client().get('/export/', {'kind': 'task'}, HTTP_X_ORGANIZATION='acme')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [record['id'] for record in records],
+            [self.recent.id, self.open.id] + [task.id for task in self.old],
+        )
+        response = Client().get('/export/', {'kind': 'comment'}, HTTP_X_ORGANIZATION='acme')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 6)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_tasks', '--dry-run', stdout=out)
+        self.assertIn('3 tasks', out.getvalue())
+        self.assertEqual(ArchivedTask.objects.count(), 0)
+
+        out = StringIO()
+        call_command('archive_tasks', '--older-than-days', '450', stdout=out)
+        self.assertIn('Archived 0 tasks', out.getvalue())
+        call_command('archive_tasks', '--organization', 'acme', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived 3 tasks and 6 comments', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('archive_tasks', '--organization', 'nope', stdout=out)
+
+    def request(self):
+        request = RequestFactory().post('/graphql/')
+        request.organization = self.org
+        return request
@@ -1,7 +1,559 @@
-# projects/views.py
-from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+"""
+GraphQL endpoint with automatic persisted queries and a document cache.
 
-urlpatterns = [
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
-]
+Clients following the Apollo APQ protocol send ``extensions.persistedQuery``
+with the sha256 of their query and may omit the query text; the text is
+stored the first time it is seen. Independently of APQ, every parsed and
+validated DocumentNode is kept in an in-process LRU keyed by that hash, so
+repeated operations skip parse/validate entirely.
+
+With ``ALLOW_LIST_ONLY`` enabled only documents listed in the manifest file
+may run, whether they arrive by hash or as full text.
+
+Validation includes QueryCostRule, and the static cost of the operation
+that ran is reported under ``extensions.cost`` in the response.
+
+Successful query (not mutation) responses are cached per organization
+version (see response_cache.py) and carry that key as their ETag; a request
+whose If-None-Match matches gets a 304 before anything executes.
+
+Query operations read from a replica when READ_REPLICAS are configured
+(see routers.py).
+
+Each operation is measured for the Prometheus metrics at /metrics (see
+metrics.py).
+
+File uploads follow the GraphQL multipart request spec: ``operations`` and
+``map`` form fields place the uploaded files into the variables, where the
+``Upload`` scalar hands them to resolvers.
+
+AsyncGraphQLView serves the same protocol from an async view against
+``async_schema`` so that, under ASGI, a worker is not held while resolvers
+wait on the database.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    specified_rules,
+    validate,
+)
+
+from . import metrics, response_cache, routers
+from .schema import async_schema
+from .schemas.cost import QueryCostRule, cost_error, measure_operation
+
+PERSISTED_QUERIES = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {})
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def place_files(operations, file_map, files):
+    """
+    Put ``files`` into the decoded multipart ``operations`` at the
+    ``variables.file``-style paths listed in ``file_map``.
+    """
+    for key, paths in file_map.items():
+        if key not in files:
+            raise HttpError(HttpResponseBadRequest(f'File {key} is missing.'))
+        for path in paths:
+            target = operations
+            *parents, last = str(path).split('.')
+            try:
+                for part in parents:
+                    target = target[int(part) if isinstance(target, list) else part]
+                target[int(last) if isinstance(target, list) else last] = files[key]
+            except (KeyError, IndexError, TypeError, ValueError):
+                raise HttpError(HttpResponseBadRequest(f'Invalid file path {path}.'))
+    return operations
+
+
+def load_manifest(path):
+    """
+    Read an allow-list manifest: either ``{hash: query}`` or Apollo's
+    persisted-query-manifest format with an ``operations`` list.
+    """
+    with open(path, encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    if 'operations' in manifest:
+        manifest = {op['id']: op['body'] for op in manifest['operations']}
+    for sha, query in manifest.items():
+        if query_hash(query) != sha:
+            raise ValueError(f'Manifest entry {sha} does not match its query')
+    return manifest
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of validated DocumentNodes keyed by query hash.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+document_cache = DocumentCache(PERSISTED_QUERIES.get('DOCUMENT_CACHE_SIZE', 256))
+
+
+class PersistedQueryGraphQLView(GraphQLView):
+    """
+    GraphQLView that resolves APQ hashes and reuses validated documents.
+    """
+    allow_list_only = PERSISTED_QUERIES.get('ALLOW_LIST_ONLY', False)
+    manifest_path = PERSISTED_QUERIES.get('MANIFEST')
+    cache_alias = PERSISTED_QUERIES.get('CACHE_ALIAS', 'default')
+    cache_timeout = PERSISTED_QUERIES.get('CACHE_TIMEOUT', None)
+    cache_prefix = 'apq:'
+    validation_rules = (*specified_rules, QueryCostRule)
+    cache_responses = response_cache.RESPONSE_CACHE.get('ENABLED', False)
+    # Honour graphene's ATOMIC_MUTATIONS setting
+    atomic_mutations = True
+
+    _manifest = None
+    _manifest_operations = None
+
+    @classmethod
+    def get_manifest(cls):
+        if cls._manifest is None:
+            cls._manifest = load_manifest(cls.manifest_path) if cls.manifest_path else {}
+        return cls._manifest
+
+    @classmethod
+    def get_manifest_operations(cls):
+        """Names of the manifest's operations, or None without a manifest."""
+        if not cls.manifest_path:
+            return None
+        if cls._manifest_operations is None:
+            cls._manifest_operations = {
+                definition.name.value
+                for query in cls.get_manifest().values()
+                for definition in parse(query).definitions
+                if isinstance(definition, OperationDefinitionNode) and definition.name
+            }
+        return cls._manifest_operations
+
+    def name_operation(self, request, operation_ast):
+        metrics.name_operation(request, operation_ast, self.get_manifest_operations())
+
+    def lookup_query(self, sha):
+        query = self.get_manifest().get(sha)
+        if query is None and not self.allow_list_only:
+            query = caches[self.cache_alias].get(self.cache_prefix + sha)
+        return query
+
+    def store_query(self, sha, query):
+        caches[self.cache_alias].set(self.cache_prefix + sha, query, self.cache_timeout)
+
+    @staticmethod
+    def get_persisted_hash(request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions') or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        persisted = extensions.get('persistedQuery') or {}
+        return persisted.get('sha256Hash')
+
+    def dispatch(self, request, *args, **kwargs):
+        return self.finalize_response(request, super().dispatch(request, *args, **kwargs))
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == 'multipart/form-data' and 'operations' in request.POST:
+            try:
+                operations = json.loads(request.POST['operations'])
+                file_map = json.loads(request.POST.get('map') or '{}')
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Multipart operations are invalid JSON.'))
+            if not isinstance(operations, list if self.batch else dict) or not isinstance(file_map, dict):
+                raise HttpError(HttpResponseBadRequest('Multipart operations are invalid.'))
+            return place_files(operations, file_map, request.FILES)
+        return super().parse_body(request)
+
+    def get_response(self, request, data, show_graphiql=False):
+        request._persisted_hash = self.get_persisted_hash(request, data)
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        with metrics.record_operation(request) as recorder:
+            result, status_code = self.run_operation(
+                request, data, query, variables, operation_name, id, show_graphiql
+            )
+            if recorder is not None and result is not None:
+                recorder.response_size = len(result)
+        return result, status_code
+
+    def run_operation(self, request, data, query, variables, operation_name, id,
+                      show_graphiql=False):
+        if not show_graphiql:
+            cached = self.get_cached_response(request, query, variables, operation_name)
+            if cached:
+                return cached
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        metrics.record_errors(request, execution_result)
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+        if execution_result and execution_result.errors:
+            set_rollback()
+        result, status_code = self.encode_result(request, execution_result, id, show_graphiql)
+        self.cache_response(request, execution_result, result)
+        return result, status_code
+
+    def get_response_key(self, request, query, variables, operation_name):
+        """
+        Return the response cache key for a read-only operation of a tenant,
+        or None if the response must not be cached.
+        """
+        organization = getattr(request, 'organization', None)
+        if not self.cache_responses or self.batch or organization is None:
+            return None
+        if not query and not request._persisted_hash:
+            return None
+        document, errors = self.resolve_document(request, query)
+        if errors:
+            return None
+        operation_ast = get_operation_ast(document, operation_name)
+        self.name_operation(request, operation_ast)
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None
+        return response_cache.response_key(
+            organization.pk,
+            request._persisted_hash or query_hash(query),
+            operation_name,
+            variables,
+        )
+
+    def get_cached_response(self, request, query, variables, operation_name):
+        """
+        Return ``(body, status_code)`` if the operation need not run: a 304
+        for a matching If-None-Match, or the cached body.
+        """
+        key = self.get_response_key(request, query, variables, operation_name)
+        request._response_key = key
+        if key is None:
+            return None
+        if f'"{key}"' in parse_etags(request.headers.get('If-None-Match', '')):
+            return None, 304
+        body = response_cache.get_response(key)
+        if body is not None:
+            return body, 200
+        return None
+
+    def cache_response(self, request, execution_result, body):
+        key = getattr(request, '_response_key', None)
+        if not key:
+            return
+        if execution_result and not execution_result.errors:
+            response_cache.set_response(key, body)
+        else:
+            # Errors are not cached, so they get no ETag either
+            request._response_key = None
+
+    def finalize_response(self, request, response):
+        key = getattr(request, '_response_key', None)
+        if key is None or response.status_code not in (200, 304):
+            return response
+        if response.status_code == 304:
+            response = HttpResponseNotModified()
+        response['ETag'] = f'"{key}"'
+        # Clients must revalidate, which is free while the version is current
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['X-Organization'])
+        return response
+
+    def encode_result(self, request, execution_result, id=None, show_graphiql=False):
+        """
+        Return ``(body, status_code)`` for an ExecutionResult, including its
+        extensions.
+        """
+        if not execution_result:
+            return None, 200
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, 'path', None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+
+        if execution_result.extensions:
+            response['extensions'] = execution_result.extensions
+
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def resolve_document(self, request, query):
+        """
+        Return ``(document, errors)`` for the request, applying the APQ
+        protocol and the allow list, and serving repeat documents from cache.
+        """
+        sha = getattr(request, '_persisted_hash', None)
+        if sha and not query:
+            document = document_cache.get(sha)
+            if document is not None:
+                return document, None
+            query = self.lookup_query(sha)
+            if query is None:
+                return None, [GraphQLError(
+                    'PersistedQueryNotFound',
+                    extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+                )]
+        elif query:
+            actual = query_hash(query)
+            if sha and sha != actual:
+                return None, [GraphQLError('provided sha does not match query')]
+            sha = actual
+            if self.allow_list_only and sha not in self.get_manifest():
+                return None, [GraphQLError(
+                    'Only allow-listed queries may run',
+                    extensions={'code': 'PERSISTED_QUERY_NOT_ALLOWED'},
+                )]
+        else:
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        document = document_cache.get(sha)
+        if document is not None:
+            return document, None
+
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+
+        validation_errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return None, validation_errors
+
+        document_cache.set(sha, document)
+        if getattr(request, '_persisted_hash', None) and not self.allow_list_only:
+            self.store_query(sha, query)
+        return document, None
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        if not query and not getattr(request, '_persisted_hash', None):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        document, errors = self.resolve_document(request, query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        self.name_operation(request, operation_ast)
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            return ExecutionResult(errors=[GraphQLError(
+                'Subscriptions are served over WebSocket (graphql-transport-ws)'
+            )])
+        # Validation sized variable page sizes by their defaults; the
+        # request may send more
+        cost = measure_operation(
+            self.schema.graphql_schema, document, operation_name,
+            variables if isinstance(variables, dict) else None,
+        )
+        extensions = {'cost': cost.as_extension()} if cost else None
+        error = cost_error(cost, operation_ast)
+        if error is not None:
+            return ExecutionResult(errors=[error], extensions=extensions)
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'.format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        # Query operations may read from a replica
+        routing = None
+        if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            organization = getattr(request, 'organization', None)
+            routing = routers.query_routing(organization and organization.pk)
+
+        try:
+            execute_options = {
+                'root_value': self.get_root_value(request),
+                'context_value': self.get_context(request),
+                'variable_values': variables,
+                'operation_name': operation_name,
+                'middleware': self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options['execution_context_class'] = self.execution_context_class
+
+            if (
+                self.atomic_mutations
+                and operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                with routers.read_from(routing):
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+
+        if isawaitable(result):
+            return self.with_extensions(result, extensions, routing)
+        result.extensions = extensions
+        return result
+
+    @staticmethod
+    async def with_extensions(result, extensions, routing=None):
+        with routers.read_from(routing):
+            result = await result
+        result.extensions = extensions
+        return result
+
+
+class AsyncGraphQLView(PersistedQueryGraphQLView):
+    """
+    Async variant of PersistedQueryGraphQLView for ASGI deployments.
+
+    Batching and ATOMIC_MUTATIONS are not supported; each mutation runs its
+    own transaction on the request's sync thread (see async_mutations.py).
+    """
+    view_is_async = True
+    atomic_mutations = False
+
+    def __init__(self, schema=async_schema, **kwargs):
+        super().__init__(schema=schema, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['GET', 'POST'], 'GraphQL only supports GET and POST requests.'
+                    )
+                )
+
+            data = self.parse_body(request)
+            show_graphiql = self.graphiql and self.can_display_graphiql(request, data)
+            if show_graphiql:
+                # The IDE page is static; let the sync view render it
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            result, status_code = await self.aget_response(request, data)
+            return self.finalize_response(request, HttpResponse(
+                status=status_code, content=result, content_type='application/json'
+            ))
+
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(
+                request, {'errors': [self.format_error(e)]}
+            )
+            return response
+
+    async def aget_response(self, request, data):
+        request._persisted_hash = self.get_persisted_hash(request, data)
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        async with metrics.arecord_operation(request) as recorder:
+            result, status_code = await self.arun_operation(
+                request, data, query, variables, operation_name, id
+            )
+            if recorder is not None and result is not None:
+                recorder.response_size = len(result)
+        return result, status_code
+
+    async def arun_operation(self, request, data, query, variables, operation_name, id):
+        # The cache backend may do blocking I/O
+        cached = await sync_to_async(self.get_cached_response)(
+            request, query, variables, operation_name
+        )
+        if cached:
+            return cached
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name
+        )
+        if isawaitable(execution_result):
+            execution_result = await execution_result
+        metrics.record_errors(request, execution_result)
+        result, status_code = self.encode_result(request, execution_result, id)
+        await sync_to_async(self.cache_response)(request, execution_result, result)
+        return result, status_code
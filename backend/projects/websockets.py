@@ -0,0 +1,261 @@
+"""
+GraphQL over WebSocket for the ASGI application, speaking the
+``graphql-transport-ws`` protocol (the one implemented by the graphql-ws
+client library).
+
+Subscriptions run against ``async_schema``. A client names its tenant in
+the ``connection_init`` payload (``{"X-Organization": "<slug>"}``), since
+browsers cannot set headers on a WebSocket; an X-Organization header on the
+upgrade request is used otherwise.
+
+Only subscription operations are served here. Queries and mutations go over
+HTTP, where the response cache, operation metrics and atomic mutations
+apply; a ``subscribe`` message carrying one gets an ``error``. Documents
+go through the HTTP view's ``resolve_document``: APQ hashes, the shared
+document cache and, with ``ALLOW_LIST_ONLY``, the manifest.
+"""
+import asyncio
+import json
+import logging
+
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    get_operation_ast,
+    subscribe,
+)
+
+from .events import SubscriberOverflow
+from .middleware import get_organization
+from .models import Organization
+from .schema import async_schema
+from .schemas.cost import cost_error, measure_operation
+from .views import PersistedQueryGraphQLView
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL = 'graphql-transport-ws'
+CONNECTION_INIT_TIMEOUT = 10
+
+
+class SocketContext:
+    """Stands in for the HTTP request as ``info.context``."""
+
+    def __init__(self, organization):
+        self.organization = organization
+
+
+class CloseConnection(Exception):
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class GraphQLWebSocketApp:
+    """
+    ASGI application for ``websocket`` scopes. One instance serves every
+    connection.
+    """
+    schema = async_schema
+    view_class = PersistedQueryGraphQLView
+    connection_init_timeout = CONNECTION_INIT_TIMEOUT
+
+    def __init__(self):
+        self.view = self.view_class(schema=self.schema)
+
+    async def __call__(self, scope, receive, send):
+        connection = Connection(self, scope, receive, send)
+        await connection.run()
+
+    def resolve_document(self, query, persisted_hash=None):
+        """``(document, errors)`` for a subscribe payload, as for an HTTP request."""
+        if not query and not persisted_hash:
+            return None, [GraphQLError('Must provide query string.')]
+        request = SimpleNamespace(_persisted_hash=persisted_hash)
+        return self.view.resolve_document(request, query)
+
+
+class Connection:
+    def __init__(self, app, scope, receive, send):
+        self.app = app
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.context = None
+        self.operations = {}
+
+    async def send_json(self, message):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def close(self, code, reason=''):
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    async def run(self):
+        event = await self.receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in self.scope.get('subprotocols', ()):
+            await self.close(4406, 'Subprotocol not acceptable')
+            return
+        await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+        try:
+            try:
+                connected = await asyncio.wait_for(
+                    self.initialize(), self.app.connection_init_timeout
+                )
+            except asyncio.TimeoutError:
+                raise CloseConnection(4408, 'Connection initialisation timeout')
+            while connected:
+                event = await self.receive()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                await self.handle(self.decode(event))
+        except CloseConnection as e:
+            await self.close(e.code, e.reason)
+        finally:
+            for task in self.operations.values():
+                task.cancel()
+
+    def decode(self, event):
+        if event['type'] != 'websocket.receive':
+            raise CloseConnection(4400, 'Invalid message')
+        try:
+            message = json.loads(event.get('text') or event.get('bytes') or '')
+        except ValueError:
+            raise CloseConnection(4400, 'Invalid message received')
+        if not isinstance(message, dict) or not isinstance(message.get('type'), str):
+            raise CloseConnection(4400, 'Invalid message received')
+        return message
+
+    async def initialize(self):
+        event = await self.receive()
+        if event['type'] == 'websocket.disconnect':
+            return False
+        message = self.decode(event)
+        if message['type'] != 'connection_init':
+            raise CloseConnection(4401, 'Unauthorized')
+
+        payload = message.get('payload') or {}
+        if not isinstance(payload, dict):
+            raise CloseConnection(4400, 'Invalid message received')
+        identifier = payload.get('X-Organization') or payload.get('organization')
+        if not identifier:
+            headers = dict(self.scope.get('headers', ()))
+            identifier = headers.get(b'x-organization', b'').decode() or None
+        if identifier is not None and not isinstance(identifier, str):
+            raise CloseConnection(4400, 'Invalid message received')
+        organization = None
+        if identifier:
+            try:
+                organization = await sync_to_async(get_organization)(identifier)
+            except Organization.MultipleObjectsReturned:
+                raise CloseConnection(4403, 'Multiple organizations found')
+            if organization is None:
+                raise CloseConnection(4403, 'Organization not found')
+        self.context = SocketContext(organization)
+        await self.send_json({'type': 'connection_ack'})
+        return True
+
+    async def handle(self, message):
+        kind = message['type']
+        if kind == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif kind == 'connection_init':
+            raise CloseConnection(4429, 'Too many initialisation requests')
+        elif kind == 'subscribe':
+            operation_id = message.get('id')
+            if not isinstance(operation_id, str):
+                raise CloseConnection(4400, 'Invalid message received')
+            if operation_id in self.operations:
+                raise CloseConnection(4409, f'Subscriber for {operation_id} already exists')
+            payload = message.get('payload') or {}
+            if not isinstance(payload, dict):
+                raise CloseConnection(4400, 'Invalid message received')
+            task = asyncio.ensure_future(self.execute(operation_id, payload))
+            self.operations[operation_id] = task
+            task.add_done_callback(lambda _: self.operations.pop(operation_id, None))
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            raise CloseConnection(4400, f'Unexpected message type {kind}')
+
+    async def execute(self, operation_id, payload):
+        schema = self.app.schema.graphql_schema
+        extensions = payload.get('extensions')
+        persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        persisted_hash = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+        query = payload.get('query')
+        if not isinstance(query, (str, type(None))) or not isinstance(persisted_hash, (str, type(None))):
+            raise CloseConnection(4400, 'Invalid message received')
+        # The document cache and APQ store may do blocking I/O
+        document, errors = await sync_to_async(self.app.resolve_document)(query, persisted_hash)
+        if errors:
+            await self.send_error(operation_id, errors)
+            return
+
+        options = {
+            'context_value': self.context,
+            'variable_values': payload.get('variables'),
+            'operation_name': payload.get('operationName'),
+        }
+        operation = get_operation_ast(document, options['operation_name'])
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            await self.send_error(operation_id, [GraphQLError(
+                'Only subscriptions are served over WebSocket; send queries and mutations over HTTP',
+                extensions={'code': 'OPERATION_NOT_SUPPORTED'},
+            )])
+            return
+        variables = options['variable_values']
+        error = cost_error(measure_operation(
+            schema, document, options['operation_name'],
+            variables if isinstance(variables, dict) else None,
+        ), operation)
+        if error is not None:
+            await self.send_error(operation_id, [error])
+            return
+        try:
+            result = await subscribe(schema, document, **options)
+            if isinstance(result, ExecutionResult):
+                await self.send_error(operation_id, result.errors)
+                return
+            try:
+                async for item in result:
+                    await self.send_next(operation_id, item)
+            finally:
+                await result.aclose()
+        except SubscriberOverflow:
+            await self.send_error(operation_id, [GraphQLError(
+                'Subscriber fell behind; resubscribe and refetch',
+                extensions={'code': 'SUBSCRIBER_OVERFLOW'},
+            )])
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('GraphQL operation %s failed', operation_id)
+            await self.send_error(operation_id, [GraphQLError('Internal error')])
+            return
+        await self.send_json({'id': operation_id, 'type': 'complete'})
+
+    async def send_next(self, operation_id, result):
+        payload = {'data': result.data}
+        if result.errors:
+            payload['errors'] = [error.formatted for error in result.errors]
+        await self.send_json({'id': operation_id, 'type': 'next', 'payload': payload})
+
+    async def send_error(self, operation_id, errors):
+        await self.send_json({
+            'id': operation_id,
+            'type': 'error',
+            'payload': [error.formatted for error in errors],
+        })